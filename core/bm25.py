@@ -0,0 +1,155 @@
+"""In-memory BM25 over the chunks of a vector store's docstore.
+
+Dense ada-002 similarity is weak on literal identifiers such as "Form-I",
+"Rule 27" or "Section 20(1)". The tokenizer below keeps those as single
+terms ("form:i", "rule:27", "section:20(1)" and "section:20"), so the lexical
+ranking can be fused with the dense one (core/retrieval.py).
+
+Documents are numbered by FAISS position, so a position range (as used by
+the unified index partitions) can restrict a search without extra metadata.
+An index is built lazily on first use for each loaded vector store and is
+dropped together with the store when the registry evicts it.
+"""
+import math
+import os
+import re
+import threading
+import time
+import weakref
+import numpy as np
+
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it",
+    "of", "on", "or", "that", "the", "to", "was", "what", "which", "with", "under",
+    "shall", "any", "such", "this", "there", "how", "does", "do", "can", "my",
+}
+
+# Statutory references: keyword, optional "No.", optional dash, then a number with
+# sub-clauses ("20(1)(a)", "27A") or a roman numeral ("I", "XXIV").
+REFERENCE_KINDS = {
+    "form": "form", "rule": "rule", "section": "section", "sec": "section",
+    "schedule": "schedule", "chapter": "chapter", "clause": "clause",
+    "regulation": "regulation", "article": "article", "register": "register",
+}
+REFERENCE_PATTERN = re.compile(
+    r"\b(" + "|".join(REFERENCE_KINDS) + r")s?\.?\s*(?:no\.?\s*)?[-–—]?\s*"
+    r"(\d+[a-z]?(?:\(\w{1,4}\))*|[ivxlc]{1,6})(?![\w-])"
+)
+WORD_PATTERN = re.compile(r"\d+[a-z]?(?:\(\w{1,4}\))*|[^\W\d_]+")
+
+
+def tokenize(text: str) -> list:
+    """Lowercased words without stopwords, plus one term per statutory reference."""
+    text = text.lower()
+    tokens = [t for t in WORD_PATTERN.findall(text) if t not in STOPWORDS]
+    for kind, number in REFERENCE_PATTERN.findall(text):
+        kind = REFERENCE_KINDS[kind]
+        tokens.append(f"{kind}:{number}")
+        base = number.split("(", 1)[0]
+        if base != number:
+            # "Section 20(1)" also matches a query for "Section 20"
+            tokens.append(f"{kind}:{base}")
+    return tokens
+
+
+class BM25Index:
+    """Okapi BM25 with numpy posting lists; document ids are positions 0..n-1."""
+
+    def __init__(self, documents, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        postings = {}
+        lengths = []
+        for position, text in enumerate(documents):
+            counts = {}
+            for token in tokenize(text):
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                postings.setdefault(token, ([], []))
+                postings[token][0].append(position)
+                postings[token][1].append(tf)
+            lengths.append(sum(counts.values()))
+
+        self.size = len(lengths)
+        self.lengths = np.asarray(lengths, dtype=np.float32)
+        average = float(self.lengths.mean()) if self.size else 0.0
+        # Per-document part of the BM25 denominator, precomputed once
+        self.norms = k1 * (1 - b + b * self.lengths / max(average, 1e-9))
+        self.postings = {}
+        for token, (positions, tfs) in postings.items():
+            df = len(positions)
+            idf = math.log(1 + (self.size - df + 0.5) / (df + 0.5))
+            self.postings[token] = (
+                np.asarray(positions, dtype=np.int64),
+                np.asarray(tfs, dtype=np.float32),
+                idf,
+            )
+
+    def search(self, query: str, k: int, ranges=None) -> list:
+        """
+        Returns [(position, score)] of the k best matches. `ranges` is an optional
+        list of [start, end) position ranges the results must fall in.
+        """
+        if not self.size:
+            return []
+        scores = np.zeros(self.size, dtype=np.float32)
+        for token in set(tokenize(query)):
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+            positions, tfs, idf = posting
+            scores[positions] += idf * tfs * (self.k1 + 1) / (tfs + self.norms[positions])
+
+        if ranges is not None:
+            allowed = np.zeros(self.size, dtype=bool)
+            for start, end in ranges:
+                allowed[start:end] = True
+            scores[~allowed] = 0.0
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        ordered = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(p), float(scores[p])) for p in ordered]
+
+
+def _documents_in_position_order(vector_store) -> list:
+    positions = sorted(vector_store.index_to_docstore_id)
+    ids = [vector_store.index_to_docstore_id[p] for p in positions]
+    docstore = vector_store.docstore
+    if hasattr(docstore, "mget"):
+        found = {}
+        for i in range(0, len(ids), 500):
+            found.update(docstore.mget(ids[i:i + 500]))
+        docs = [found.get(i) for i in ids]
+    else:
+        docs = [docstore.search(i) for i in ids]
+    return [d.page_content if d is not None and not isinstance(d, str) else "" for d in docs]
+
+
+_indexes = weakref.WeakKeyDictionary()
+_build_lock = threading.Lock()
+
+
+def bm25_for(vector_store) -> BM25Index:
+    """The BM25 index over a vector store's chunks, built on first use."""
+    index = _indexes.get(vector_store)
+    if index is not None:
+        return index
+    with _build_lock:
+        index = _indexes.get(vector_store)
+        if index is None:
+            start = time.perf_counter()
+            index = BM25Index(_documents_in_position_order(vector_store))
+            _indexes[vector_store] = index
+            print(f"🔹 Built BM25 index over {index.size} chunks in {time.perf_counter() - start:.2f}s")
+    return index
+
+
+def search_ids_by_text(vector_store, query: str, k: int, ranges=None) -> list:
+    """Ranked docstore ids for a lexical query."""
+    hits = bm25_for(vector_store).search(query, k, ranges)
+    return [vector_store.index_to_docstore_id[p] for p, _ in hits]
@@ -0,0 +1,131 @@
+"""Compact chat history for the prompt's {chat_history} slot.
+
+The prompt gets, instead of the raw stored messages (ids, timestamps, feedback
+status), at most HISTORY_TOKEN_BUDGET tokens of:
+- a running summary of older turns, stored in the session's chat history file
+  as {"summary": {"text", "covered", "updated"}} where `covered` is the number
+  of messages it summarizes;
+- the most recent turns rendered as "User: ..." / "Assistant: ..." lines.
+
+The summary is extended incrementally after a turn is saved, in the
+background, only with the messages that have left the recent window since the
+last update; it is never recomputed from scratch per request. Turns the
+summary does not cover yet are always rendered, even past the budget, so
+none are lost while a refresh is pending or after one fails.
+"""
+from datetime import datetime, timezone
+import os
+from langchain_core.prompts import PromptTemplate
+from .context_packing import count_tokens
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "800"))
+# Long answers are cut to this many tokens when rendered into the window
+HISTORY_MESSAGE_MAX_TOKENS = int(os.getenv("HISTORY_MESSAGE_MAX_TOKENS", "200"))
+SUMMARY_MAX_WORDS = int(os.getenv("HISTORY_SUMMARY_MAX_WORDS", "150"))
+
+ROLE_LABELS = {"user": "User", "bot": "Assistant"}
+
+summary_prompt = PromptTemplate(
+    input_variables=["summary", "turns", "max_words"],
+    template="""
+You maintain a running summary of a conversation about Indian labour law.
+
+Update the summary with the new turns. Keep the states, labour codes, rules,
+sections and forms discussed, the user's open questions and any conclusions.
+Do not add anything that is not in the conversation.
+Reply with the updated summary only, in at most {max_words} words.
+
+Current summary:
+{summary}
+
+New turns:
+{turns}
+"""
+)
+
+
+def message_text(message: dict) -> str:
+    """Text of a stored message; older sessions saved bot messages as lists."""
+    content = message.get("message", "")
+    if isinstance(content, list):
+        parts = []
+        for part in content:
+            if isinstance(part, dict):
+                part = part.get("message") or part.get("content") or part.get("text") or ""
+            parts.append(str(part))
+        content = "\n".join(p for p in parts if p)
+    elif isinstance(content, dict):
+        content = content.get("content") or content.get("text") or ""
+    return " ".join(str(content or "").split())
+
+
+def render_message(message: dict, max_tokens: int = HISTORY_MESSAGE_MAX_TOKENS) -> str:
+    text = message_text(message)
+    # Cheap character cut first; the token count below keeps the window honest
+    if len(text) > max_tokens * 4:
+        text = text[:max_tokens * 4].rsplit(" ", 1)[0] + " …"
+    label = ROLE_LABELS.get(message.get("role"), str(message.get("role", "User")).title())
+    return f"{label}: {text}"
+
+
+def window_start(messages: list, budget: int) -> int:
+    """Index of the oldest message that still fits in the recent-turns window."""
+    used = 0
+    start = len(messages)
+    for i in range(len(messages) - 1, -1, -1):
+        tokens = count_tokens(render_message(messages[i])) + 1
+        if used + tokens > budget:
+            break
+        used += tokens
+        start = i
+    return start
+
+
+def build_chat_history(session_data: dict, budget: int = HISTORY_TOKEN_BUDGET) -> str:
+    """
+    Summary plus recent turns within the token budget, as prompt text. The
+    window never starts after the last message the summary covers.
+    """
+    messages = (session_data or {}).get("messages", [])
+    if not messages:
+        return ""
+
+    summary = session_data.get("summary") or {}
+    summary_block = f"Summary of the earlier conversation:\n{summary['text']}" if summary.get("text") else ""
+    remaining = budget - (count_tokens(summary_block) if summary_block else 0)
+
+    # Messages the summary does not cover yet stay in the window even past the
+    # budget, so a refresh that lags or fails never drops them from the prompt
+    covered = summary.get("covered", 0) if summary_block else 0
+    start = min(window_start(messages, max(0, remaining)), covered)
+    recent = "\n".join(render_message(m) for m in messages[start:])
+    if summary_block and recent:
+        return f"{summary_block}\n\nRecent turns:\n{recent}"
+    return summary_block or recent
+
+
+async def arefresh_summary(llm, session_data: dict, budget: int = HISTORY_TOKEN_BUDGET):
+    """
+    Folds the messages that no longer fit in the recent window into the running
+    summary. Returns the new summary record, or None when nothing has left the window.
+    """
+    messages = (session_data or {}).get("messages", [])
+    summary = session_data.get("summary") or {"text": "", "covered": 0}
+    covered = min(summary.get("covered", 0), len(messages))
+
+    # Leave room for the summary itself in the window the next request will build
+    start = window_start(messages, max(0, budget - SUMMARY_MAX_WORDS * 2))
+    if start <= covered:
+        return None
+
+    turns = "\n".join(render_message(m) for m in messages[covered:start])
+    response = await (summary_prompt | llm).ainvoke({
+        "summary": summary.get("text") or "(none yet)",
+        "turns": turns,
+        "max_words": SUMMARY_MAX_WORDS,
+    })
+    return {
+        "text": response.content.strip(),
+        "covered": start,
+        "updated": datetime.now(timezone.utc).isoformat(),
+    }
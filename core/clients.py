@@ -0,0 +1,45 @@
+"""Shared Azure OpenAI clients, created once per process."""
+from functools import lru_cache
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+from langchain_openai import AzureChatOpenAI, AzureOpenAIEmbeddings
+
+# ===================== LOAD ENV =====================
+ROOT_DIR = Path(__file__).resolve().parents[2]
+load_dotenv(ROOT_DIR / ".env")
+
+EMBEDDING_DEPLOYMENT_NAME = "text-embedding-ada-002"
+API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
+AZURE_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
+API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION")
+CHAT_DEPLOYMENT = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT")
+
+
+def _require_config():
+    # Checked on first use so offline tools (e.g. core.ingest --embeddings local) can import core
+    if not API_KEY or not AZURE_ENDPOINT or not CHAT_DEPLOYMENT:
+        raise RuntimeError("Azure OpenAI config missing. Check .env location.")
+
+
+@lru_cache(maxsize=None)
+def get_llm() -> AzureChatOpenAI:
+    """Returns the process-wide chat client."""
+    _require_config()
+    return AzureChatOpenAI(
+        azure_deployment=CHAT_DEPLOYMENT,
+        azure_endpoint=AZURE_ENDPOINT,
+        openai_api_version=API_VERSION,
+        api_key=API_KEY,
+        temperature=0
+    )
+
+
+@lru_cache(maxsize=None)
+def get_embeddings() -> AzureOpenAIEmbeddings:
+    """Returns the process-wide embeddings client."""
+    _require_config()
+    return AzureOpenAIEmbeddings(
+        azure_deployment=EMBEDDING_DEPLOYMENT_NAME,
+        openai_api_version=API_VERSION
+    )
@@ -0,0 +1,127 @@
+"""Token-budgeted assembly of the CONTEXT block.
+
+Retrieved chunks arrive in groups (the selected state first, then each
+compared state) in retrieval order. The packer:
+- drops near-duplicates (MinHash estimate of word-shingle Jaccard similarity),
+  e.g. the same Central-code passage quoted in two state rules or chunk
+  overlap across adjacent pages;
+- picks chunks by maximal marginal relevance (MMR), trading retrieval rank
+  against similarity to what is already picked, after first giving every group
+  its best chunk so comparisons are not starved;
+- stops at CONTEXT_TOKEN_BUDGET tokens, counting the citation tag with each
+  chunk so tags are never cut off.
+"""
+from functools import lru_cache
+import os
+import re
+import zlib
+import numpy as np
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.8"))
+MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+SHINGLE_SIZE = 5
+MINHASH_PERMUTATIONS = 64
+
+_PRIME = (1 << 61) - 1
+_rng = np.random.default_rng(1)
+# Coefficients below 2**32 keep a * h + b inside uint64 for 32-bit shingle hashes
+_A = _rng.integers(1, 1 << 32, MINHASH_PERMUTATIONS, dtype=np.uint64)
+_B = _rng.integers(0, 1 << 32, MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Tokens as counted by the chat model's tokenizer; about 4 characters each without tiktoken."""
+    encoding = _encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def minhash(text: str) -> np.ndarray:
+    """MinHash signature of the text's word shingles."""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < SHINGLE_SIZE:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64)
+    permuted = (hashes[:, None] * _A[None, :] + _B[None, :]) % np.uint64(_PRIME)
+    return permuted.min(axis=0)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.mean(a == b))
+
+
+def pack_context(groups: list, format_block, budget: int = CONTEXT_TOKEN_BUDGET,
+                 mmr_lambda: float = MMR_LAMBDA,
+                 duplicate_threshold: float = NEAR_DUPLICATE_THRESHOLD):
+    """
+    Returns (context, packed_groups): the context text within the token budget,
+    and for each input group the documents that made it in, in retrieval order.
+    `format_block(doc)` renders one chunk with its citation tag.
+    """
+    candidates = []
+    for group_index, docs in enumerate(groups):
+        for rank, doc in enumerate(docs):
+            block = format_block(doc)
+            candidates.append({
+                "group": group_index,
+                "rank": rank,
+                "doc": doc,
+                "block": block,
+                "tokens": count_tokens(block) + 1,
+                "relevance": 1.0 / (rank + 1),
+                "signature": minhash(doc.page_content),
+            })
+
+    selected = []
+    used = 0
+
+    def redundancy(candidate):
+        return max((similarity(candidate["signature"], s["signature"]) for s in selected), default=0.0)
+
+    def take(candidate):
+        nonlocal used
+        candidates[:] = [c for c in candidates if c is not candidate]
+        if candidate["tokens"] > budget - used:
+            return
+        if redundancy(candidate) >= duplicate_threshold:
+            return
+        selected.append(candidate)
+        used += candidate["tokens"]
+
+    # Best chunk of every group first, then MMR over the rest
+    for group_index in range(len(groups)):
+        firsts = [c for c in candidates if c["group"] == group_index]
+        if firsts:
+            take(firsts[0])
+
+    while candidates and used < budget:
+        best = max(
+            candidates,
+            key=lambda c: mmr_lambda * c["relevance"] - (1 - mmr_lambda) * redundancy(c)
+        )
+        take(best)
+
+    packed_groups = [[] for _ in groups]
+    blocks = []
+    for candidate in sorted(selected, key=lambda c: (c["group"], c["rank"])):
+        packed_groups[candidate["group"]].append(candidate["doc"])
+        blocks.append(candidate["block"])
+
+    total = sum(len(g) for g in groups)
+    if len(selected) < total:
+        print(f"🔹 Packed {len(selected)}/{total} chunks into {used} context tokens")
+    return "\n\n".join(blocks), packed_groups
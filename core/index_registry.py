@@ -0,0 +1,152 @@
+"""Process-wide registry of the per-state FAISS indexes.
+
+Each jurisdiction is loaded from disk at most once per process and shared by
+every request. Folders converted to the memory-mapped format (core/index_store.py)
+are preferred over pickled FAISS.save_local folders. When the resident size of the loaded indexes exceeds the
+configured budget, the least recently used ones are evicted.
+"""
+import asyncio
+from collections import OrderedDict
+import os
+from pathlib import Path
+import threading
+from langchain_community.vectorstores import FAISS
+from .clients import get_embeddings
+from .index_store import is_store_folder, load_store, store_bytes
+from .jurisdictions import resolve_jurisdiction
+
+INDEX_ROOT = Path(__file__).resolve().parent / "unified_index_state"
+
+INDEX_FOLDER_DIC = {
+    "Maharashtra": "maha_ada",
+    "Gujarat": "guj_ada",
+    "Uttarakhand": "uk_ada",
+    "Central": "cen_ada",
+    "Jharkhand": "jha_ada",
+    "Karnataka": "ka_ada",
+    "Uttar Pradesh": "up_ada",
+}
+
+INDEX_MEMORY_BUDGET_MB = int(os.getenv("INDEX_MEMORY_BUDGET_MB", "2048"))
+
+
+def _close(vector_store):
+    """Releases file handles held by a store's docstore (SQLite connections)."""
+    close = getattr(vector_store.docstore, "close", None)
+    if close is not None:
+        close()
+
+
+class IndexRegistry:
+    """LRU cache of loaded vector stores bounded by an approximate byte budget."""
+
+    def __init__(self, index_root: Path = INDEX_ROOT, folder_map: dict = None,
+                 memory_budget_bytes: int = INDEX_MEMORY_BUDGET_MB * 1024 * 1024):
+        self.index_root = Path(index_root)
+        self.folder_map = folder_map if folder_map is not None else INDEX_FOLDER_DIC
+        self.memory_budget_bytes = memory_budget_bytes
+        self._stores = OrderedDict()  # folder -> (vector_store, size_bytes)
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def folder_for(self, state: str) -> str:
+        """Maps a state name, alias or abbreviation to its index folder, raising KeyError if unknown."""
+        if state in self.folder_map:
+            return self.folder_map[state]
+        canonical = resolve_jurisdiction(state)
+        if canonical not in self.folder_map:
+            raise KeyError(state)
+        return self.folder_map[canonical]
+
+    def get(self, state: str) -> FAISS:
+        """Returns the vector store for a state, loading it on first use."""
+        return self.get_folder(self.folder_for(state))
+
+    def get_folder(self, folder: str) -> FAISS:
+        """Returns the vector store saved under index_root/folder, loading it on first use."""
+        with self._lock:
+            if folder in self._stores:
+                self._stores.move_to_end(folder)
+                self.hits += 1
+                return self._stores[folder][0]
+            load_lock = self._load_locks.setdefault(folder, threading.Lock())
+
+        # Only one thread loads a given folder; the others wait and reuse it.
+        with load_lock:
+            with self._lock:
+                if folder in self._stores:
+                    self._stores.move_to_end(folder)
+                    self.hits += 1
+                    return self._stores[folder][0]
+
+            print(f"🔹 Loading FAISS index '{folder}'...")
+            vector_store, size_bytes = self._load(folder)
+
+            with self._lock:
+                self._stores[folder] = (vector_store, size_bytes)
+                self.loads += 1
+                self._evict(keep=folder)
+            return vector_store
+
+    def _load(self, folder: str):
+        path = self.index_root / folder
+        if is_store_folder(str(path)):
+            # Mapped index and docstore pages count as they fill the page cache, plus the id map
+            vector_store = load_store(str(path), get_embeddings())
+            size_bytes = store_bytes(str(path)) + len(vector_store.index_to_docstore_id) * 128
+            return vector_store, size_bytes
+
+        vector_store = FAISS.load_local(
+            str(path),
+            get_embeddings(),
+            allow_dangerous_deserialization=True
+        )
+        size_bytes = sum(f.stat().st_size for f in path.iterdir() if f.is_file())
+        return vector_store, size_bytes
+
+    def _evict(self, keep: str):
+        """Drops least recently used stores until the budget is met. Caller holds the lock."""
+        while self.resident_bytes() > self.memory_budget_bytes and len(self._stores) > 1:
+            folder = next(iter(self._stores))
+            if folder == keep:
+                break
+            vector_store, _ = self._stores.pop(folder)
+            _close(vector_store)
+            self.evictions += 1
+            print(f"🔹 Evicted FAISS index '{folder}'")
+
+    def resident_bytes(self) -> int:
+        return sum(size for _, size in self._stores.values())
+
+    def clear(self):
+        with self._lock:
+            for vector_store, _ in self._stores.values():
+                _close(vector_store)
+            self._stores.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "loaded": list(self._stores),
+                "resident_bytes": self.resident_bytes(),
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "hits": self.hits,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+
+
+index_registry = IndexRegistry()
+
+
+def get_vector_store(state: str) -> FAISS:
+    """Returns the shared vector store for a state."""
+    return index_registry.get(state)
+
+
+async def aget_vector_store(state: str) -> FAISS:
+    """Async variant of get_vector_store; a cold load runs off the event loop."""
+    return await asyncio.to_thread(index_registry.get, state)
@@ -0,0 +1,250 @@
+"""On-disk index format without pickles.
+
+A folder in this format holds:
+- index.faiss      the FAISS index, opened memory-mapped and read-only so the
+                   page cache is shared between worker processes;
+- docstore.sqlite  chunk text and metadata, read lazily per hit, plus the
+                   FAISS position -> docstore id table;
+- index.sq8.faiss / index.pq.faiss  optional quantized copies of index.faiss
+                   built by core/quantize.py, served when INDEX_VARIANT selects them.
+
+Convert existing pickled folders with:
+    python -m core.index_store convert [folder ...]
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+import faiss
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_community.docstore.base import AddableMixin, Docstore
+
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "docstore.sqlite"
+VARIANT_FILES = {"sq8": "index.sq8.faiss", "pq": "index.pq.faiss"}
+# Written by core/unified_index.py; its searches restrict ids with SearchParameters(sel=...)
+PARTITIONS_FILE = "partitions.json"
+# Index kinds whose search honours an ID selector; IndexPQ rejects one
+SELECTOR_VARIANTS = {"flat", "sq8"}
+# "flat" (exact), "sq8" or "pq"; folders without the variant fall back to the flat index,
+# and so do partitioned folders (the unified index) when the variant cannot filter by id
+INDEX_VARIANT = os.getenv("INDEX_VARIANT", "flat")
+# IO_FLAG_MMAP_IFC maps flat codes directly (faiss >= 1.9); older builds only map IVF lists
+MMAP_IO_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", 0) | faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    docstore_id TEXT PRIMARY KEY,
+    page_content TEXT NOT NULL,
+    metadata TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS positions (
+    position INTEGER PRIMARY KEY,
+    docstore_id TEXT NOT NULL
+);
+"""
+
+
+class SQLiteDocstore(Docstore, AddableMixin):
+    """Docstore backed by SQLite; documents are fetched on demand, never held in memory."""
+
+    def __init__(self, path: str, read_only: bool = True):
+        self.path = path
+        self.read_only = read_only
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self.read_only:
+                conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            else:
+                conn = sqlite3.connect(self.path, check_same_thread=False)
+                conn.executescript(SCHEMA)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _query(self, sql: str, params=()) -> list:
+        try:
+            return self._conn().execute(sql, params).fetchall()
+        except sqlite3.ProgrammingError:
+            # The store was closed (e.g. evicted) while this thread still held it; reopen once
+            self._local.conn = None
+            return self._conn().execute(sql, params).fetchall()
+
+    def close(self):
+        """Closes the connections opened by every thread; later calls reopen them."""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+        for conn in connections:
+            conn.close()
+
+    def search(self, search: str):
+        rows = self._query(
+            "SELECT page_content, metadata FROM documents WHERE docstore_id = ?", (search,)
+        )
+        row = rows[0] if rows else None
+        if row is None:
+            # Same contract as InMemoryDocstore
+            return f"ID {search} not found."
+        return Document(id=search, page_content=row[0], metadata=json.loads(row[1]))
+
+    def mget(self, ids: list) -> dict:
+        """Fetches several documents in one query."""
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
+        rows = self._query(
+            f"SELECT docstore_id, page_content, metadata FROM documents WHERE docstore_id IN ({placeholders})",
+            list(ids)
+        )
+        return {
+            r[0]: Document(id=r[0], page_content=r[1], metadata=json.loads(r[2])) for r in rows
+        }
+
+    def iter_documents(self, batch_size: int = 500):
+        """Yields (docstore_id, Document) for every stored chunk."""
+        cursor = self._conn().execute("SELECT docstore_id, page_content, metadata FROM documents")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            for r in rows:
+                yield r[0], Document(id=r[0], page_content=r[1], metadata=json.loads(r[2]))
+
+    def add(self, texts: dict) -> None:
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO documents VALUES (?, ?, ?)",
+                [(i, d.page_content, json.dumps(d.metadata)) for i, d in texts.items()]
+            )
+
+    def delete(self, ids: list) -> None:
+        conn = self._conn()
+        with conn:
+            conn.executemany("DELETE FROM documents WHERE docstore_id = ?", [(i,) for i in ids])
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+
+def is_store_folder(folder: str) -> bool:
+    return os.path.exists(os.path.join(folder, DOCSTORE_FILE)) and \
+        os.path.exists(os.path.join(folder, INDEX_FILE))
+
+
+def is_partitioned(folder: str) -> bool:
+    return os.path.exists(os.path.join(folder, PARTITIONS_FILE))
+
+
+def index_file_for(folder: str, variant: str = INDEX_VARIANT) -> str:
+    """Path of the index file to serve for a variant."""
+    if variant not in SELECTOR_VARIANTS and is_partitioned(folder):
+        return os.path.join(folder, INDEX_FILE)
+    if variant in VARIANT_FILES:
+        path = os.path.join(folder, VARIANT_FILES[variant])
+        if os.path.exists(path):
+            return path
+    return os.path.join(folder, INDEX_FILE)
+
+
+def store_bytes(folder: str, variant: str = INDEX_VARIANT) -> int:
+    """On-disk size of what load_store maps for a folder: the served index and the docstore."""
+    paths = [index_file_for(folder, variant)]
+    paths += [os.path.join(folder, DOCSTORE_FILE + suffix) for suffix in ("", "-wal")]
+    return sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+
+
+def _iter_docs(vector_store: FAISS):
+    docstore = vector_store.docstore
+    if isinstance(docstore, SQLiteDocstore):
+        yield from docstore.iter_documents()
+        return
+    for docstore_id in vector_store.index_to_docstore_id.values():
+        yield docstore_id, docstore.search(docstore_id)
+
+
+def export_store(vector_store: FAISS, folder: str):
+    """Writes a vector store in this format; files are swapped in atomically."""
+    os.makedirs(folder, exist_ok=True)
+    index_path = os.path.join(folder, INDEX_FILE)
+    docstore_path = os.path.join(folder, DOCSTORE_FILE)
+
+    faiss.write_index(vector_store.index, index_path + ".tmp")
+
+    if os.path.exists(docstore_path + ".tmp"):
+        os.remove(docstore_path + ".tmp")
+    conn = sqlite3.connect(docstore_path + ".tmp")
+    try:
+        conn.executescript(SCHEMA)
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO documents VALUES (?, ?, ?)",
+                (
+                    (docstore_id, doc.page_content, json.dumps(doc.metadata))
+                    for docstore_id, doc in _iter_docs(vector_store)
+                    if not isinstance(doc, str)
+                )
+            )
+            conn.executemany(
+                "INSERT INTO positions VALUES (?, ?)",
+                vector_store.index_to_docstore_id.items()
+            )
+    finally:
+        conn.close()
+
+    os.replace(index_path + ".tmp", index_path)
+    os.replace(docstore_path + ".tmp", docstore_path)
+
+    # Quantized copies no longer match the new positions
+    for name in VARIANT_FILES.values():
+        stale = os.path.join(folder, name)
+        if os.path.exists(stale):
+            os.remove(stale)
+            print(f"⚠️ Removed stale {name}; rebuild it with python -m core.quantize")
+
+
+def load_store(folder: str, embeddings, mmap: bool = True, variant: str = INDEX_VARIANT) -> FAISS:
+    """
+    Opens a folder written by export_store. With mmap=True the index is mapped
+    read-only; pass mmap=False to get an in-memory index that can be modified.
+    `variant` selects a quantized index when one has been built.
+    """
+    index_path = index_file_for(folder, variant)
+    if variant in VARIANT_FILES and os.path.basename(index_path) == INDEX_FILE and is_partitioned(folder):
+        print(f"⚠️ {folder} is searched by id range, which {variant} indexes cannot do; serving the flat index")
+    index = faiss.read_index(index_path, MMAP_IO_FLAGS) if mmap else faiss.read_index(index_path)
+
+    docstore = SQLiteDocstore(os.path.join(folder, DOCSTORE_FILE), read_only=mmap)
+    rows = docstore._conn().execute("SELECT position, docstore_id FROM positions").fetchall()
+    return FAISS(embeddings, index, docstore, dict(rows))
+
+
+def convert_folder(folder: str, embeddings):
+    """Rewrites a pickled FAISS.save_local folder in this format; index.pkl is left in place."""
+    vector_store = FAISS.load_local(folder, embeddings, allow_dangerous_deserialization=True)
+    export_store(vector_store, folder)
+
+
+if __name__ == "__main__":
+    from .clients import get_embeddings
+    from .index_registry import INDEX_FOLDER_DIC, INDEX_ROOT
+
+    if not sys.argv[1:] or sys.argv[1] != "convert":
+        sys.exit("usage: python -m core.index_store convert [folder ...]")
+    folders = sys.argv[2:] or sorted(set(INDEX_FOLDER_DIC.values()))
+    for name in folders:
+        path = name if os.path.isdir(name) else os.path.join(INDEX_ROOT, name)
+        try:
+            convert_folder(path, get_embeddings())
+            print(f"✅ Converted {path}")
+        except Exception as e:
+            print(f"❌ {path}: {e}")
@@ -0,0 +1,285 @@
+"""Offline ingestion of state rules into the index folders.
+
+    python -m core.ingest Maharashtra rules/*.pdf
+    python -m core.ingest Maharashtra --remove "Old-Draft-Rules.pdf"
+    python -m core.ingest Karnataka rules/ka/*.pdf --embeddings local
+
+Documents are split per page (so every chunk keeps its `source` and `page`),
+chunked, embedded in concurrent batches with rate-limit backoff, and written in
+the format of core/index_store.py. A manifest of file hashes makes re-runs
+incremental: unchanged files are skipped, changed files have their old chunks
+replaced, and --remove drops a source without re-embedding anything else.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from .index_registry import INDEX_FOLDER_DIC, INDEX_ROOT
+from .index_store import SQLiteDocstore, export_store, is_store_folder, load_store
+
+MANIFEST_FILE = "manifest.json"
+EMBEDDING_DIM = 1536
+
+
+# ======================================================
+# EMBEDDINGS
+# ======================================================
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic local stand-in for the Azure embeddings, for offline builds and tests.
+    Tokens are feature-hashed into `size` signed buckets and L2-normalized.
+    """
+
+    def __init__(self, size: int = EMBEDDING_DIM):
+        self.size = size
+
+    def _embed(self, text: str) -> list:
+        vector = np.zeros(self.size, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            digest = hashlib.md5(token.encode("utf-8")).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.size
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: list) -> list:
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> list:
+        return self._embed(text)
+
+
+def get_ingest_embeddings(kind: str) -> Embeddings:
+    if kind == "local":
+        return HashingEmbeddings()
+    from .clients import get_embeddings
+    return get_embeddings()
+
+
+def _is_rate_limit(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError"
+
+
+async def aembed_in_batches(embeddings: Embeddings, texts: list, batch_size: int = 64,
+                            concurrency: int = 4, max_retries: int = 6) -> list:
+    """Embeds texts in concurrent batches, backing off exponentially on rate limits."""
+    semaphore = asyncio.Semaphore(concurrency)
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+
+    async def embed_batch(number, batch):
+        async with semaphore:
+            for attempt in range(max_retries + 1):
+                try:
+                    vectors = await embeddings.aembed_documents(batch)
+                    print(f"🔹 Embedded batch {number + 1}/{len(batches)}")
+                    return vectors
+                except Exception as e:
+                    if not _is_rate_limit(e) or attempt == max_retries:
+                        raise
+                    delay = min(60, 2 ** attempt) + random.uniform(0, 1)
+                    print(f"⚠️ Rate limited, retrying batch {number + 1} in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+
+    results = await asyncio.gather(*(embed_batch(n, b) for n, b in enumerate(batches)))
+    return [vector for batch in results for vector in batch]
+
+
+# ======================================================
+# LOADING AND CHUNKING
+# ======================================================
+def read_pages(path: str) -> list:
+    """Returns [(page_number, text)] with 1-based page numbers."""
+    if path.lower().endswith(".pdf"):
+        from pypdf import PdfReader
+        reader = PdfReader(path)
+        return [(i + 1, page.extract_text() or "") for i, page in enumerate(reader.pages)]
+
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        text = f.read()
+    # Form feeds mark page breaks in text exports
+    return [(i + 1, page) for i, page in enumerate(text.split("\f"))]
+
+
+def chunk_file(path: str, chunk_size: int = 1000, chunk_overlap: int = 150) -> list:
+    """Returns [(chunk_id, text, metadata)]; chunks never span a page."""
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    source = os.path.basename(path)
+    chunks = []
+    for page, text in read_pages(path):
+        for n, chunk in enumerate(splitter.split_text(text)):
+            if not chunk.strip():
+                continue
+            chunk_id = hashlib.sha1(f"{source}|{page}|{n}|{chunk}".encode("utf-8")).hexdigest()
+            chunks.append((chunk_id, chunk, {"source": source, "page": str(page)}))
+    return chunks
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# ======================================================
+# INDEX UPDATE
+# ======================================================
+def load_for_update(folder: str, embeddings: Embeddings) -> FAISS:
+    """Opens an index folder as a fully in-memory, modifiable store (empty if it does not exist)."""
+    if is_store_folder(folder):
+        on_disk = load_store(folder, embeddings, mmap=False, variant="flat")
+        docs = dict(SQLiteDocstore(on_disk.docstore.path).iter_documents())
+        return FAISS(embeddings, on_disk.index, InMemoryDocstore(docs), on_disk.index_to_docstore_id)
+    if os.path.exists(os.path.join(folder, "index.faiss")):
+        return FAISS.load_local(folder, embeddings, allow_dangerous_deserialization=True)
+    dim = len(embeddings.embed_query("dimension probe"))
+    return FAISS(embeddings, faiss.IndexFlatL2(dim), InMemoryDocstore(), {})
+
+
+def _ids_by_source(vector_store: FAISS) -> dict:
+    """Chunk ids grouped by their "source" metadata, for sources missing from the manifest."""
+    by_source = {}
+    for docstore_id in vector_store.index_to_docstore_id.values():
+        doc = vector_store.docstore.search(docstore_id)
+        if not isinstance(doc, str):
+            by_source.setdefault(doc.metadata.get("source"), []).append(docstore_id)
+    return by_source
+
+
+def read_manifest(folder: str) -> dict:
+    path = os.path.join(folder, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_manifest(folder: str, manifest: dict):
+    path = os.path.join(folder, MANIFEST_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def ingest(folder: str, paths: list, remove: list = (), embeddings: Embeddings = None,
+           chunk_size: int = 1000, chunk_overlap: int = 150, batch_size: int = 64,
+           concurrency: int = 4) -> dict:
+    """Adds/replaces the given files and removes the given sources; returns a summary."""
+    embeddings = embeddings or get_ingest_embeddings("azure")
+    manifest = read_manifest(folder)
+    vector_store = load_for_update(folder, embeddings)
+    summary = {"added": [], "replaced": [], "unchanged": [], "removed": [], "chunks": 0}
+
+    untracked = None  # source -> ids, scanned once when a source has no manifest entry
+
+    def ids_for_source(source):
+        nonlocal untracked
+        if untracked is None:
+            untracked = _ids_by_source(vector_store)
+        return untracked.get(source, [])
+
+    stale_ids = []
+    for source in remove:
+        entry = manifest.pop(source, None)
+        if entry is not None:
+            ids = entry["ids"]
+        else:
+            # Indexes built before the manifest existed: find the chunks by metadata
+            ids = ids_for_source(source)
+        if not ids:
+            print(f"⚠️ {source} is not in the index")
+            continue
+        stale_ids.extend(ids)
+        summary["removed"].append(source)
+
+    new_chunks = []
+    for path in paths:
+        source = os.path.basename(path)
+        digest = file_hash(path)
+        entry = manifest.get(source)
+        if entry and entry["sha256"] == digest:
+            summary["unchanged"].append(source)
+            continue
+        if entry:
+            old_ids = entry["ids"]
+        else:
+            # Indexes built before the manifest existed may already hold this source
+            old_ids = ids_for_source(source)
+        if old_ids:
+            stale_ids.extend(old_ids)
+            summary["replaced"].append(source)
+        else:
+            summary["added"].append(source)
+        chunks = chunk_file(path, chunk_size, chunk_overlap)
+        manifest[source] = {"sha256": digest, "ids": [c[0] for c in chunks]}
+        new_chunks.extend(chunks)
+
+    indexed_ids = set(vector_store.index_to_docstore_id.values())
+    stale_ids = [i for i in stale_ids if i in indexed_ids]
+    if stale_ids:
+        vector_store.delete(stale_ids)
+
+    if new_chunks:
+        vectors = asyncio.run(aembed_in_batches(
+            embeddings, [c[1] for c in new_chunks], batch_size, concurrency
+        ))
+        vector_store.add_embeddings(
+            list(zip([c[1] for c in new_chunks], vectors)),
+            metadatas=[c[2] for c in new_chunks],
+            ids=[c[0] for c in new_chunks],
+        )
+    summary["chunks"] = len(new_chunks)
+
+    if stale_ids or new_chunks or not is_store_folder(folder):
+        export_store(vector_store, folder)
+        write_manifest(folder, manifest)
+    return summary
+
+
+def resolve_folder(target: str) -> str:
+    """Accepts a state name from INDEX_FOLDER_DIC, an index folder name, or a path."""
+    if target in INDEX_FOLDER_DIC:
+        return os.path.join(INDEX_ROOT, INDEX_FOLDER_DIC[target])
+    if os.path.sep in target or os.path.isdir(target):
+        return target
+    return os.path.join(INDEX_ROOT, target)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or incrementally update a state index.")
+    parser.add_argument("target", help="State name, index folder name or path")
+    parser.add_argument("paths", nargs="*", help="PDF or text files to add or refresh")
+    parser.add_argument("--remove", nargs="*", default=[], help="Source file names to drop")
+    parser.add_argument("--embeddings", choices=["azure", "local"], default="azure")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=150)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    folder = resolve_folder(args.target)
+    summary = ingest(
+        folder,
+        args.paths,
+        remove=args.remove,
+        embeddings=get_ingest_embeddings(args.embeddings),
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        batch_size=args.batch_size,
+        concurrency=max(1, args.concurrency),
+    )
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""Local intent classifier consulted before the LLM router.
+
+Two tiers run in-process:
+- a lexicon match on greetings/small talk, labour-law vocabulary and the
+  jurisdictions in INDEX_FOLDER_DIC (see core/jurisdictions.py);
+- a small embedding-similarity classifier against labelled exemplars, used when
+  sentence-transformers is installed and its model has finished loading.
+
+classify_intent returns (intent, confidence); callers only ask the LLM when the
+confidence is below INTENT_ROUTER_THRESHOLD.
+"""
+import asyncio
+import os
+import re
+import threading
+from .index_registry import INDEX_FOLDER_DIC
+from .jurisdictions import extract_jurisdictions
+
+INTENT_ROUTER_THRESHOLD = float(os.getenv("INTENT_ROUTER_THRESHOLD", "0.85"))
+INTENT_ROUTER_MODEL = os.getenv("INTENT_ROUTER_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+
+SMALL_TALK_WORDS = {
+    "hi", "hii", "hiii", "hello", "hey", "heya", "hola", "namaste", "namaskar",
+    "good", "morning", "afternoon", "evening", "night", "day",
+    "thanks", "thank", "thankyou", "thx", "ty", "you", "so", "much", "a", "lot",
+    "ok", "okay", "k", "cool", "great", "nice", "awesome", "sure",
+    "bye", "goodbye", "see", "ya", "later", "cheers", "there", "all", "team",
+    "how", "are", "r", "u", "doing", "whats", "up", "sup", "yo", "welcome",
+    "what", "s", "is", "who", "your", "name", "i", "am", "me", "it", "again",
+}
+
+LABOUR_LAW_TERMS = {
+    "wage", "wages", "salary", "overtime", "bonus", "gratuity", "allowance", "deduction",
+    "deductions", "fine", "fines", "minimum", "remuneration", "payment", "leave", "holiday",
+    "employer", "employee", "employees", "worker", "workers", "workman", "workmen", "labour",
+    "labor", "contractor", "contract", "establishment", "factory", "factories", "occupier",
+    "register", "registers", "form", "rule", "rules", "section", "sections", "code", "codes",
+    "act", "notification", "draft", "inspector", "facilitator", "compliance", "penalty",
+    "retrenchment", "layoff", "lay-off", "closure", "strike", "lockout", "union", "grievance",
+    "standing", "dispute", "arbitration", "tribunal", "esi", "esic", "epf", "pf", "provident",
+    "maternity", "compensation", "injury", "accident", "safety", "health", "welfare",
+    "canteen", "creche", "shift", "shifts", "hours", "oshwc", "migrant", "apprentice",
+    "gig", "platform", "cess", "licence", "license", "registration", "returns", "audit",
+}
+
+LABOUR_LAW_PHRASES = [
+    r"\bcode on wages\b", r"\bsocial security\b", r"\bindustrial relations\b",
+    r"\boccupational safety\b", r"\bworking conditions\b", r"\bform[\s-]*[ivx\d]+\b",
+    r"\brule\s*\d+", r"\bsection\s*\d+", r"\bfactories act\b", r"\bcontract labour\b",
+]
+
+TECHNICAL_EXEMPLARS = [
+    "What registers must an employer maintain under the Code on Wages?",
+    "How is overtime calculated for factory workers?",
+    "What is the gratuity eligibility under the Social Security Code?",
+    "Which form is used for the register of fines and deductions?",
+    "What are the working hours and rest intervals for women employees?",
+    "Explain the retrenchment notice period under the Industrial Relations Code.",
+    "What are the licence requirements for contractors employing contract labour?",
+    "Compare the standing orders rules of two states.",
+    "What are the penalties for non-payment of minimum wages?",
+    "How should an establishment file annual returns under the draft rules?",
+    "What welfare facilities like canteens and creches are mandatory?",
+    "What does Rule 27 of the state rules say about wage slips?",
+]
+
+GENERAL_EXEMPLARS = [
+    "Hi, how are you?",
+    "Good morning!",
+    "Thanks a lot for the help.",
+    "Who are you?",
+    "What can you do?",
+    "Tell me a joke.",
+    "What's the weather today?",
+    "Who won the cricket match yesterday?",
+    "Recommend a good movie.",
+    "Write a poem about the sea.",
+    "Bye, see you later.",
+    "What is the capital of France?",
+]
+
+
+def _tokens(text: str) -> list:
+    return re.findall(r"[a-z0-9][a-z0-9\-]*", text.lower())
+
+
+PHRASE_PATTERNS = [re.compile(p) for p in LABOUR_LAW_PHRASES]
+
+
+def lexicon_intent(query: str):
+    """Returns (intent, confidence) from keyword matches, or (None, 0.0) when nothing matches."""
+    text = query.lower()
+    tokens = _tokens(text)
+    if not tokens:
+        return "GENERAL", 0.9
+
+    hits = sum(1 for t in tokens if t in LABOUR_LAW_TERMS)
+    hits += sum(1 for p in PHRASE_PATTERNS if p.search(text))
+    if extract_jurisdictions(query, known=INDEX_FOLDER_DIC):
+        # State names or Central always route to TECHNICAL, as in the LLM router prompt
+        hits += 2
+
+    if hits >= 2:
+        return "TECHNICAL", 0.97
+    if hits == 1:
+        return "TECHNICAL", 0.8
+
+    if len(tokens) <= 8 and all(t in SMALL_TALK_WORDS for t in tokens):
+        return "GENERAL", 0.99
+    return None, 0.0
+
+
+class ExemplarClassifier:
+    """Nearest-exemplar cosine classifier over a local sentence-transformers model."""
+
+    def __init__(self, model_name: str = INTENT_ROUTER_MODEL):
+        self.model_name = model_name
+        self._model = None
+        self._exemplars = None
+        self._loading = False
+        self._failed = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(self.model_name, device="cpu")
+            labels = ["TECHNICAL"] * len(TECHNICAL_EXEMPLARS) + ["GENERAL"] * len(GENERAL_EXEMPLARS)
+            vectors = model.encode(
+                TECHNICAL_EXEMPLARS + GENERAL_EXEMPLARS, normalize_embeddings=True
+            )
+            self._exemplars = (vectors, labels)
+            self._model = model
+            print(f"🔹 Intent router model '{self.model_name}' loaded")
+        except Exception as e:
+            self._failed = True
+            print(f"⚠️ Intent router embedding tier disabled: {e}")
+
+    def ready(self) -> bool:
+        """Starts loading in the background on first call; never blocks a request."""
+        if self._model is not None:
+            return True
+        with self._lock:
+            if not self._loading and not self._failed:
+                self._loading = True
+                threading.Thread(target=self._load, daemon=True).start()
+        return False
+
+    def classify(self, query: str):
+        if not self.ready():
+            return None, 0.0
+        vectors, labels = self._exemplars
+        query_vector = self._model.encode([query], normalize_embeddings=True)[0]
+        scores = vectors @ query_vector
+
+        best = {}
+        for label, score in zip(labels, scores):
+            best[label] = max(best.get(label, -1.0), float(score))
+        technical, general = best["TECHNICAL"], best["GENERAL"]
+        intent = "TECHNICAL" if technical >= general else "GENERAL"
+        # Map the similarity margin to a confidence in [0.5, 1.0]
+        confidence = min(1.0, 0.5 + abs(technical - general) * 2.5)
+        return intent, confidence
+
+
+exemplar_classifier = ExemplarClassifier()
+
+
+def _combine(intent, confidence, model_intent, model_confidence):
+    if model_intent is None:
+        return intent, confidence
+    if intent is not None and model_intent == intent:
+        # Both tiers agree; treat them as independent evidence
+        return intent, 1 - (1 - confidence) * (1 - model_confidence)
+    if model_confidence > confidence:
+        return model_intent, model_confidence
+    return intent, confidence
+
+
+def classify_intent(query: str):
+    """Returns (intent, confidence) from the local tiers; intent is None when neither tier applies."""
+    intent, confidence = lexicon_intent(query)
+    if confidence >= INTENT_ROUTER_THRESHOLD:
+        return intent, confidence
+    return _combine(intent, confidence, *exemplar_classifier.classify(query))
+
+
+async def aclassify_intent(query: str):
+    """classify_intent for async callers; the model forward pass runs off the event loop."""
+    intent, confidence = lexicon_intent(query)
+    if confidence >= INTENT_ROUTER_THRESHOLD or not exemplar_classifier.ready():
+        return intent, confidence
+    return _combine(intent, confidence, *await asyncio.to_thread(exemplar_classifier.classify, query))
@@ -0,0 +1,196 @@
+"""In-process jurisdiction extraction.
+
+Canonical state/UT names, aliases, common misspellings, abbreviations and
+regional-script spellings are compiled into Aho-Corasick automata, so a query
+is scanned once regardless of how many names are known. Canonical names are the
+keys used by INDEX_FOLDER_DIC.
+"""
+from collections import deque
+import unicodedata
+
+# canonical name -> (aliases matched case-insensitively, abbreviations matched as written)
+JURISDICTIONS = {
+    "Central": (
+        # Bare "central"/"centre" also mean e.g. a training centre, so only qualified forms match
+        ["central government", "centre government", "central govt", "union government",
+         "central code", "central codes", "central act", "central rules",
+         "केंद्र सरकार", "केन्द्र सरकार", "केंद्रीय सरकार", "केन्द्रीय सरकार"],
+        [],
+    ),
+    "Andhra Pradesh": (["andhra pradesh", "andhra", "आंध्र प्रदेश", "ఆంధ్ర ప్రదేశ్"], ["AP"]),
+    "Arunachal Pradesh": (["arunachal pradesh", "arunachal", "अरुणाचल प्रदेश"], ["AR"]),
+    "Assam": (["assam", "असम", "অসম"], []),
+    "Bihar": (["bihar", "बिहार"], ["BR"]),
+    "Chhattisgarh": (["chhattisgarh", "chattisgarh", "chhatisgarh", "छत्तीसगढ़"], ["CG"]),
+    "Goa": (["goa", "गोवा"], ["GA"]),
+    "Gujarat": (["gujarat", "gujrat", "गुजरात", "ગુજરાત"], ["GJ"]),
+    "Haryana": (["haryana", "हरियाणा"], []),
+    "Himachal Pradesh": (["himachal pradesh", "himachal", "हिमाचल प्रदेश"], ["HP"]),
+    "Jharkhand": (["jharkhand", "jharkand", "झारखंड", "झारखण्ड"], ["JH"]),
+    "Karnataka": (["karnataka", "karnatak", "कर्नाटक", "ಕರ್ನಾಟಕ"], ["KA"]),
+    "Kerala": (["kerala", "keralam", "केरल", "കേരളം"], ["KL"]),
+    "Madhya Pradesh": (["madhya pradesh", "मध्य प्रदेश"], ["MP"]),
+    "Maharashtra": (["maharashtra", "maharastra", "maharashtr", "महाराष्ट्र"], ["MH"]),
+    "Manipur": (["manipur", "मणिपुर"], ["MN"]),
+    "Meghalaya": (["meghalaya", "मेघालय"], ["ML"]),
+    "Mizoram": (["mizoram", "मिज़ोरम", "मिजोरम"], ["MZ"]),
+    "Nagaland": (["nagaland", "नागालैंड"], ["NL"]),
+    "Odisha": (["odisha", "orissa", "ओडिशा", "ଓଡ଼ିଶା"], []),
+    "Punjab": (["punjab", "पंजाब", "ਪੰਜਾਬ"], ["PB"]),
+    "Rajasthan": (["rajasthan", "राजस्थान"], ["RJ"]),
+    "Sikkim": (["sikkim", "सिक्किम"], ["SK"]),
+    "Tamil Nadu": (["tamil nadu", "tamilnadu", "तमिलनाडु", "தமிழ்நாடு"], ["TN"]),
+    "Telangana": (["telangana", "तेलंगाना", "తెలంగాణ"], ["TG", "TS"]),
+    "Tripura": (["tripura", "त्रिपुरा"], ["TR"]),
+    "Uttar Pradesh": (["uttar pradesh", "उत्तर प्रदेश"], ["UP"]),
+    # No "UK": in a labour-law product it far more often means the United Kingdom
+    "Uttarakhand": (["uttarakhand", "uttrakhand", "uttaranchal", "उत्तराखंड", "उत्तराखण्ड"], []),
+    "West Bengal": (["west bengal", "bengal", "पश्चिम बंगाल", "পশ্চিমবঙ্গ"], ["WB"]),
+    "Andaman and Nicobar Islands": (["andaman and nicobar", "andaman & nicobar", "andaman"], []),
+    "Chandigarh": (["chandigarh", "चंडीगढ़"], ["CH"]),
+    "Dadra and Nagar Haveli and Daman and Diu": (
+        ["dadra and nagar haveli", "daman and diu", "dnhdd"], ["DNHDD"],
+    ),
+    "Delhi": (["delhi", "nct of delhi", "new delhi", "दिल्ली"], ["DL", "NCT"]),
+    "Jammu and Kashmir": (["jammu and kashmir", "jammu & kashmir", "जम्मू और कश्मीर"], ["J&K", "JK"]),
+    "Ladakh": (["ladakh", "लद्दाख"], []),
+    "Lakshadweep": (["lakshadweep", "लक्षद्वीप"], ["LD"]),
+    "Puducherry": (["puducherry", "pondicherry", "पुडुचेरी"], ["PY"]),
+}
+
+
+def normalize(text: str) -> str:
+    """Lowercases and collapses whitespace; offsets are not preserved."""
+    return " ".join(text.lower().split())
+
+
+def _is_word_char(ch: str) -> bool:
+    # Letters, digits and combining marks (e.g. Devanagari vowel signs) continue a word
+    return unicodedata.category(ch)[0] in "LMN"
+
+
+class AhoCorasick:
+    """Multi-pattern matcher; each pattern carries a value returned with its matches."""
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+
+    def add(self, pattern: str, value):
+        node = 0
+        for ch in pattern:
+            if ch not in self._goto[node]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._goto[node][ch] = len(self._goto) - 1
+            node = self._goto[node][ch]
+        self._out[node].append((len(pattern), value))
+
+    def build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(ch, 0)
+                if self._fail[child] == child:
+                    self._fail[child] = 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+        return self
+
+    def iter_matches(self, text: str):
+        """Yields (start, end, value) for every whole-word occurrence of a pattern."""
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            for length, value in self._out[node]:
+                start, end = i - length + 1, i + 1
+                if start > 0 and _is_word_char(text[start - 1]) and _is_word_char(text[start]):
+                    continue
+                if end < len(text) and _is_word_char(text[end]) and _is_word_char(text[end - 1]):
+                    continue
+                yield start, end, value
+
+
+# Canonical names that are ordinary words on their own; free text must use an alias
+UNQUALIFIED_NAMES = {"Central"}
+
+
+def _build_matchers():
+    names = AhoCorasick()
+    abbreviations = AhoCorasick()
+    for canonical, (aliases, abbrs) in JURISDICTIONS.items():
+        if canonical not in UNQUALIFIED_NAMES:
+            names.add(normalize(canonical), canonical)
+        for alias in aliases:
+            names.add(normalize(alias), canonical)
+        for abbr in abbrs:
+            abbreviations.add(abbr, canonical)
+    return names.build(), abbreviations.build()
+
+
+NAME_MATCHER, ABBREVIATION_MATCHER = _build_matchers()
+
+_ALIAS_LOOKUP = {}
+for _canonical, (_aliases, _abbrs) in JURISDICTIONS.items():
+    _ALIAS_LOOKUP[normalize(_canonical)] = _canonical
+    for _alias in _aliases:
+        _ALIAS_LOOKUP[normalize(_alias)] = _canonical
+    for _abbr in _abbrs:
+        _ALIAS_LOOKUP[normalize(_abbr)] = _canonical
+
+
+def _longest_non_overlapping(matches):
+    chosen = []
+    for start, end, value in sorted(matches, key=lambda m: (m[0], -(m[1] - m[0]))):
+        if chosen and start < chosen[-1][1]:
+            if end - start > chosen[-1][1] - chosen[-1][0]:
+                chosen[-1] = (start, end, value)
+            continue
+        chosen.append((start, end, value))
+    return chosen
+
+
+def extract_jurisdictions(query: str, known=None) -> list:
+    """
+    Returns canonical jurisdiction names mentioned in the query: full names first,
+    then abbreviations, each in order of first mention.
+    When `known` is given (e.g. INDEX_FOLDER_DIC), names outside it are dropped.
+    """
+    text = normalize(query)
+    matches = _longest_non_overlapping(NAME_MATCHER.iter_matches(text))
+    found = [value for _, _, value in matches]
+    # Abbreviations are matched on the original casing so "up" in prose does not count,
+    # and not at all in all-caps text where every word looks like one
+    if not query.isupper():
+        found += [value for _, _, value in ABBREVIATION_MATCHER.iter_matches(query)]
+
+    result = []
+    for canonical in found:
+        if canonical not in result and (known is None or canonical in known):
+            result.append(canonical)
+    return result
+
+
+def resolve_jurisdiction(name: str):
+    """Maps any known spelling or abbreviation to its canonical name, or None."""
+    if not name:
+        return None
+    return _ALIAS_LOOKUP.get(normalize(name))
+
+
+def resolve_jurisdictions(names, known=None) -> list:
+    """Canonical names for a list of free-form names, deduplicated; unknown names are dropped."""
+    result = []
+    for name in names:
+        canonical = resolve_jurisdiction(name) if isinstance(name, str) else None
+        if canonical and canonical not in result and (known is None or canonical in known):
+            result.append(canonical)
+    return result
@@ -0,0 +1,155 @@
+"""Scalar- and product-quantized variants of a state index, with a recall/memory report.
+
+    python -m core.quantize Maharashtra --kinds sq8 pq --k 10
+    python -m core.quantize guj_ada --queries eval_queries.txt
+
+Variants are written next to the flat index as index.sq8.faiss / index.pq.faiss
+and share its docstore.sqlite, so the FAISS position -> docstore id mapping is
+unchanged. Set INDEX_VARIANT=sq8 (or pq) to serve them; folders without the
+requested variant fall back to the flat index. Re-ingesting a folder deletes its
+variants, since their positions no longer match.
+
+PQ indexes cannot restrict a search to an id range, which the unified index
+(core/unified_index.py) needs for every search, so partitioned folders get no
+pq variant and are served flat under INDEX_VARIANT=pq; sq8 works there.
+
+The report compares each variant with the exact flat index: recall@k on a
+held-out query set, mean per-query latency and resident bytes. Without a
+--queries file, a random 5% of the stored vectors is held out as queries and
+the comparison is made on indexes built from the remaining 95%.
+"""
+import argparse
+import json
+import os
+import time
+import faiss
+import numpy as np
+from .index_store import INDEX_FILE, SELECTOR_VARIANTS, VARIANT_FILES, is_partitioned, is_store_folder
+
+REPORT_FILE = "quantization_report.json"
+
+
+def flat_vectors(folder: str) -> np.ndarray:
+    index = faiss.read_index(os.path.join(folder, INDEX_FILE))
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def make_index(kind: str, vectors: np.ndarray, pq_m: int = 96, pq_nbits: int = 8):
+    """Builds and fills an index of the given kind ('flat', 'sq8' or 'pq')."""
+    d = vectors.shape[1]
+    if kind == "flat":
+        index = faiss.IndexFlatL2(d)
+    elif kind == "sq8":
+        index = faiss.IndexScalarQuantizer(d, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+    elif kind == "pq":
+        if d % pq_m:
+            raise ValueError(f"pq_m={pq_m} must divide the dimension {d}")
+        index = faiss.IndexPQ(d, pq_m, pq_nbits, faiss.METRIC_L2)
+    else:
+        raise ValueError(f"Unknown index kind '{kind}'")
+
+    if not index.is_trained:
+        if kind == "pq" and len(vectors) < 2 ** pq_nbits * 39:
+            print(f"⚠️ {len(vectors)} vectors is few for PQ training with {pq_nbits} bits; recall may suffer")
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def resident_bytes(index) -> int:
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def evaluate(reference, candidate, queries: np.ndarray, k: int) -> dict:
+    """recall@k of candidate against the exact reference, plus latency and size."""
+    _, truth = reference.search(queries, k)
+
+    start = time.perf_counter()
+    found = np.vstack([candidate.search(q.reshape(1, -1), k)[1] for q in queries])
+    latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    recalls = [
+        len(set(t[t != -1]) & set(f[f != -1])) / max(1, (t != -1).sum())
+        for t, f in zip(truth, found)
+    ]
+    return {
+        f"recall@{k}": round(float(np.mean(recalls)), 4),
+        "latency_ms": round(latency_ms, 4),
+        "resident_bytes": resident_bytes(candidate),
+    }
+
+
+def build_variants(folder: str, kinds: list, k: int = 10, queries: np.ndarray = None,
+                   pq_m: int = 96, pq_nbits: int = 8, seed: int = 0) -> dict:
+    """Writes the requested variants of folder's flat index and returns the report."""
+    if is_partitioned(folder):
+        unsupported = [kind for kind in kinds if kind not in SELECTOR_VARIANTS]
+        if unsupported:
+            raise ValueError(
+                f"{folder} is searched by id range, which {', '.join(unsupported)} indexes cannot do; "
+                f"use {', '.join(sorted(SELECTOR_VARIANTS - {'flat'}))}"
+            )
+    vectors = flat_vectors(folder)
+
+    if queries is None:
+        rng = np.random.default_rng(seed)
+        order = rng.permutation(len(vectors))
+        held_out = max(1, len(vectors) // 20)
+        queries, base = vectors[order[:held_out]], vectors[order[held_out:]]
+        query_source = f"{held_out} held-out stored vectors"
+    else:
+        base = vectors
+        query_source = f"{len(queries)} supplied queries"
+
+    reference = make_index("flat", base)
+    report = {
+        "folder": folder,
+        "vectors": int(len(vectors)),
+        "dimension": int(vectors.shape[1]),
+        "queries": query_source,
+        "variants": {"flat": evaluate(reference, reference, queries, k)},
+    }
+
+    for kind in kinds:
+        print(f"🔹 Building {kind} variant of {folder}...")
+        full = make_index(kind, vectors, pq_m, pq_nbits)
+        candidate = full if base is vectors else make_index(kind, base, pq_m, pq_nbits)
+        report["variants"][kind] = evaluate(reference, candidate, queries, k)
+        faiss.write_index(full, os.path.join(folder, VARIANT_FILES[kind]))
+
+    with open(os.path.join(folder, REPORT_FILE), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def _embed_query_file(path: str, kind: str) -> np.ndarray:
+    from .ingest import get_ingest_embeddings
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [line.strip() for line in f if line.strip()]
+    vectors = get_ingest_embeddings(kind).embed_documents(lines)
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def main(argv=None):
+    from .ingest import resolve_folder
+
+    parser = argparse.ArgumentParser(description="Build quantized index variants and a recall report.")
+    parser.add_argument("target", help="State name, index folder name or path")
+    parser.add_argument("--kinds", nargs="+", choices=sorted(VARIANT_FILES), default=["sq8", "pq"])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", help="Text file with one evaluation query per line")
+    parser.add_argument("--embeddings", choices=["azure", "local"], default="azure")
+    parser.add_argument("--pq-m", type=int, default=96, help="PQ sub-quantizers (must divide 1536)")
+    parser.add_argument("--pq-nbits", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    folder = resolve_folder(args.target)
+    if not is_store_folder(folder):
+        print("⚠️ Folder is not in the core.index_store format; the variant will not be served until it is converted")
+    queries = _embed_query_file(args.queries, args.embeddings) if args.queries else None
+    report = build_variants(folder, args.kinds, args.k, queries, args.pq_m, args.pq_nbits)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,79 +1,33 @@
+import asyncio
 from datetime import datetime
-import os
-from pathlib import Path
-from dotenv import load_dotenv
-from langchain_openai import AzureChatOpenAI
-from langchain_core.prompts import PromptTemplate
-from .tech_query_test import process_tech_query
+from .clients import get_llm
+from .query_understanding import aunderstand_query
+from .tech_query_test import aprocess_tech_query, astream_tech_query
 import json
 
-# ===================== LOAD ENV =====================
-ROOT_DIR = Path(__file__).resolve().parents[2]
-load_dotenv(ROOT_DIR / ".env")
-
-API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
-AZURE_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
-API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION")
-CHAT_DEPLOYMENT = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT")
-
-if not API_KEY or not AZURE_ENDPOINT or not CHAT_DEPLOYMENT:
-    raise RuntimeError("Azure OpenAI config missing. Check .env location.")
-
 # ===================== LLM =====================
-llm = AzureChatOpenAI(
-    azure_deployment=CHAT_DEPLOYMENT,
-    api_key=API_KEY,
-    azure_endpoint=AZURE_ENDPOINT,
-    openai_api_version=API_VERSION,
-    temperature=0
-)
-
-router_prompt = PromptTemplate(
-    input_variables=["query"],
-    template="""
-You are an intelligent routing assistant. Your task is to classify the user's query as one of the following intents:
+llm = get_llm()
 
-- GENERAL: Greetings, chitchat, small talk, out-of-domain, irrelevant, or casual questions.
-- TECHNICAL: Queries that are related to any labour law and likely need technical documentation or expert knowledge. If any state names or Central comes up route strictly here
-
-Respond strictly in this JSON format:
-{{"intent": "<intent_type>"}}
+def general_prompt(query: str) -> str:
+    return f"""
+If the user greets, reply with a polite greeting.
+If the query is casual, irrelevant, or outside labour laws,
+politely decline.
 
-Query: {query}
+User query:
+{query}
 """
-)
-
-import json
 
-def route_query(llm, query: str) -> str:
-    chain = router_prompt | llm
-    result = chain.invoke({"query": query})
-
-    try:
-        data = json.loads(result.content.strip())
-        return data.get("intent", "GENERAL")
-    except json.JSONDecodeError:
-        # Fail-safe fallback
-        return "GENERAL"
-
-def process_query(query, state, perspective_name, chat_history, session_id):
+async def aprocess_query(query, state, perspective_name, chat_history, session_id):
     print(chat_history)
-    # Route the query
-    intent = route_query(llm, f"{query} for {state}")
+    # Route, extract states and expand in a single call
+    understanding = await aunderstand_query(llm, query, state)
+    intent = understanding["intent"]
 
     print("🔀 Routed intent:", intent)
 
     if intent == "GENERAL":
-        response = llm.invoke(
-            f"""
-If the user greets, reply with a polite greeting.
-If the query is casual, irrelevant, or outside labour laws,
-politely decline.
-
-User query:
-{query}
-"""
-        )
+        response = await llm.ainvoke(general_prompt(query))
         return response.content
 
     elif intent == "TECHNICAL":
@@ -83,6 +37,30 @@ User query:
         #     if query == "":
         #         print("")
         # else: 
-        return process_tech_query(query, state, perspective_name, chat_history)
+        return await aprocess_tech_query(query, state, perspective_name, chat_history, understanding)
 
     return "Unable to determine query intent."
+
+async def astream_query(query, state, perspective_name, chat_history, session_id):
+    """Streaming variant of aprocess_query yielding citations and token events."""
+    understanding = await aunderstand_query(llm, query, state)
+    intent = understanding["intent"]
+
+    print("🔀 Routed intent:", intent)
+
+    if intent == "TECHNICAL":
+        async for event in astream_tech_query(query, state, perspective_name, chat_history, understanding):
+            yield event
+        return
+
+    yield {"type": "citations", "citations": []}
+    if intent == "GENERAL":
+        async for chunk in llm.astream(general_prompt(query)):
+            if chunk.content:
+                yield {"type": "token", "content": chunk.content}
+    else:
+        yield {"type": "token", "content": "Unable to determine query intent."}
+
+def process_query(query, state, perspective_name, chat_history, session_id):
+    """Synchronous entry point for scripts; the API uses aprocess_query."""
+    return asyncio.run(aprocess_query(query, state, perspective_name, chat_history, session_id))
@@ -0,0 +1,127 @@
+"""Single pre-retrieval LLM call returning intent, jurisdictions and expansion terms."""
+from collections import OrderedDict
+import json
+import os
+import threading
+from langchain_core.prompts import PromptTemplate
+from .index_registry import INDEX_FOLDER_DIC
+from .intent_router import INTENT_ROUTER_THRESHOLD, aclassify_intent
+from .jurisdictions import extract_jurisdictions, resolve_jurisdictions
+
+UNDERSTANDING_CACHE_SIZE = int(os.getenv("UNDERSTANDING_CACHE_SIZE", "1024"))
+
+understanding_prompt = PromptTemplate(
+    input_variables=["query", "state"],
+    template="""
+You are the query understanding assistant of an Indian labour law chatbot. For the user's query:
+
+1. Classify the intent as one of:
+- GENERAL: Greetings, chitchat, small talk, out-of-domain, irrelevant, or casual questions.
+- TECHNICAL: Queries that are related to any labour law and likely need technical documentation or expert knowledge. If any state names or Central comes up route strictly here
+2. Extract the Indian state names and Central mentioned in the query (empty list if none).
+3. For TECHNICAL queries, generate EXACTLY 10 short, relevant search phrases related to the query.
+   - Focus on legal terminology
+   - Include state-specific context if relevant
+   - Do NOT explain anything
+   For GENERAL queries return an empty list.
+
+Respond strictly in this JSON format:
+{{"intent": "<intent_type>", "states": ["Maharashtra", "Central"], "terms": ["term1", "term2", "..."]}}
+
+Selected state: {state}
+Query: {query}
+"""
+)
+
+
+class UnderstandingCache:
+    """Thread-safe LRU of parsed understanding results keyed by (query, state)."""
+
+    def __init__(self, max_size: int = UNDERSTANDING_CACHE_SIZE):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(query: str, state: str) -> tuple:
+        return (" ".join(query.lower().split()), state)
+
+    def get(self, query: str, state: str):
+        key = self.key(query, state)
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, query: str, state: str, value: dict):
+        key = self.key(query, state)
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+
+understanding_cache = UnderstandingCache()
+
+
+def parse_understanding(content: str):
+    """Returns the parsed result, or None when the reply is not the expected JSON."""
+    try:
+        data = json.loads(content.strip())
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(data, dict):
+        return None
+
+    states = data.get("states") or []
+    terms = data.get("terms") or []
+    return {
+        "intent": data.get("intent", "GENERAL"),
+        "states": [s for s in states if isinstance(s, str)],
+        # ---- Hard limit to avoid context explosion ----
+        "terms": [t for t in terms if isinstance(t, str)][:10],
+    }
+
+
+async def aunderstand_query(llm, query: str, state: str) -> dict:
+    """
+    Classifies, extracts jurisdictions and expands the query in one chat completion.
+    Repeated queries are answered from the cache without calling the LLM.
+    """
+    cached = understanding_cache.get(query, state)
+    if cached is not None:
+        return cached
+
+    # Confident small talk never needs the LLM
+    local_intent, confidence = await aclassify_intent(query)
+    if local_intent == "GENERAL" and confidence >= INTENT_ROUTER_THRESHOLD:
+        return {"intent": "GENERAL", "states": [], "terms": []}
+
+    chain = understanding_prompt | llm
+    result = await chain.ainvoke({"query": query, "state": state})
+    understanding = parse_understanding(result.content)
+
+    if understanding is None:
+        if local_intent == "TECHNICAL" and confidence >= INTENT_ROUTER_THRESHOLD:
+            states = extract_jurisdictions(query, known=INDEX_FOLDER_DIC)
+            return {"intent": "TECHNICAL", "states": states, "terms": []}
+        # Fail-safe fallback, not cached so the next attempt can succeed
+        return {"intent": "GENERAL", "states": [], "terms": []}
+
+    if local_intent == "TECHNICAL" and confidence >= INTENT_ROUTER_THRESHOLD:
+        understanding["intent"] = "TECHNICAL"
+
+    # Jurisdictions come from the deterministic matcher; the LLM's list is only a fallback
+    understanding["states"] = (
+        extract_jurisdictions(query, known=INDEX_FOLDER_DIC)
+        or resolve_jurisdictions(understanding["states"], known=INDEX_FOLDER_DIC)
+    )
+
+    understanding_cache.put(query, state, understanding)
+    return understanding
@@ -0,0 +1,120 @@
+"""Optional cross-encoder reranking of retrieved chunks on CPU.
+
+Retrieval over-fetches RERANK_CANDIDATES chunks per state; a local
+sentence-transformers CrossEncoder scores every (query, chunk) pair in one
+batched forward pass and only the best RERANK_KEEP chunks per state go into
+the prompt. The model loads in the background on first use, like the intent
+router's, so requests never wait for it: until it is ready, and whenever
+scoring would exceed RERANK_BUDGET_MS, the fused retrieval order is kept.
+
+Enable with RERANK_ENABLED=true.
+"""
+import asyncio
+import os
+import threading
+import time
+
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+RERANK_KEEP = int(os.getenv("RERANK_KEEP", "4"))
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "300"))
+# Tokens per (query, chunk) pair; longer chunks are truncated, which bounds the cost per pair
+RERANK_MAX_LENGTH = int(os.getenv("RERANK_MAX_LENGTH", "256"))
+
+
+class CrossEncoderReranker:
+    """Lazily loaded CrossEncoder with a running estimate of its cost per pair."""
+
+    def __init__(self, model_name: str = RERANK_MODEL, max_length: int = RERANK_MAX_LENGTH):
+        self.model_name = model_name
+        self.max_length = max_length
+        self._model = None
+        self._loading = False
+        self._failed = False
+        self._lock = threading.Lock()
+        self.ms_per_pair = None
+
+    def _load(self):
+        try:
+            from sentence_transformers import CrossEncoder
+            model = CrossEncoder(self.model_name, max_length=self.max_length, device="cpu")
+            # The first forward pass is much slower than the rest; keep it out of the estimate
+            model.predict([("warm up", "warm up")], show_progress_bar=False)
+            self._model = model
+            print(f"🔹 Reranker model '{self.model_name}' loaded")
+        except Exception as e:
+            self._failed = True
+            print(f"⚠️ Reranking disabled: {e}")
+
+    def ready(self) -> bool:
+        """Starts loading in the background on first call; never blocks a request."""
+        if self._model is not None:
+            return True
+        with self._lock:
+            if not self._loading and not self._failed:
+                self._loading = True
+                threading.Thread(target=self._load, daemon=True).start()
+        return False
+
+    def affordable_pairs(self, budget_ms: float) -> int:
+        """How many pairs fit in the budget, from the observed cost per pair."""
+        if self.ms_per_pair is None:
+            return RERANK_CANDIDATES
+        return max(1, int(budget_ms * 0.8 / self.ms_per_pair))
+
+    def score(self, query: str, texts: list) -> list:
+        """Relevance scores for every text, from one batched forward pass."""
+        start = time.perf_counter()
+        scores = self._model.predict(
+            [(query, t) for t in texts], batch_size=len(texts), show_progress_bar=False
+        )
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        per_pair = elapsed_ms / len(texts)
+        self.ms_per_pair = per_pair if self.ms_per_pair is None else 0.8 * self.ms_per_pair + 0.2 * per_pair
+        print(f"🔹 Reranked {len(texts)} chunks in {elapsed_ms:.0f} ms")
+        return [float(s) for s in scores]
+
+
+reranker = CrossEncoderReranker()
+
+
+def _keep_per_group(docs: list, keep: int, group_key: str) -> list:
+    taken = {}
+    kept = []
+    for doc in docs:
+        group = doc.metadata.get(group_key) if group_key else None
+        if taken.get(group, 0) >= keep:
+            continue
+        taken[group] = taken.get(group, 0) + 1
+        kept.append(doc)
+    return kept
+
+
+async def arerank(query: str, docs: list, keep: int, group_key: str = None,
+                  budget_ms: float = RERANK_BUDGET_MS) -> list:
+    """
+    Reorders docs by cross-encoder score and keeps the best `keep` per group
+    (docs with the same metadata[group_key]). Candidates beyond what the budget
+    affords keep their retrieval order after the scored ones; if scoring misses
+    the budget or the model is not loaded, the retrieval order is used as is.
+    """
+    if not docs or not reranker.ready():
+        return _keep_per_group(docs, keep, group_key)
+
+    count = min(len(docs), reranker.affordable_pairs(budget_ms))
+    candidates, rest = docs[:count], docs[count:]
+    try:
+        scores = await asyncio.wait_for(
+            asyncio.to_thread(reranker.score, query, [d.page_content for d in candidates]),
+            timeout=budget_ms / 1000
+        )
+    except asyncio.TimeoutError:
+        print(f"⚠️ Reranking exceeded {budget_ms:.0f} ms; using retrieval order")
+        return _keep_per_group(docs, keep, group_key)
+    except Exception as e:
+        print(f"⚠️ Reranking failed: {e}")
+        return _keep_per_group(docs, keep, group_key)
+
+    ranked = [d for _, d in sorted(zip(scores, candidates), key=lambda pair: pair[0], reverse=True)]
+    return _keep_per_group(ranked + rest, keep, group_key)
@@ -0,0 +1,85 @@
+"""Multi-vector retrieval over a FAISS store with reciprocal rank fusion.
+
+The original query and its expansion terms are embedded in one batched request
+and searched in one batched FAISS call; the per-vector rankings are merged with
+reciprocal rank fusion (RRF) and deduplicated by docstore id. With hybrid
+retrieval on, a BM25 ranking of the original query (core/bm25.py) is fused in
+as one more list, so literal references like "Rule 27" are not lost.
+"""
+import asyncio
+import os
+import faiss
+import numpy as np
+from .bm25 import search_ids_by_text
+
+# "fusion": embed query + terms separately and fuse; "concat": legacy single expanded string
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "fusion")
+RRF_K = int(os.getenv("RRF_K", "60"))
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "true").lower() == "true"
+# Weight of the BM25 list in the fusion; the original query's dense list has 2.0
+BM25_WEIGHT = float(os.getenv("BM25_WEIGHT", "1.5"))
+
+
+def reciprocal_rank_fusion(ranked_lists, k: int = RRF_K, weights=None) -> list:
+    """Merges ranked id lists into [(id, score)] sorted by descending RRF score."""
+    scores = {}
+    for list_index, ranked in enumerate(ranked_lists):
+        weight = weights[list_index] if weights else 1.0
+        for rank, item_id in enumerate(ranked):
+            scores[item_id] = scores.get(item_id, 0.0) + weight / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def search_ids_by_vectors(vector_store, vectors, k: int, params=None) -> list:
+    """
+    One batched FAISS search; returns a ranked docstore-id list per query vector.
+    `params` is an optional faiss.SearchParameters, e.g. with an ID selector.
+    """
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    if getattr(vector_store, "_normalize_L2", False):
+        matrix = matrix.copy()
+        faiss.normalize_L2(matrix)
+
+    if params is None:
+        _, indices = vector_store.index.search(matrix, k)
+    else:
+        _, indices = vector_store.index.search(matrix, k, params=params)
+    ranked_lists = []
+    for row in indices:
+        ranked_lists.append([
+            vector_store.index_to_docstore_id[int(i)] for i in row if i != -1
+        ])
+    return ranked_lists
+
+
+def fusion_weights(ranked_lists: list, lexical: bool) -> list:
+    # The original query (first vector) counts double so expansions cannot drown it out
+    dense = len(ranked_lists) - (1 if lexical else 0)
+    return [2.0] + [1.0] * (dense - 1) + ([BM25_WEIGHT] if lexical else [])
+
+
+def fused_search_by_vectors(vector_store, vectors, k: int, query: str = None) -> list:
+    """
+    Top-k documents after fusing the rankings of every query vector, and of a
+    BM25 search for `query` when given and hybrid retrieval is enabled.
+    """
+    ranked_lists = search_ids_by_vectors(vector_store, vectors, k)
+    lexical = bool(query) and HYBRID_RETRIEVAL
+    if lexical:
+        ranked_lists.append(search_ids_by_text(vector_store, query, k))
+    fused = reciprocal_rank_fusion(ranked_lists, weights=fusion_weights(ranked_lists, lexical))[:k]
+
+    docs = []
+    for docstore_id, score in fused:
+        doc = vector_store.docstore.search(docstore_id)
+        if isinstance(doc, str):
+            # InMemoryDocstore returns an error string for missing ids
+            continue
+        docs.append(doc)
+    return docs
+
+
+async def afused_search_by_vectors(vector_store, vectors, k: int, query: str = None) -> list:
+    return await asyncio.to_thread(fused_search_by_vectors, vector_store, vectors, k, query)
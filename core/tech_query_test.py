@@ -1,85 +1,47 @@
-def process_tech_query(query, state, perspective_name, chat_history):
-    import os
-    import re
-    from langchain_openai import AzureChatOpenAI, AzureOpenAIEmbeddings
-    from langchain_core.prompts import PromptTemplate
-    from langchain_community.vectorstores import FAISS
-    from langchain_community.embeddings import SentenceTransformerEmbeddings
-    import os
-    from pathlib import Path
-    from dotenv import load_dotenv
-    from .test_comparsion import states_query
-
-    INDEX_FOLDER_DIC = {
-        "Maharashtra": "maha_ada",
-        "Gujarat": "guj_ada",
-        "Uttarakhand": "uk_ada",
-        "Central": "cen_ada",
-        "Jharkhand": "jha_ada",
-        "Karnataka": "ka_ada",
-        "Uttar Pradesh": "up_ada",
-    }
-
-    # ===================== LOAD ENV =====================
-    ROOT_DIR = Path(__file__).resolve().parents[2]
-    load_dotenv(ROOT_DIR / ".env")
-    EMBEDDING_DEPLOYMENT_NAME = "text-embedding-ada-002"
-    API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
-    AZURE_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
-    API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION")
-    CHAT_DEPLOYMENT = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT")
-
-    if not API_KEY or not AZURE_ENDPOINT or not CHAT_DEPLOYMENT:
-        raise RuntimeError("Azure OpenAI config missing. Check .env location.")
-
-    INDEX_FOLDER = f"core/unified_index_state/{INDEX_FOLDER_DIC[state]}"
-
-    # ======================================================
-    # UTILS
-    # ======================================================
-    def safe_text(text: str) -> str:
-        """Remove bad unicode/control characters"""
-        text = text.encode("utf-8", errors="ignore").decode("utf-8")
-        text = re.sub(r"\s+", " ", text)
-        return text.strip()
-
-    def format_docs_with_citation(docs):
-        blocks = []
-        for d in docs:
-            source = d.metadata.get("source", "Unknown")
-            page = d.metadata.get("page", "?")
-            content = safe_text(d.page_content)
-            blocks.append(
-                f"[SOURCE: {source} | PAGE: {page}]\n{content}"
-            )
-        return "\n\n".join(blocks)
-
-    # ======================================================
-    # MAIN
-    # ======================================================
-
-    print("🔹 Loading embeddings (local)...")
-    embeddings = AzureOpenAIEmbeddings(azure_deployment=EMBEDDING_DEPLOYMENT_NAME, openai_api_version=API_VERSION)
-
-    print("🔹 Loading FAISS index...")
-    vector_store = FAISS.load_local(
-        INDEX_FOLDER,
-        embeddings,
-        allow_dangerous_deserialization=True
-    )
-
-    print("🔹 Initializing Azure OpenAI (safe mode)...")
-    llm = AzureChatOpenAI(
-        azure_deployment=CHAT_DEPLOYMENT,
-        azure_endpoint=AZURE_ENDPOINT,
-        openai_api_version=API_VERSION,
-        api_key=API_KEY,
-        temperature=0
-    )
+import asyncio
+import json
+import os
+import re
+from langchain_core.prompts import PromptTemplate
+from .clients import get_embeddings, get_llm
+from .context_packing import pack_context
+from .index_registry import aget_vector_store
+from .jurisdictions import resolve_jurisdiction
+from .rerank import RERANK_CANDIDATES, RERANK_ENABLED, RERANK_KEEP, arerank
+from .retrieval import RETRIEVAL_MODE, afused_search_by_vectors
+from .unified_index import USE_UNIFIED_INDEX, aget_unified_index
+from .test_comparsion import astates_query
+
+# Upper bound on retrieval for a query: the selected state and every compared state.
+COMPARISON_RETRIEVAL_TIMEOUT_S = float(os.getenv("COMPARISON_RETRIEVAL_TIMEOUT_S", "8"))
+
+
+# ======================================================
+# UTILS
+# ======================================================
+def safe_text(text: str) -> str:
+    """Remove bad unicode/control characters"""
+    text = text.encode("utf-8", errors="ignore").decode("utf-8")
+    text = re.sub(r"\s+", " ", text)
+    return text.strip()
+
+
+def format_docs_with_citation(docs):
+    blocks = []
+    for d in docs:
+        source = d.metadata.get("source", "Unknown")
+        page = d.metadata.get("page", "?")
+        content = safe_text(d.page_content)
+        blocks.append(
+            f"[SOURCE: {source} | PAGE: {page}]\n{content}"
+        )
+    return "\n\n".join(blocks)
 
-    states = states_query(llm, query)
 
-    prompt_template = """You are a Senior Legal Analyst specializing in Indian Labour Reforms, including:
+# ======================================================
+# PROMPTS
+# ======================================================
+prompt_template = """You are a Senior Legal Analyst specializing in Indian Labour Reforms, including:
 - Code on Wages
 - Occupational Safety, Health and Working Conditions Code (OSHWC)
 - Code on Social Security
@@ -188,18 +150,14 @@ DETAILED ANALYST RESPONSE (IN ENGLISH):
 
 """
 
-    PROMPT = PromptTemplate(
-        template=prompt_template,
-        input_variables=["context", "question", "perspective_name", "chat_history"]
-    )
-
-    query = query
-    print(f"\n❓ QUERY: {query}")
+PROMPT = PromptTemplate(
+    template=prompt_template,
+    input_variables=["final_context", "question", "perspective_name", "chat_history"]
+)
 
-    def expand_query(query: str, chat_history: str = "") -> str:
-        prompt = PromptTemplate(
-            input_variables=["query", "chat_history"],
-            template="""
+expand_prompt = PromptTemplate(
+    input_variables=["query", "chat_history"],
+    template="""
     You are a legal query expansion assistant.
 
     Generate EXACTLY 10 short, relevant search phrases related to the query.
@@ -213,61 +171,163 @@ DETAILED ANALYST RESPONSE (IN ENGLISH):
     Query: {query}
     Chat History: {chat_history}
     """
-        )
+)
+
+
+def build_expanded_query(query: str, expanded_terms: list) -> str:
+    # ---- Hard limit to avoid context explosion ----
+    expanded_terms = expanded_terms[:10]
+
+    # ---- Controlled expansion ----
+    expanded_query = query + " " + " ".join(expanded_terms)
+
+    return expanded_query.strip()
+
+
+def _parse_terms(content: str) -> list:
+    # ---- Safe JSON parsing ----
+    try:
+        data = json.loads(content)
+        expanded_terms = data.get("terms", [])
+    except Exception:
+        expanded_terms = []
+
+    # ---- Hard limit to avoid context explosion ----
+    return expanded_terms[:10]
+
 
-        chain = prompt | llm
+def expand_query(llm, query: str, chat_history: str = "") -> str:
+    chain = expand_prompt | llm
+    response = chain.invoke({
+        "query": query,
+        "chat_history": chat_history
+    })
+    return build_expanded_query(query, _parse_terms(response.content))
 
-        response = chain.invoke({
-            "query": query,
-            "chat_history": chat_history
-        })
 
-        # ---- Safe JSON parsing ----
-        try:
-            data = json.loads(response.content)
-            expanded_terms = data.get("terms", [])
-        except Exception:
-            expanded_terms = []
+async def aexpand_terms(llm, query: str, chat_history: str = "") -> list:
+    chain = expand_prompt | llm
+    response = await chain.ainvoke({
+        "query": query,
+        "chat_history": chat_history
+    })
+    return _parse_terms(response.content)
 
-        # ---- Hard limit to avoid context explosion ----
-        expanded_terms = expanded_terms[:10]
 
-        # ---- Controlled expansion ----
-        expanded_query = query + " " + " ".join(expanded_terms)
+async def aexpand_query(llm, query: str, chat_history: str = "") -> str:
+    return build_expanded_query(query, await aexpand_terms(llm, query, chat_history))
 
-        return expanded_query.strip()
 
+# ======================================================
+# MAIN
+# ======================================================
+async def _asearch_state(state, query, query_vectors, k):
+    vector_store = await aget_vector_store(state)
+    return await afused_search_by_vectors(vector_store, query_vectors, k, query)
 
-    query = expand_query(query)
-    # print(query)
 
-    retriever = vector_store.as_retriever(search_kwargs={"k": 6})
-    docs = retriever.invoke(query)
+async def _aretrieve_for_states(k_by_state, query, query_vectors):
+    """
+    Top documents for each state, {state: k} -> {state: docs}, fusing dense and
+    BM25 rankings. The unified index serves every state it covers in one search;
+    other states are searched in their own stores. With reranking on, more
+    candidates are fetched and the cross-encoder keeps at most RERANK_KEEP per state.
+    """
+    fetch = {s: max(k, RERANK_CANDIDATES) if RERANK_ENABLED else k for s, k in k_by_state.items()}
+    results = {}
+    separate = list(fetch)
+    if USE_UNIFIED_INDEX:
+        unified = await aget_unified_index()
+        folders = {s: unified.folder_for(s) for s in fetch}
+        covered = [s for s in fetch if folders[s] is not None]
+        separate = [s for s in fetch if folders[s] is None]
+        if covered:
+            docs = await asyncio.to_thread(unified.search, query_vectors, covered, fetch, query)
+            # Unified results carry their partition in metadata["jurisdiction"]
+            for s in covered:
+                results[s] = [d for d in docs if d.metadata.get("jurisdiction") == folders[s]]
+    if separate:
+        found = await asyncio.gather(*(_asearch_state(s, query, query_vectors, fetch[s]) for s in separate))
+        results.update(zip(separate, found))
+
+    if RERANK_ENABLED:
+        states = list(results)
+        reranked = await asyncio.gather(*(
+            arerank(query, results[s], min(k_by_state[s], RERANK_KEEP)) for s in states
+        ))
+        results = dict(zip(states, reranked))
+    return results
+
+
+async def aembed_for_retrieval(query: str, terms: list) -> list:
+    """Query vectors for retrieval, computed in a single embedding request."""
+    if RETRIEVAL_MODE == "concat":
+        return await get_embeddings().aembed_documents([build_expanded_query(query, terms)])
+    return await get_embeddings().aembed_documents([query] + terms[:10])
+
+
+async def abuild_tech_prompt(query, state, perspective_name, chat_history, understanding=None):
+    """
+    Runs retrieval and returns (final_prompt, docs); final_prompt is None when nothing is retrieved.
+    When the query understanding result is passed in, its states and terms are used
+    instead of separate state extraction and expansion calls.
+    """
+    # Indexes and clients are shared across requests; see core/index_registry.py
+    llm = get_llm()
 
+    print(f"\n❓ QUERY: {query}")
+
+    if understanding is not None:
+        states = understanding["states"]
+        terms = understanding["terms"]
+    else:
+        states = await astates_query(llm, query)
+        terms = await aexpand_terms(llm, query)
+
+    # Embed once and reuse the vectors for every jurisdiction's index.
+    query_vectors = await aembed_for_retrieval(query, terms)
+
+    # The selected state gets more documents than the states it is compared with
+    selected = resolve_jurisdiction(state) or state
+    other_states = [s for s in dict.fromkeys(states) if s != selected]
+    k_by_state = {state: 6, **{s: 3 for s in other_states}}
+    if USE_UNIFIED_INDEX:
+        # One search over the unified index serves the selected and the compared states
+        tasks = {asyncio.create_task(_aretrieve_for_states(k_by_state, query, query_vectors)): list(k_by_state)}
+    else:
+        # Each state's store is searched concurrently, so a slow one only costs its own results
+        tasks = {
+            asyncio.create_task(_aretrieve_for_states({s: k}, query, query_vectors)): [s]
+            for s, k in k_by_state.items()
+        }
+
+    # Every retrieval shares one deadline; whatever is left is cancelled and awaited on the way out
+    try:
+        done, pending = await asyncio.wait(tasks, timeout=COMPARISON_RETRIEVAL_TIMEOUT_S)
+        results = {}
+        for task in pending:
+            print(f"⚠️ Retrieval for {', '.join(tasks[task])} missed the {COMPARISON_RETRIEVAL_TIMEOUT_S}s deadline")
+        for task in done:
+            if task.exception() is None:
+                results.update(task.result())
+            elif state in tasks[task]:
+                raise task.exception()
+            else:
+                print(f"⚠️ Retrieval for {', '.join(tasks[task])} failed: {task.exception()}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    docs = results.get(state, [])
     if not docs:
         print("❌ No documents retrieved.")
-        return
+        return None, []
+    groups = [docs] + [results[s] for s in other_states if results.get(s)]
 
-    context_main = format_docs_with_citation(docs)
-    context_from_the_loop = ""
-    num = len(states)
-
-    if num > 0:
-        while num >= 0 :
-            if states[num - 1] != state:
-                vector_store = FAISS.load_local(
-                    f"core/unified_index_state/{INDEX_FOLDER_DIC[states[num-1]]}",
-                    embeddings,
-                    allow_dangerous_deserialization=True
-                )
-                retriever = vector_store.as_retriever(search_kwargs={"k": 3})
-                docs = retriever.invoke(query)
-                context = format_docs_with_citation(docs)
-                print(context)
-                context_from_the_loop = f"{context} {context_from_the_loop}"
-            num = num-1
-
-    final_context = f"{context_main} {context_from_the_loop}"
+    # Token-budgeted, deduplicated context; citations only cover the chunks that made it in
+    final_context, packed_groups = pack_context(groups, lambda d: format_docs_with_citation([d]))
+    all_docs = [d for group in packed_groups for d in group]
 
     final_prompt = PROMPT.format(
         final_context=final_context,
@@ -275,11 +335,47 @@ DETAILED ANALYST RESPONSE (IN ENGLISH):
         perspective_name=perspective_name,
         chat_history=chat_history or "No prior conversation."
     )
+    return final_prompt, all_docs
+
+
+def citations_for(docs) -> list:
+    """Unique (source, page) pairs in retrieval order."""
+    citations = []
+    for d in docs:
+        citation = {
+            "source": d.metadata.get("source", "Unknown"),
+            "page": d.metadata.get("page", "?")
+        }
+        if citation not in citations:
+            citations.append(citation)
+    return citations
+
+
+async def aprocess_tech_query(query, state, perspective_name, chat_history, understanding=None):
+    final_prompt, _ = await abuild_tech_prompt(query, state, perspective_name, chat_history, understanding)
+    if final_prompt is None:
+        return
 
     print("\n🤖 Generating answer...")
-    response = llm.invoke(final_prompt)
+    response = await get_llm().ainvoke(final_prompt)
 
     print("\n📢 ANSWER:")
     return response.content
 
 
+async def astream_tech_query(query, state, perspective_name, chat_history, understanding=None):
+    """Yields a citations event, then answer tokens as the LLM produces them."""
+    final_prompt, docs = await abuild_tech_prompt(query, state, perspective_name, chat_history, understanding)
+    yield {"type": "citations", "citations": citations_for(docs)}
+    if final_prompt is None:
+        return
+
+    print("\n🤖 Streaming answer...")
+    async for chunk in get_llm().astream(final_prompt):
+        if chunk.content:
+            yield {"type": "token", "content": chunk.content}
+
+
+def process_tech_query(query, state, perspective_name, chat_history):
+    """Synchronous entry point for scripts; the API uses aprocess_tech_query."""
+    return asyncio.run(aprocess_tech_query(query, state, perspective_name, chat_history))
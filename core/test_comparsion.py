@@ -1,10 +1,13 @@
 from datetime import datetime
-import os
-from pathlib import Path
-from dotenv import load_dotenv
-from langchain_openai import AzureChatOpenAI
 from langchain_core.prompts import PromptTemplate
+from .clients import get_llm
+from .index_registry import INDEX_FOLDER_DIC
+from .jurisdictions import extract_jurisdictions, resolve_jurisdictions
 import json
+import os
+
+# States are extracted in-process; the LLM is only asked when nothing matched and this is enabled.
+JURISDICTION_LLM_FALLBACK = os.getenv("JURISDICTION_LLM_FALLBACK", "false").lower() == "true"
 
 
 states_prompt = PromptTemplate(
@@ -19,31 +22,11 @@ Query: {query}
 )
 
 
-# ===================== LOAD ENV =====================
-ROOT_DIR = Path(__file__).resolve().parents[2]
-load_dotenv(ROOT_DIR / ".env")
-
-API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
-AZURE_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
-API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION")
-CHAT_DEPLOYMENT = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT")
-
-if not API_KEY or not AZURE_ENDPOINT or not CHAT_DEPLOYMENT:
-    raise RuntimeError("Azure OpenAI config missing. Check .env location.")
-
 # ===================== LLM =====================
-llm = AzureChatOpenAI(
-    azure_deployment=CHAT_DEPLOYMENT,
-    api_key=API_KEY,
-    azure_endpoint=AZURE_ENDPOINT,
-    openai_api_version=API_VERSION,
-    temperature=0
-)
+llm = get_llm()
 
-def states_query(llm, query: str) -> str:
-    chain = states_prompt | llm
-    result = chain.invoke({"query": query})
-    data = json.loads(result.content)
+def _parse_states(content: str) -> list:
+    data = json.loads(content)
     states = data["states"]
     print(len(states))
 
@@ -54,3 +37,20 @@ def states_query(llm, query: str) -> str:
 
     return states
 
+def states_query(llm, query: str, use_llm_fallback: bool = JURISDICTION_LLM_FALLBACK) -> list:
+    states = extract_jurisdictions(query, known=INDEX_FOLDER_DIC)
+    if states or not use_llm_fallback:
+        return states
+
+    chain = states_prompt | llm
+    result = chain.invoke({"query": query})
+    return resolve_jurisdictions(_parse_states(result.content), known=INDEX_FOLDER_DIC)
+
+async def astates_query(llm, query: str, use_llm_fallback: bool = JURISDICTION_LLM_FALLBACK) -> list:
+    states = extract_jurisdictions(query, known=INDEX_FOLDER_DIC)
+    if states or not use_llm_fallback:
+        return states
+
+    chain = states_prompt | llm
+    result = await chain.ainvoke({"query": query})
+    return resolve_jurisdictions(_parse_states(result.content), known=INDEX_FOLDER_DIC)
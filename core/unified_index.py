@@ -0,0 +1,195 @@
+"""One vector index for every jurisdiction, partitioned by contiguous id ranges.
+
+Each state's vectors occupy a contiguous range of ids in a single FAISS index
+that shares one docstore. A search is restricted to one state, several states
+or "Central + state" with an ID-selector, so a comparison query is served by a
+single FAISS call over a single resident index instead of one store per state.
+
+Build it from the per-state indexes with:
+    python -m core.unified_index build
+and enable it with USE_UNIFIED_INDEX=true. The build copies stored vectors and
+needs no embeddings service. Folders without vectors (e.g. only an index.pkl)
+are left out with a warning, and their states are searched in their own folders.
+"""
+import asyncio
+from functools import lru_cache
+import json
+import os
+import sys
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from .index_registry import INDEX_FOLDER_DIC, INDEX_ROOT, index_registry
+from .index_store import DOCSTORE_FILE, PARTITIONS_FILE, export_store, is_store_folder, load_store
+from .bm25 import search_ids_by_text
+from .retrieval import HYBRID_RETRIEVAL, fusion_weights, reciprocal_rank_fusion, search_ids_by_vectors
+
+UNIFIED_INDEX_FOLDER = os.getenv("UNIFIED_INDEX_FOLDER", "unified_all")
+USE_UNIFIED_INDEX = os.getenv("USE_UNIFIED_INDEX", "false").lower() == "true"
+
+
+class StoredVectorsOnly(Embeddings):
+    """Placeholder embeddings for the build, which only copies vectors that are already stored."""
+
+    def embed_documents(self, texts: list) -> list:
+        raise RuntimeError("The unified index build does not embed text")
+
+    def embed_query(self, text: str) -> list:
+        raise RuntimeError("The unified index build does not embed text")
+
+
+def build_unified_index(index_root=INDEX_ROOT, folder_name: str = UNIFIED_INDEX_FOLDER,
+                        folder_map: dict = INDEX_FOLDER_DIC, embeddings: Embeddings = None) -> dict:
+    """
+    Merges the per-state indexes into index_root/folder_name and returns the
+    partition table. States whose folder has no vectors are left out with a warning.
+    """
+    embeddings = embeddings or StoredVectorsOnly()
+    chunks = []
+    docs = {}
+    index_to_docstore_id = {}
+    partitions = {}
+    skipped = []
+    offset = 0
+
+    for folder in dict.fromkeys(folder_map.values()):
+        path = os.path.join(index_root, folder)
+        try:
+            if is_store_folder(path):
+                # Exact vectors: the combined index is quantized separately if at all
+                store = load_store(path, embeddings, variant="flat")
+            elif os.path.exists(os.path.join(path, "index.faiss")):
+                store = FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+            else:
+                raise FileNotFoundError(f"no index.faiss or {DOCSTORE_FILE} in {path}")
+        except Exception as e:
+            print(f"⚠️ Skipping '{folder}': {e}")
+            skipped.append(folder)
+            continue
+
+        count = store.index.ntotal
+        chunks.append(store.index.reconstruct_n(0, count))
+        for i in range(count):
+            docstore_id = store.index_to_docstore_id[i]
+            doc = store.docstore.search(docstore_id)
+            docs[docstore_id] = Document(
+                page_content=doc.page_content,
+                metadata={**doc.metadata, "jurisdiction": folder}
+            )
+            index_to_docstore_id[offset + i] = docstore_id
+        partitions[folder] = [offset, offset + count]
+        print(f"🔹 Added '{folder}' as ids [{offset}, {offset + count})")
+        offset += count
+
+    if skipped:
+        states = [state for state, folder in folder_map.items() if folder in skipped]
+        print(f"⚠️ The unified index does not cover: {', '.join(states)}; they are searched in their own folders")
+    if not chunks:
+        raise RuntimeError("No per-state index could be loaded.")
+
+    vectors = np.vstack(chunks).astype(np.float32)
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+
+    unified = FAISS(embeddings, index, InMemoryDocstore(docs), index_to_docstore_id)
+    path = os.path.join(index_root, folder_name)
+    export_store(unified, path)
+    with open(os.path.join(path, PARTITIONS_FILE), "w", encoding="utf-8") as f:
+        json.dump({"partitions": partitions}, f, indent=2)
+    return partitions
+
+
+@lru_cache(maxsize=None)
+def _read_partitions(path: str, mtime: float) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return {k: tuple(v) for k, v in json.load(f)["partitions"].items()}
+
+
+def load_partitions(folder_name: str = UNIFIED_INDEX_FOLDER) -> dict:
+    path = os.path.join(index_registry.index_root, folder_name, PARTITIONS_FILE)
+    return _read_partitions(path, os.path.getmtime(path))
+
+
+class UnifiedIndex:
+    """Partition-aware search over the combined store."""
+
+    def __init__(self, vector_store: FAISS, partitions: dict):
+        self.vector_store = vector_store
+        self.partitions = partitions
+
+    def folder_for(self, state: str):
+        """The partition serving a state, or None when the index does not cover it."""
+        try:
+            folder = index_registry.folder_for(state)
+        except KeyError:
+            return None
+        return folder if folder in self.partitions else None
+
+    def search(self, vectors, states, k_per_state, query: str = None) -> list:
+        """
+        Fused top documents across the given states in one FAISS call. k_per_state
+        caps the documents from each state, either one count for all or a
+        {state: count} dict. `query` adds a BM25 ranking over the same partitions
+        when hybrid retrieval is enabled. States outside the index are ignored.
+        """
+        quotas = {}
+        for state in states:
+            folder = self.folder_for(state)
+            if folder is not None:
+                k = k_per_state[state] if isinstance(k_per_state, dict) else k_per_state
+                quotas[folder] = max(quotas.get(folder, 0), k)
+        if not quotas:
+            return []
+        folders = list(quotas)
+        total = sum(quotas.values())
+
+        # Selectors are SWIG objects; keep references alive for the duration of the search
+        selectors = [faiss.IDSelectorRange(*self.partitions[f]) for f in folders]
+        selector = selectors[0]
+        for other in selectors[1:]:
+            selector = faiss.IDSelectorOr(selector, other)
+            selectors.append(selector)
+        params = faiss.SearchParameters(sel=selector)
+
+        # Over-fetch so the per-state cap can still be filled after fusion
+        fetch_k = total * 4
+        ranked_lists = search_ids_by_vectors(self.vector_store, vectors, fetch_k, params=params)
+        lexical = bool(query) and HYBRID_RETRIEVAL
+        if lexical:
+            ranges = [self.partitions[f] for f in folders]
+            ranked_lists.append(search_ids_by_text(self.vector_store, query, fetch_k, ranges))
+        weights = fusion_weights(ranked_lists, lexical)
+
+        taken = {f: 0 for f in folders}
+        docs = []
+        for docstore_id, _ in reciprocal_rank_fusion(ranked_lists, weights=weights):
+            doc = self.vector_store.docstore.search(docstore_id)
+            if isinstance(doc, str):
+                continue
+            folder = doc.metadata.get("jurisdiction")
+            if folder not in quotas or taken[folder] >= quotas[folder]:
+                continue
+            taken[folder] += 1
+            docs.append(doc)
+            if len(docs) == total:
+                break
+        return docs
+
+
+def get_unified_index() -> UnifiedIndex:
+    """Returns the combined index, loaded once through the shared registry."""
+    vector_store = index_registry.get_folder(UNIFIED_INDEX_FOLDER)
+    return UnifiedIndex(vector_store, load_partitions())
+
+
+async def aget_unified_index() -> UnifiedIndex:
+    return await asyncio.to_thread(get_unified_index)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["build"]:
+        sys.exit("usage: python -m core.unified_index build")
+    print(build_unified_index())
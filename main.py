@@ -1,13 +1,21 @@
 from fastapi import FastAPI, UploadFile, HTTPException
-from core.query_pipeline import process_query
-from utility.manage_sessions import authenticate_user_service, get_user_sessions, get_chat_session, update_or_create_session_service, star_user_session, delete_user_session, rename_user_session
-# from utility.feedback import submit_feedback_logic, remove_feedback_logic
+from core.query_pipeline import aprocess_query, astream_query
+from core.chat_history import arefresh_summary, build_chat_history
+from core.clients import get_llm
+from utility.sessions_writer import sessions_writer
+from utility.session_store import close_session_store
+from utility.manage_sessions import authenticate_user_service, aget_user_sessions, aget_user_sessions_page, aget_chat_session, aget_chat_messages, update_or_create_session_service, save_session_summary, star_user_session, delete_user_session, restore_user_session, delete_user_sessions, restore_user_sessions, rename_user_session, session_cache_stats
+from utility.feedback import submit_feedback_logic, remove_feedback_logic, langsmith_feedback_queue
 from fastapi import BackgroundTasks, Query
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime, timezone
 from fastapi.responses import StreamingResponse, JSONResponse
+from starlette.background import BackgroundTask
 import uvicorn
+import asyncio
+import json
+import uuid
 from fastapi.middleware.cors import CORSMiddleware
 # from langsmith import traceable
 import os
@@ -43,6 +51,14 @@ app.add_middleware(
 
 # client = Client()
 
+
+@app.on_event("shutdown")
+def flush_session_metadata():
+    # Session metadata writes are coalesced; write out whatever is still queued
+    sessions_writer.flush_all()
+    close_session_store()
+    langsmith_feedback_queue.join()
+
 # Input format
 class AuthInput(BaseModel):
     user_id: str
@@ -74,6 +90,23 @@ class DeleteSessionRequest(BaseModel):
     session_id: str
 
 
+class RestoreSessionRequest(BaseModel):
+    user_id: str  # can be email
+    session_id: str
+
+
+class BulkDeleteSessionsRequest(BaseModel):
+    user_id: str  # can be email
+    session_ids: List[str] = []
+    all_sessions: bool = False  # delete every active session
+    updated_before: Optional[str] = None  # ISO timestamp; delete sessions last updated before it
+
+
+class BulkRestoreSessionsRequest(BaseModel):
+    user_id: str  # can be email
+    session_ids: List[str]
+
+
 # Define the feedback model
 class FeedbackRequest(BaseModel):
     user_id: str
@@ -99,6 +132,49 @@ class RenameSessionRequest(BaseModel):
     session_id: str
     new_title: str
 
+def build_turn_messages(request: QueryRequest, run_id: str, response, bot_timestamp: str) -> list:
+    """User and bot messages persisted for one query/response turn."""
+    return [
+        {
+            "role": "user",
+            "message_id": request.message_id,
+            "state_id": request.state_id,
+            "state_name": request.state_name,
+            "perspective_id": request.perspective_id,
+            "perspective_name": request.perspective_name,
+            "message": request.query,
+            "timestamp": request.timestamp,
+            "feedback_status": "not given"
+        },
+        {
+            "role": "bot",
+            "message_id": run_id,
+            "state_id": request.state_id,
+            "state_name": request.state_name,
+            "perspective_id": request.perspective_id,
+            "perspective_name": request.perspective_name,
+            "message": response,
+            "timestamp": bot_timestamp,
+            "feedback_status": "not given"
+        }
+    ]
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def refresh_session_summary(user_id: str, session_id: str):
+    """Extends the session's running summary once older turns leave the prompt window."""
+    try:
+        session_data = await aget_chat_session(user_id, session_id) or {}
+        summary = await arefresh_summary(get_llm(), session_data)
+        if summary is not None:
+            await asyncio.to_thread(save_session_summary, user_id, session_id, summary)
+    except Exception as e:
+        print(f"⚠️ Summary refresh failed for session {session_id}: {e}")
+
+
 @app.post("/authenticate", tags=["Authentication"])
 async def authenticate_user(auth_input: AuthInput):
     return authenticate_user_service(auth_input.user_id)
@@ -108,15 +184,14 @@ async def handle_query(request: QueryRequest, background_tasks: BackgroundTasks)
     try:
         user_id = request.user_id.split("@")[0]
         session_id = request.session_id
-        message_id = request.message_id
         query = request.query
 
-        # ✅ 1. Fetch existing chat history
-        session_data = get_chat_session(user_id, session_id) or {}
-        chat_history = session_data.get("messages", [])
+        # ✅ 1. Fetch existing chat history (summary + recent turns, token-bounded)
+        session_data = await aget_chat_session(user_id, session_id) or {}
+        chat_history = build_chat_history(session_data)
 
         # ✅ 2. Pass history into LLM pipeline
-        response = process_query(
+        response = await aprocess_query(
             query=query,
             state=request.state_name,
             perspective_name=request.perspective_name,
@@ -124,7 +199,6 @@ async def handle_query(request: QueryRequest, background_tasks: BackgroundTasks)
             session_id=session_id,
         )
 
-        import uuid
         run_id = str(uuid.uuid4())
         bot_timestamp = datetime.now(timezone.utc).isoformat()
 
@@ -140,32 +214,11 @@ async def handle_query(request: QueryRequest, background_tasks: BackgroundTasks)
             update_or_create_session_service,
             user_id=user_id,
             session_id=session_id,
-            messages=[
-                {
-                    "role": "user",
-                    "message_id": message_id,
-                    "state_id": request.state_id,
-                    "state_name": request.state_name,
-                    "perspective_id": request.perspective_id,
-                    "perspective_name": request.perspective_name,
-                    "message": query,
-                    "timestamp": request.timestamp,
-                    "feedback_status": "not given"
-                },
-                {
-                    "role": "bot",
-                    "message_id": run_id,
-                    "state_id": request.state_id,
-                    "state_name": request.state_name,
-                    "perspective_id": request.perspective_id,
-                    "perspective_name": request.perspective_name,
-                    "message": response,
-                    "timestamp": bot_timestamp,
-                    "feedback_status": "not given"
-                }
-            ],
+            messages=build_turn_messages(request, run_id, response, bot_timestamp),
             title=request.session_title
         )
+        # Runs after the turn above is saved
+        background_tasks.add_task(refresh_session_summary, user_id, session_id)
 
         return result
 
@@ -176,12 +229,82 @@ async def handle_query(request: QueryRequest, background_tasks: BackgroundTasks)
         }
 
 
+@app.post("/query/stream", tags=["Query"])
+async def handle_query_stream(request: QueryRequest):
+    """
+    Server-Sent Events variant of /query: a 'citations' event first, then 'token'
+    events as the answer is generated, then 'done' once the turn is persisted.
+    """
+    user_id = request.user_id.split("@")[0]
+    session_id = request.session_id
+    run_id = str(uuid.uuid4())
+
+    async def event_stream():
+        tokens = []
+        try:
+            session_data = await aget_chat_session(user_id, session_id) or {}
+            chat_history = build_chat_history(session_data)
+
+            async for event in astream_query(
+                query=request.query,
+                state=request.state_name,
+                perspective_name=request.perspective_name,
+                chat_history=chat_history,
+                session_id=session_id,
+            ):
+                if event["type"] == "token":
+                    tokens.append(event["content"])
+                    yield sse_event("token", {"content": event["content"]})
+                else:
+                    yield sse_event(event["type"], event)
+
+            response = "".join(tokens)
+            bot_timestamp = datetime.now(timezone.utc).isoformat()
+            await asyncio.to_thread(
+                update_or_create_session_service,
+                user_id=user_id,
+                session_id=session_id,
+                messages=build_turn_messages(request, run_id, response, bot_timestamp),
+                title=request.session_title
+            )
+
+            yield sse_event("done", {
+                "run_id": run_id,
+                "state_id": request.state_id,
+                "state_name": request.state_name
+            })
+
+        except Exception as e:
+            yield sse_event("error", {
+                "response": "Error processing the query",
+                "error": str(e)
+            })
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(refresh_session_summary, user_id, session_id)
+    )
+
+
 @app.get("/sessions", tags=["Session"])
-async def fetch_user_sessions(user_id: str = Query(..., description="User email or ID")):
+async def fetch_user_sessions(
+    user_id: str = Query(..., description="User email or ID"),
+    limit: Optional[int] = Query(None, ge=1, le=200, description="Page size; omit for the full list"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    starred: bool = Query(False, description="Only starred sessions"),
+    updated_since: Optional[str] = Query(None, description="ISO timestamp; only sessions updated at or after it")
+):
     try:
         core_user_id = user_id.split("@")[0]
-        sessions = get_user_sessions(core_user_id)
-        return {"status": "success", "sessions": sessions}
+        if limit is None and cursor is None and not starred and updated_since is None:
+            sessions = await aget_user_sessions(core_user_id)
+            return {"status": "success", "sessions": sessions}
+
+        # Paged listing, newest first
+        page = await aget_user_sessions_page(core_user_id, limit or 50, cursor, starred, updated_since)
+        return {"status": "success", "sessions": page["sessions"], "next_cursor": page["next_cursor"]}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
@@ -189,21 +312,39 @@ async def fetch_user_sessions(user_id: str = Query(..., description="User email
 @app.get("/session_history", tags=["Session"])
 async def get_session_chat_history(
     user_id: str = Query(..., description="User email or ID"),
-    session_id: str = Query(..., description="Session ID to fetch history for")
+    session_id: str = Query(..., description="Session ID to fetch history for"),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Number of messages; omit for the whole session"),
+    before: Optional[int] = Query(None, ge=0, description="Only messages with seq below this"),
+    after: Optional[int] = Query(None, ge=0, description="Only messages with seq above this"),
+    headers_only: bool = Query(False, description="Leave out the message text")
 ):
     try:
         core_user_id = user_id.split("@")[0]
-        chat_history = get_chat_session(core_user_id, session_id)
+        if limit is not None or before is not None or after is not None or headers_only:
+            # Windowed read; each message carries its "seq" for the next cursor
+            chat_history = await aget_chat_messages(core_user_id, session_id, limit, before, after, headers_only)
+            return {"status": "success", "chat_history": chat_history}
+
+        chat_history = await aget_chat_session(core_user_id, session_id)
         return {"status": "success", "chat_history": chat_history}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
 
+@app.get("/session_cache_stats", tags=["Session"])
+async def get_session_cache_stats():
+    return {
+        "status": "success",
+        "session_cache": session_cache_stats(),
+        "sessions_writer": sessions_writer.stats()
+    }
+
+
 @app.post("/update_star_status", tags=["Session"])   
 async def star_session(request: StarSessionRequest):
     try:
         user_id = request.user_id.split("@")[0]
-        result = star_user_session(user_id, request.session_id, request.starred)
+        result = await asyncio.to_thread(star_user_session, user_id, request.session_id, request.starred)
         return result
     except Exception as e:
         return {"status": "error", "message": str(e)}
@@ -213,16 +354,45 @@ async def star_session(request: StarSessionRequest):
 async def delete_session(request: DeleteSessionRequest):
     try:
         user_id = request.user_id.split("@")[0]
-        result = delete_user_session(user_id, request.session_id)
+        result = await asyncio.to_thread(delete_user_session, user_id, request.session_id)
         return result
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+
+@app.post("/restore_session", tags=["Session"])
+async def restore_session(request: RestoreSessionRequest):
+    try:
+        user_id = request.user_id.split("@")[0]
+        return await asyncio.to_thread(restore_user_session, user_id, request.session_id)
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
+@app.post("/bulk_delete_sessions", tags=["Session"])
+async def bulk_delete_sessions(request: BulkDeleteSessionsRequest):
+    try:
+        user_id = request.user_id.split("@")[0]
+        return await asyncio.to_thread(
+            delete_user_sessions, user_id, request.session_ids, request.all_sessions, request.updated_before
+        )
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
+@app.post("/bulk_restore_sessions", tags=["Session"])
+async def bulk_restore_sessions(request: BulkRestoreSessionsRequest):
+    try:
+        user_id = request.user_id.split("@")[0]
+        return await asyncio.to_thread(restore_user_sessions, user_id, request.session_ids)
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
 @app.post("/rename_session", tags=["Session"])
 async def rename_session(request: RenameSessionRequest):
     try:
         user_id = request.user_id.split("@")[0]        
-        result = rename_user_session(user_id, request.session_id, request.new_title)
+        result = await asyncio.to_thread(rename_user_session, user_id, request.session_id, request.new_title)
         return {"status": "success", "message": "Session renamed successfully", "result": result}
     except Exception as e:
         return {"status": "error", "message": str(e)}
@@ -274,33 +444,36 @@ async def rename_session(request: RenameSessionRequest):
 
 
 # Feedback endpoint
-# @app.post("/submit-feedback", tags=["Feedback"])
-# async def submit_feedback(feedback: FeedbackRequest):
-#     """
-#     Submit feedback for a bot message and update LangSmith + chat history.
-#     """
-#     try:
-#         user_id = feedback.user_id.split("@")[0]
-#         return submit_feedback_logic(user_id, feedback.session_id, feedback.run_id,
-#                                      feedback.score, feedback.value, feedback.comment)  # Feedback stored + LangSmith logging happens here
-#     except Exception as e:
-#         return {"status": "error", "message": str(e)}
+@app.post("/submit-feedback", tags=["Feedback"])
+async def submit_feedback(feedback: FeedbackRequest):
+    """
+    Submit feedback for a bot message: patch its status, log the event and queue it for LangSmith.
+    """
+    try:
+        user_id = feedback.user_id.split("@")[0]
+        return await asyncio.to_thread(
+            submit_feedback_logic, user_id, feedback.session_id, feedback.run_id,
+            feedback.score, feedback.value, feedback.comment
+        )
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
 
 
-# @app.post("/remove-feedback", tags=["Feedback"])
-# async def remove_feedback(request: RemoveFeedbackRequest):
-#     """
-#     Remove feedback for a bot message (reset status and archive feedback).
-#     """
-#     try:
-#         user_id = request.user_id.split("@")[0]
-#         return remove_feedback_logic(
-#             user_id=user_id,
-#             session_id=request.session_id,
-#             run_id=request.run_id
-#         )
-#     except Exception as e:
-#         return {"status": "error", "message": str(e)}
+@app.post("/remove-feedback", tags=["Feedback"])
+async def remove_feedback(request: RemoveFeedbackRequest):
+    """
+    Remove feedback for a bot message (reset status and log the removal).
+    """
+    try:
+        user_id = request.user_id.split("@")[0]
+        return await asyncio.to_thread(
+            remove_feedback_logic,
+            user_id=user_id,
+            session_id=request.session_id,
+            run_id=request.run_id
+        )
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
 
 
 # @app.post("/feedback", tags=['Feedback'])
@@ -0,0 +1,8 @@
+import os
+
+# Placeholder Azure OpenAI settings so modules that build clients at import time
+# can be imported; tests replace every call that would reach the service.
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "test")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://example.openai.azure.com")
+os.environ.setdefault("AZURE_OPENAI_API_VERSION", "2024-02-01")
+os.environ.setdefault("AZURE_OPENAI_CHAT_DEPLOYMENT", "test")
@@ -0,0 +1,201 @@
+import json
+
+import pytest
+
+from utility.azure_session_store import AzureBlobSessionStore, ConditionFailed, FilesystemContainer
+
+USER = "tester"
+
+
+class RacingContainer(FilesystemContainer):
+    """Lets another writer change the sessions blob just before the store's next conditional write."""
+
+    def __init__(self, root):
+        super().__init__(root)
+        self.race = None
+        self.conflicts = 0
+        self.downloads = []
+
+    async def download(self, name, offset=None, length=None):
+        self.downloads.append((name, offset))
+        return await super().download(name, offset, length)
+
+    async def upload(self, name, data, etag=None):
+        if self.race is not None and name.startswith("sessions/"):
+            race, self.race = self.race, None
+            current, current_etag = await self.download(name)
+            doc = json.loads(current)
+            race(doc)
+            await super().upload(name, json.dumps(doc).encode("utf-8"), current_etag)
+        try:
+            return await super().upload(name, data, etag)
+        except ConditionFailed:
+            self.conflicts += 1
+            raise
+
+
+@pytest.fixture
+def container(tmp_path):
+    return RacingContainer(str(tmp_path))
+
+
+@pytest.fixture
+def store(container):
+    store = AzureBlobSessionStore(container)
+    yield store
+    store.close()
+
+
+def turn(n, timestamp):
+    return [
+        {"role": "user", "message_id": f"q{n}", "message": f"question {n}", "timestamp": timestamp},
+        {"role": "bot", "message_id": f"r{n}", "message": f"answer {n}", "timestamp": timestamp},
+    ]
+
+
+def test_append_creates_and_extends_session(store):
+    first = store.append_messages(USER, "s1", turn(1, "2026-01-01T00:00:00"), "First")
+    assert first["title"] == "First"
+    assert first["created_on"] == "2026-01-01T00:00:00"
+
+    second = store.append_messages(USER, "s1", turn(2, "2026-01-02T00:00:00"), "Ignored")
+    assert second["title"] == "First"
+    assert second["last_updated"] == "2026-01-02T00:00:00"
+
+    chat = store.get_chat_session(USER, "s1")
+    assert [m["message_id"] for m in chat["messages"]] == ["q1", "r1", "q2", "r2"]
+    assert len(store.list_sessions(USER)) == 1
+
+
+def test_page_sessions_newest_first_with_cursor(store):
+    for day in range(1, 6):
+        store.append_messages(USER, f"s{day}", turn(day, f"2026-01-0{day}T00:00:00"), "T")
+
+    first = store.page_sessions(USER, 2)
+    assert [s["session_id"] for s in first["sessions"]] == ["s5", "s4"]
+    rest = store.page_sessions(USER, 10, first["next_cursor"])
+    assert [s["session_id"] for s in rest["sessions"]] == ["s3", "s2", "s1"]
+    assert rest["next_cursor"] is None
+
+
+def test_star_and_rename(store):
+    store.append_messages(USER, "s1", turn(1, "2026-01-01T00:00:00"), "T")
+    store.set_starred(USER, "s1", True)
+    store.rename_session(USER, "s1", "Renamed", "2026-02-01T00:00:00")
+
+    session = store.list_sessions(USER)[0]
+    assert session["starred"] is True
+    assert session["title"] == "Renamed"
+    assert [s["session_id"] for s in store.page_sessions(USER, 10, starred=True)["sessions"]] == ["s1"]
+    with pytest.raises(ValueError):
+        store.set_starred(USER, "missing", True)
+
+
+def test_delete_and_restore(store):
+    store.append_messages(USER, "s1", turn(1, "2026-01-01T00:00:00"), "T")
+    store.append_messages(USER, "s2", turn(2, "2026-01-02T00:00:00"), "T")
+
+    assert store.delete_sessions(USER, ["s1", "s2", "missing"]) == ["s1", "s2"]
+    assert store.list_sessions(USER) == []
+    assert store.get_chat_session(USER, "s1") == {}
+    with pytest.raises(ValueError):
+        store.delete_session(USER, "s1")
+
+    store.restore_session(USER, "s1")
+    assert [s["session_id"] for s in store.list_sessions(USER)] == ["s1"]
+    assert len(store.get_chat_session(USER, "s1")["messages"]) == 2
+
+
+def test_delete_revive_delete_restore(store):
+    store.append_messages(USER, "s1", turn(1, "2026-01-01T00:00:00"), "T")
+    store.delete_session(USER, "s1")
+    store.append_messages(USER, "s1", turn(2, "2026-01-02T00:00:00"), "T")
+    store.delete_session(USER, "s1")
+    store.restore_session(USER, "s1")
+
+    assert [s["session_id"] for s in store.list_sessions(USER)] == ["s1"]
+    # The new turn started a fresh session, as in the local and SQLite stores
+    assert [m["message_id"] for m in store.get_chat_session(USER, "s1")["messages"]] == ["q2", "r2"]
+    assert store.get_message(USER, "s1", "r2")["message"] == "answer 2"
+
+
+def test_conditional_write_conflict_is_retried(store, container):
+    store.append_messages(USER, "s1", turn(1, "2026-01-01T00:00:00"), "T")
+
+    def concurrent_rename(doc):
+        doc["active"][0]["title"] = "Renamed elsewhere"
+
+    container.race = concurrent_rename
+    store.set_starred(USER, "s1", True)
+
+    assert container.conflicts == 1
+    session = store.list_sessions(USER)[0]
+    # Both writes survive: the retry re-read the other writer's change
+    assert session["title"] == "Renamed elsewhere"
+    assert session["starred"] is True
+
+
+def test_message_patch_applies_on_read(store):
+    store.append_messages(USER, "s1", turn(1, "2026-01-01T00:00:00"), "T")
+    store.patch_message(USER, "s1", "r1", {"feedback_status": "good"})
+
+    assert store.get_message(USER, "s1", "r1")["feedback_status"] == "good"
+    assert store.get_chat_session(USER, "s1")["messages"][1]["feedback_status"] == "good"
+
+
+def test_get_message_reads_only_its_range(store, container):
+    for n in range(1, 4):
+        store.append_messages(USER, "s1", turn(n, f"2026-01-0{n}T00:00:00"), "T")
+
+    container.downloads.clear()
+    message = store.get_message(USER, "s1", "r2")
+    assert message["message"] == "answer 2"
+    log_reads = [offset for name, offset in container.downloads if name.endswith("s1.jsonl")]
+    assert len(log_reads) == 1 and log_reads[0] is not None
+    assert store.get_message(USER, "s1", "missing") is None
+
+    store.delete_session(USER, "s1")
+    assert store.get_message(USER, "s1", "r2") is None
+
+
+def test_get_message_falls_back_for_sessions_without_ids(store, container):
+    store.append_messages(USER, "s1", turn(1, "2026-01-01T00:00:00"), "T")
+    store._loop.run(container.delete("chat_history/tester/s1.ids.jsonl"))
+
+    assert store.get_message(USER, "s1", "q1")["message"] == "question 1"
+
+
+def test_session_cache_is_off_by_default_for_azure_blob(monkeypatch):
+    from utility.session_cache import DEFAULT_SESSION_CACHE_SIZE, SessionCache
+
+    monkeypatch.delenv("SESSION_CACHE_SIZE", raising=False)
+    monkeypatch.setenv("SESSION_STORE_BACKEND", "azure_blob")
+    cache = SessionCache()
+    cache.fill(("sessions", USER), [], 0)
+    assert cache.max_entries == 0
+    assert cache.stats()["entries"] == 0
+
+    monkeypatch.setenv("SESSION_CACHE_SIZE", "8")
+    assert SessionCache().max_entries == 8
+
+    monkeypatch.delenv("SESSION_CACHE_SIZE")
+    monkeypatch.setenv("SESSION_STORE_BACKEND", "local_json")
+    assert SessionCache().max_entries == DEFAULT_SESSION_CACHE_SIZE
+
+
+def test_messages_with_unicode_line_separators_round_trip(store):
+    text = "Rule 27\u2028Form I\u2029wages\x85paid\x1cmonthly"
+    store.append_messages(USER, "s1", [
+        {"role": "user", "message_id": "q1", "message": text, "timestamp": "2026-01-01T00:00:00"},
+        {"role": "bot", "message_id": "r1", "message": text, "timestamp": "2026-01-01T00:00:00"},
+    ], "T")
+    store.patch_message(USER, "s1", "r1", {"feedback_status": "good", "comment": text})
+
+    messages = store.get_chat_session(USER, "s1")["messages"]
+    assert [m["message"] for m in messages] == [text, text]
+    assert messages[1]["comment"] == text
+
+    # The ids blob and the ranged read of one record split the same way
+    message = store.get_message(USER, "s1", "r1")
+    assert message["message"] == text
+    assert message["feedback_status"] == "good"
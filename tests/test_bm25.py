@@ -0,0 +1,48 @@
+import pytest
+
+from core.bm25 import BM25Index, tokenize
+
+
+@pytest.mark.parametrize("text, reference", [
+    ("Form-I", "form:i"),
+    ("What is Form I?", "form:i"),
+    ("Rule 27", "rule:27"),
+    ("rule no. 27A", "rule:27a"),
+    ("Section 20(1)", "section:20(1)"),
+    ("Sec. 20(1)(a)", "section:20(1)(a)"),
+    ("Schedule XXIV", "schedule:xxiv"),
+    ("form-ii register", "form:ii"),
+])
+def test_statutory_references_are_single_terms(text, reference):
+    assert reference in tokenize(text)
+
+
+def test_sub_clauses_also_match_the_parent_section():
+    tokens = tokenize("Section 20(1)")
+    assert "section:20(1)" in tokens
+    assert "section:20" in tokens
+
+
+def test_words_that_only_start_like_references_are_not_references():
+    assert not [t for t in tokenize("Form Individual returns") if ":" in t]
+    assert not [t for t in tokenize("I want the form information") if ":" in t]
+    # Stopwords are dropped
+    assert "the" not in tokenize("the register of wages")
+
+
+def test_literal_identifiers_rank_the_chunk_that_cites_them_first():
+    index = BM25Index([
+        "Every establishment shall register in Form II within thirty days.",
+        "The employer shall maintain the register in Form-I as per Rule 27.",
+        "Rule 28 prescribes the wages register; Section 20(1) covers overtime.",
+        "Overtime wages are paid at twice the ordinary rate of wages.",
+    ])
+    assert index.search("What is Form I?", 1)[0][0] == 1
+    assert index.search("Rule 27", 1)[0][0] == 1
+    assert index.search("section 20", 1)[0][0] == 2
+
+
+def test_search_respects_position_ranges():
+    index = BM25Index(["Rule 27 in Maharashtra", "Rule 27 in Gujarat", "Rule 27 centrally"])
+    assert {p for p, _ in index.search("rule 27", 5, ranges=[(1, 3)])} == {1, 2}
+    assert index.search("form 99", 5) == []
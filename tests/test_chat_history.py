@@ -0,0 +1,54 @@
+import asyncio
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from core.chat_history import arefresh_summary, build_chat_history, window_start
+
+
+def conversation(n, words=40):
+    return [
+        {"role": "user" if i % 2 == 0 else "bot", "message": f"message{i} " + "wages " * words}
+        for i in range(n)
+    ]
+
+
+def rendered(history):
+    return [line.split()[1] for line in history.splitlines() if line.startswith(("User:", "Assistant:"))]
+
+
+def test_window_fits_the_budget_without_a_summary_gap():
+    messages = conversation(10)
+    start = window_start(messages, 200)
+    assert 0 < start < 10
+
+    summary = {"text": "Earlier turns about wages.", "covered": start}
+    history = build_chat_history({"messages": messages, "summary": summary}, budget=200)
+    assert history.startswith("Summary of the earlier conversation:")
+    assert rendered(history)[0] == f"message{start}"
+
+
+def test_messages_after_a_lagging_summary_are_kept():
+    messages = conversation(10)
+    # The summary was last refreshed two messages in; the rest has not been folded in yet
+    summary = {"text": "Earlier turns about wages.", "covered": 2}
+    history = build_chat_history({"messages": messages, "summary": summary}, budget=200)
+    assert rendered(history) == [f"message{i}" for i in range(2, 10)]
+
+
+def test_without_a_summary_nothing_is_dropped():
+    messages = conversation(10)
+    assert rendered(build_chat_history({"messages": messages}, budget=200)) == [f"message{i}" for i in range(10)]
+
+
+def test_refreshed_summary_and_window_meet():
+    messages = conversation(10)
+    llm = RunnableLambda(lambda prompt: AIMessage(content="Earlier turns about wages."))
+    summary = asyncio.run(arefresh_summary(llm, {"messages": messages}, budget=400))
+    assert 0 < summary["covered"] < 10
+
+    # The refresh reserves room for a full-length summary, so the window may overlap it but never leaves a gap
+    history = build_chat_history({"messages": messages, "summary": summary}, budget=400)
+    first = int(rendered(history)[0].removeprefix("message"))
+    assert first <= summary["covered"]
+    assert rendered(history)[-1] == "message9"
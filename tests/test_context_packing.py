@@ -0,0 +1,60 @@
+from langchain_core.documents import Document
+
+from core.context_packing import count_tokens, minhash, pack_context, similarity
+
+
+def doc(text, source="rules.pdf", page="1"):
+    return Document(page_content=text, metadata={"source": source, "page": page})
+
+
+def block(d):
+    return f"[SOURCE: {d.metadata['source']} | PAGE: {d.metadata['page']}]\n{d.page_content}"
+
+
+PASSAGE = ("Every employer shall maintain a register of workers in Form-I under Rule 27 and "
+           "shall produce it before the Inspector-cum-Facilitator on demand during working hours.")
+
+
+def test_minhash_estimates_shingle_similarity():
+    near = PASSAGE.replace("on demand", "when demanded")
+    other = "Gratuity is payable to an employee after five years of continuous service with one employer."
+    assert similarity(minhash(PASSAGE), minhash(PASSAGE)) == 1.0
+    assert similarity(minhash(PASSAGE), minhash(near)) > 0.5
+    assert similarity(minhash(PASSAGE), minhash(other)) < 0.2
+
+
+def test_near_duplicates_across_groups_are_dropped():
+    groups = [
+        [doc(PASSAGE, "mh_rules.pdf", "4")],
+        [doc(PASSAGE + " ", "guj_rules.pdf", "9"), doc("Gujarat overtime is paid at twice the rate.", "guj_rules.pdf", "10")],
+    ]
+    context, packed = pack_context(groups, block, budget=1000)
+    assert [len(g) for g in packed] == [1, 1]
+    assert packed[1][0].metadata["page"] == "10"
+    assert context.count("Form-I") == 1
+
+
+def test_budget_is_respected_and_citation_tags_stay_whole():
+    docs = [doc(f"Rule {i} sets the wage period for category {i} workers. " * 8, page=str(i)) for i in range(10)]
+    budget = 200
+    context, packed = pack_context([docs], block, budget=budget)
+    assert 0 < len(packed[0]) < 10
+    assert count_tokens(context) <= budget
+    for chunk in context.split("\n\n"):
+        assert chunk.startswith("[SOURCE: rules.pdf | PAGE: ")
+
+
+def test_every_group_gets_its_best_chunk_before_mmr():
+    selected = [doc(f"Maharashtra rule {i} about shops and establishments registration fees.", page=str(i)) for i in range(6)]
+    compared = [doc("Karnataka prescribes a different registration fee for shops.", "ka_rules.pdf", "2")]
+    tokens = count_tokens(block(selected[0])) + 1
+    _, packed = pack_context([selected, compared], block, budget=tokens * 2)
+    assert len(packed[1]) == 1
+    assert packed[0][0] is selected[0]
+
+
+def test_packed_groups_keep_retrieval_order():
+    docs = [doc(f"Distinct provision number {i} on {topic}.", page=str(i))
+            for i, topic in enumerate(["wages", "bonus", "gratuity", "leave"])]
+    _, packed = pack_context([docs], block, budget=1000)
+    assert packed[0] == docs
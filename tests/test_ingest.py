@@ -0,0 +1,78 @@
+import os
+
+from core.index_store import is_store_folder, load_store
+from core.ingest import HashingEmbeddings, chunk_file, ingest, read_manifest, write_manifest
+
+EMBEDDINGS = HashingEmbeddings(64)
+
+
+def write(tmp_path, name, text):
+    path = tmp_path / "sources" / name
+    path.parent.mkdir(exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def indexed(folder):
+    store = load_store(folder, EMBEDDINGS)
+    try:
+        docs = [store.docstore.search(i) for i in store.index_to_docstore_id.values()]
+        assert store.index.ntotal == len(docs)
+        return sorted((d.metadata["source"], d.metadata["page"], d.page_content) for d in docs)
+    finally:
+        store.docstore.close()
+
+
+def run(folder, paths=(), remove=()):
+    return ingest(folder, list(paths), remove=list(remove), embeddings=EMBEDDINGS, chunk_size=200, chunk_overlap=0)
+
+
+def test_chunks_keep_source_and_page(tmp_path):
+    path = write(tmp_path, "rules.txt", "Rule 1 on wages.\fRule 2 on overtime.")
+    chunks = chunk_file(path)
+    assert [(c[2]["source"], c[2]["page"]) for c in chunks] == [("rules.txt", "1"), ("rules.txt", "2")]
+
+
+def test_add_skip_replace_and_remove(tmp_path):
+    folder = str(tmp_path / "maha_ada")
+    a = write(tmp_path, "a.txt", "Rule 27 requires Form-I.\fRule 28 sets the wage period.")
+    b = write(tmp_path, "b.txt", "Gratuity is payable after five years.")
+
+    summary = run(folder, [a, b])
+    assert summary["added"] == ["a.txt", "b.txt"] and summary["chunks"] == 3
+    assert is_store_folder(folder)
+    assert len(indexed(folder)) == 3
+
+    # Unchanged files are not re-embedded
+    summary = run(folder, [a, b])
+    assert summary["unchanged"] == ["a.txt", "b.txt"] and summary["chunks"] == 0
+
+    # A changed file replaces only its own chunks
+    write(tmp_path, "a.txt", "Rule 27 now requires Form-II.")
+    summary = run(folder, [a])
+    assert summary["replaced"] == ["a.txt"] and summary["chunks"] == 1
+    assert [c[2] for c in indexed(folder)] == ["Rule 27 now requires Form-II.", "Gratuity is payable after five years."]
+
+    summary = run(folder, remove=["b.txt", "missing.txt"])
+    assert summary["removed"] == ["b.txt"]
+    assert [c[0] for c in indexed(folder)] == ["a.txt"]
+    assert set(read_manifest(folder)) == {"a.txt"}
+
+
+def test_sources_without_manifest_entries_are_replaced(tmp_path):
+    folder = str(tmp_path / "guj_ada")
+    a = write(tmp_path, "a.txt", "Old text of rule 5.")
+    b = write(tmp_path, "b.txt", "Rule 6 on leave.")
+    run(folder, [a, b])
+    # Indexes built before the manifest existed have none
+    write_manifest(folder, {})
+
+    write(tmp_path, "a.txt", "New text of rule 5.")
+    summary = run(folder, [a])
+    assert summary["replaced"] == ["a.txt"]
+    assert [c[2] for c in indexed(folder)] == ["New text of rule 5.", "Rule 6 on leave."]
+
+    summary = run(folder, remove=["b.txt"])
+    assert summary["removed"] == ["b.txt"]
+    assert [c[2] for c in indexed(folder)] == ["New text of rule 5."]
+    assert os.path.exists(os.path.join(folder, "manifest.json"))
@@ -0,0 +1,44 @@
+import pytest
+
+from core.jurisdictions import extract_jurisdictions, resolve_jurisdiction, resolve_jurisdictions
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("What is Form I under Rule 27 in Maharashtra?", ["Maharashtra"]),
+    ("Compare maharastra and Karnataka overtime", ["Maharashtra", "Karnataka"]),
+    ("UP and MP minimum wages", ["Uttar Pradesh", "Madhya Pradesh"]),
+    ("Gratuity rules in MH", ["Maharashtra"]),
+    ("महाराष्ट्र में न्यूनतम वेतन", ["Maharashtra"]),
+    ("What do the central government rules say?", ["Central"]),
+    ("Union government notification on wages", ["Central"]),
+    ("Andhra Pradesh and Telangana bonus rules", ["Andhra Pradesh", "Telangana"]),
+])
+def test_extracts_mentioned_jurisdictions(query, expected):
+    assert extract_jurisdictions(query) == expected
+
+
+@pytest.mark.parametrize("query", [
+    "How does this compare with UK labour law?",
+    "UK rules for factory workers",
+    "Explain the central idea of the act",
+    "Wages at a training centre",
+    "Is a call center covered?",
+    "HR policy on earned leave",
+    "OD training for supervisors",
+    "UT rules on overtime",
+    "Can I go up to the next grade?",
+    "WHAT ARE THE RULES IN UP",
+])
+def test_everyday_words_and_foreign_abbreviations_do_not_match(query):
+    assert extract_jurisdictions(query) == []
+
+
+def test_known_filters_results():
+    assert extract_jurisdictions("Maharashtra and Goa", known={"Goa"}) == ["Goa"]
+
+
+def test_resolve_aliases_and_abbreviations():
+    assert resolve_jurisdiction("uttaranchal") == "Uttarakhand"
+    assert resolve_jurisdiction("Central") == "Central"
+    assert resolve_jurisdiction("UK") is None
+    assert resolve_jurisdictions(["MH", "maharashtra", "Narnia", None]) == ["Maharashtra"]
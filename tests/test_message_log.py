@@ -0,0 +1,58 @@
+import json
+
+from utility import message_log
+from utility.message_log import MessageLog
+
+
+def messages(*ids):
+    return [{"message_id": i, "message": f"text {i}"} for i in ids]
+
+
+def test_locate_uses_cached_positions(tmp_path, monkeypatch):
+    log = MessageLog(str(tmp_path / "s1"))
+    log.append(messages("a", "b"))
+    assert log.locate("b") == 1
+
+    reads = []
+    original = MessageLog._read_ids
+    monkeypatch.setattr(MessageLog, "_read_ids", lambda self: reads.append(1) or original(self))
+
+    log.append(messages("c", "a"))
+    # Appends extend the cached map; duplicates keep their first position
+    assert [log.locate(i) for i in ("a", "b", "c", "missing")] == [0, 1, 2, None]
+    assert MessageLog(log.base_path).get("c")["message"] == "text c"
+    assert reads == []
+
+
+def test_locate_reloads_when_log_changes_underneath(tmp_path):
+    log = MessageLog(str(tmp_path / "s1"))
+    log.append(messages("a", "b"))
+    assert log.locate("b") == 1
+
+    # Another writer appended without going through this process's cache
+    with open(log.log_path, "ab") as f:
+        offset = f.seek(0, 2)
+        f.write(json.dumps(messages("c")[0]).encode("utf-8") + b"\n")
+    with open(log.index_path, "ab") as f:
+        f.write(message_log.OFFSET.pack(offset))
+    with open(log.ids_path, "ab") as f:
+        f.write(b'"c"\n')
+
+    assert log.locate("c") == 2
+
+
+def test_compaction_and_move_keep_positions_right(tmp_path):
+    log = MessageLog(str(tmp_path / "active" / "s1"))
+    log.append(messages("a", "b"))
+    log.patch("b", {"feedback_status": "good"})
+    assert log.locate("b") == 1
+
+    log.compact()
+    assert log.get("b")["feedback_status"] == "good"
+
+    moved = log.move_to(str(tmp_path / "deleted" / "s1"))
+    assert moved.locate("a") == 0
+    fresh = MessageLog(str(tmp_path / "active" / "s1"))
+    fresh.append(messages("x"))
+    assert fresh.locate("a") is None
+    assert fresh.locate("x") == 0
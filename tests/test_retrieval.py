@@ -0,0 +1,72 @@
+import faiss
+import numpy as np
+import pytest
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from core import retrieval
+from core.ingest import HashingEmbeddings
+from core.retrieval import (
+    BM25_WEIGHT, fused_search_by_vectors, fusion_weights, reciprocal_rank_fusion, search_ids_by_vectors,
+)
+
+
+def test_rrf_scores_and_deduplicates():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "a", "d"]], k=60)
+    assert {item for item, _ in fused[:2]} == {"a", "b"}
+    assert len(fused) == 4
+    assert dict(fused)["a"] == pytest.approx(1 / 61 + 1 / 62)
+
+
+def test_rrf_weights_favour_the_heavier_list():
+    fused = reciprocal_rank_fusion([["a", "b"], ["b", "a"]], k=60, weights=[2.0, 1.0])
+    assert [item for item, _ in fused] == ["a", "b"]
+    assert dict(fused)["a"] == pytest.approx(2 / 61 + 1 / 62)
+
+
+def test_fusion_weights_double_the_original_query():
+    assert fusion_weights([["q"], ["t1"], ["t2"]], lexical=False) == [2.0, 1.0, 1.0]
+    assert fusion_weights([["q"], ["t1"], ["bm25"]], lexical=True) == [2.0, 1.0, BM25_WEIGHT]
+    assert fusion_weights([["q"]], lexical=False) == [2.0]
+
+
+def test_one_expansion_term_cannot_outrank_the_original_query():
+    # The original query ranks "q" first; one expansion ranks "t" first
+    fused = reciprocal_rank_fusion([["q", "t"], ["t", "q"]], weights=fusion_weights([[], []], lexical=False))
+    assert fused[0][0] == "q"
+
+
+@pytest.fixture
+def store():
+    embeddings = HashingEmbeddings(64)
+    texts = [
+        "Overtime wages are paid at twice the ordinary rate.",
+        "Every employer shall maintain a register in Form-I under Rule 27.",
+        "Gratuity is payable after five years of continuous service.",
+        "Night shift workers are entitled to a meal allowance.",
+    ]
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    docs = {f"id{i}": Document(page_content=t, metadata={"source": "rules.pdf", "page": str(i)}) for i, t in enumerate(texts)}
+    return embeddings, FAISS(embeddings, index, InMemoryDocstore(docs), {i: f"id{i}" for i in range(len(texts))})
+
+
+def test_batched_search_returns_one_ranking_per_vector(store):
+    embeddings, vector_store = store
+    vectors = embeddings.embed_documents(["overtime wages", "gratuity service"])
+    ranked = search_ids_by_vectors(vector_store, vectors, 2)
+    assert len(ranked) == 2
+    assert ranked[0][0] == "id0"
+    assert ranked[1][0] == "id2"
+
+
+def test_fused_search_returns_unique_documents(store, monkeypatch):
+    embeddings, vector_store = store
+    monkeypatch.setattr(retrieval, "HYBRID_RETRIEVAL", True)
+    vectors = embeddings.embed_documents(["register under Rule 27", "Form-I register", "employer register"])
+    docs = fused_search_by_vectors(vector_store, vectors, 3, query="Rule 27")
+    contents = [d.page_content for d in docs]
+    assert len(contents) == len(set(contents)) == 3
+    assert contents[0].startswith("Every employer")
@@ -0,0 +1,124 @@
+import sqlite3
+import threading
+
+import pytest
+
+from utility import blob_utils
+from utility.session_store import LocalJsonSessionStore, SQLiteSessionStore
+from utility.sessions_writer import sessions_writer
+
+USER = "tester"
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(blob_utils, "BASE_DIR", str(tmp_path))
+    yield LocalJsonSessionStore()
+    sessions_writer.flush_all()
+
+
+@pytest.fixture(params=["local_json", "sqlite"])
+def any_store(request, tmp_path, monkeypatch):
+    if request.param == "sqlite":
+        store = SQLiteSessionStore(str(tmp_path / "sessions.sqlite"))
+        yield store
+        store.close()
+    else:
+        monkeypatch.setattr(blob_utils, "BASE_DIR", str(tmp_path))
+        yield LocalJsonSessionStore()
+        sessions_writer.flush_all()
+
+
+def turn(n, timestamp):
+    return [
+        {"role": "user", "message_id": f"q{n}", "message": f"question {n}", "timestamp": timestamp},
+        {"role": "bot", "message_id": f"r{n}", "message": f"answer {n}", "timestamp": timestamp},
+    ]
+
+
+def on_disk(folder):
+    """The metadata list as written, read by a fresh store."""
+    sessions_writer.flush_all()
+    return [s["session_id"] for s in blob_utils.read_json_from_blob(f"sessions/{USER}/{folder}/sessions.json") or []]
+
+
+def test_delete_and_restore(store):
+    store.append_messages(USER, "s1", turn(1, "2026-01-01T00:00:00"), "T")
+    store.append_messages(USER, "s2", turn(2, "2026-01-02T00:00:00"), "T")
+
+    assert store.delete_sessions(USER, ["s1", "s2", "missing"]) == ["s1", "s2"]
+    assert store.list_sessions(USER) == []
+    assert on_disk("deleted") == ["s1", "s2"]
+
+    assert store.restore_sessions(USER, ["s2", "s1"]) == ["s2", "s1"]
+    assert sorted(on_disk("active")) == ["s1", "s2"]
+    assert len(store.get_chat_session(USER, "s1")["messages"]) == 2
+    with pytest.raises(ValueError):
+        store.restore_session(USER, "s1")
+
+
+def test_delete_revive_delete_restore(store):
+    store.append_messages(USER, "s1", turn(1, "2026-01-01T00:00:00"), "Old")
+    store.delete_session(USER, "s1")
+
+    # A new turn on the deleted id starts it again as an active session
+    store.append_messages(USER, "s1", turn(2, "2026-01-02T00:00:00"), "New")
+    with pytest.raises(ValueError):
+        store.restore_session(USER, "s1")
+
+    # Deleting it again replaces the older deleted copy
+    store.delete_session(USER, "s1")
+    assert store.list_sessions(USER) == []
+    assert on_disk("deleted") == ["s1"]
+
+    store.restore_session(USER, "s1")
+    assert on_disk("active") == ["s1"]
+    assert on_disk("deleted") == []
+    session = store.list_sessions(USER)[0]
+    assert session["title"] == "New"
+    messages = store.get_chat_session(USER, "s1")["messages"]
+    assert [m["message_id"] for m in messages] == ["q2", "r2"]
+    assert store.get_message(USER, "s1", "r2")["message"] == "answer 2"
+
+
+def test_new_turn_on_deleted_session_starts_fresh(any_store):
+    store = any_store
+    store.append_messages(USER, "s1", turn(1, "2026-01-01T00:00:00"), "Old")
+    store.set_starred(USER, "s1", True)
+    store.save_summary(USER, "s1", {"text": "old summary", "covered": 2})
+    store.delete_session(USER, "s1")
+
+    session = store.append_messages(USER, "s1", turn(2, "2026-01-02T00:00:00"), "New")
+    assert session["title"] == "New"
+    assert session["starred"] is False
+    assert session["created_on"] == "2026-01-02T00:00:00"
+
+    chat = store.get_chat_session(USER, "s1")
+    assert [m["message_id"] for m in chat["messages"]] == ["q2", "r2"]
+    assert "summary" not in chat
+    assert store.get_message(USER, "s1", "r1") is None
+    assert store.get_messages(USER, "s1")["total"] == 2
+    with pytest.raises(ValueError):
+        store.restore_session(USER, "s1")
+
+    store.delete_session(USER, "s1")
+    store.restore_session(USER, "s1")
+    assert [m["message_id"] for m in store.get_chat_session(USER, "s1")["messages"]] == ["q2", "r2"]
+
+
+def test_sqlite_close_releases_every_thread_connection(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.sqlite"))
+    store.append_messages(USER, "s1", turn(1, "2026-01-01T00:00:00"), "T")
+    worker = threading.Thread(target=store.list_sessions, args=(USER,))
+    worker.start()
+    worker.join()
+    connections = list(store._connections)
+    assert len(connections) == 2
+
+    store.close()
+    for conn in connections:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+    # Later calls open a new connection
+    assert [s["session_id"] for s in store.list_sessions(USER)] == ["s1"]
+    store.close()
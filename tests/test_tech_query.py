@@ -0,0 +1,66 @@
+import asyncio
+import time
+
+import pytest
+
+from core import tech_query_test
+
+
+@pytest.fixture
+def retrieval(monkeypatch):
+    """Replaces the LLM, the embeddings and the per-state search with controllable fakes."""
+    behaviour = {}
+    cancelled = []
+
+    async def fake_retrieve(k_by_state, query, query_vectors):
+        state = next(iter(k_by_state))
+        try:
+            return {state: await behaviour[state]()}
+        except asyncio.CancelledError:
+            cancelled.append(state)
+            raise
+
+    async def fake_embed(query, terms):
+        return [[0.0]]
+
+    monkeypatch.setattr(tech_query_test, "get_llm", lambda: None)
+    monkeypatch.setattr(tech_query_test, "aembed_for_retrieval", fake_embed)
+    monkeypatch.setattr(tech_query_test, "_aretrieve_for_states", fake_retrieve)
+    monkeypatch.setattr(tech_query_test, "USE_UNIFIED_INDEX", False)
+    monkeypatch.setattr(tech_query_test, "COMPARISON_RETRIEVAL_TIMEOUT_S", 0.2)
+    return behaviour, cancelled
+
+
+def build(states):
+    understanding = {"states": states, "terms": []}
+    return asyncio.run(tech_query_test.abuild_tech_prompt("wages", "Maharashtra", "Code on Wages", "", understanding))
+
+
+async def hang():
+    await asyncio.sleep(30)
+
+
+def test_slow_selected_state_is_bounded_by_the_deadline(retrieval):
+    behaviour, cancelled = retrieval
+    behaviour["Maharashtra"] = hang
+    behaviour["Goa"] = hang
+
+    started = time.monotonic()
+    assert build(["Maharashtra", "Goa"]) == (None, [])
+    assert time.monotonic() - started < 5
+    assert sorted(cancelled) == ["Goa", "Maharashtra"]
+
+
+def test_failed_selected_state_cancels_other_states(retrieval):
+    behaviour, cancelled = retrieval
+
+    async def fail():
+        await asyncio.sleep(0)
+        raise RuntimeError("store unavailable")
+
+    behaviour["Maharashtra"] = fail
+    behaviour["Goa"] = hang
+
+    with pytest.raises(RuntimeError, match="store unavailable"):
+        build(["Maharashtra", "Goa"])
+    assert cancelled == ["Goa"]
@@ -0,0 +1,144 @@
+import asyncio
+import os
+
+import faiss
+import numpy as np
+import pytest
+
+from core import tech_query_test, unified_index
+from core.index_store import INDEX_FILE, VARIANT_FILES, index_file_for, load_store
+from core.ingest import HashingEmbeddings, ingest
+from core.quantize import build_variants
+from core.unified_index import PARTITIONS_FILE, UnifiedIndex, build_unified_index
+
+FOLDERS = {"Maharashtra": "maha_ada", "Gujarat": "guj_ada", "Central": "cen_ada"}
+
+
+def write_source(tmp_path, name, text):
+    path = tmp_path / "sources" / name
+    path.parent.mkdir(exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture
+def index_root(tmp_path):
+    root = tmp_path / "indexes"
+    embeddings = HashingEmbeddings(64)
+    ingest(str(root / "maha_ada"), [
+        write_source(tmp_path, "mh.txt", "Maharashtra overtime wages are paid at twice the rate.\f"
+                                         "Maharashtra Form I registers establishments under Rule 27."),
+    ], embeddings=embeddings, chunk_size=80, chunk_overlap=0)
+    ingest(str(root / "guj_ada"), [
+        write_source(tmp_path, "gj.txt", "Gujarat overtime wages are paid at twice the rate.\f"
+                                         "Gujarat gratuity is payable after five years."),
+    ], embeddings=embeddings, chunk_size=80, chunk_overlap=0)
+    # Shipped the way several states are: a pickle without index.faiss
+    (root / "cen_ada").mkdir()
+    (root / "cen_ada" / "index.pkl").write_bytes(b"")
+    return root
+
+
+def test_build_needs_no_embeddings_and_reports_skipped_states(index_root, capsys):
+    partitions = build_unified_index(str(index_root), "unified_all", FOLDERS)
+
+    assert set(partitions) == {"maha_ada", "guj_ada"}
+    assert os.path.exists(index_root / "unified_all" / PARTITIONS_FILE)
+    out = capsys.readouterr().out
+    assert "Skipping 'cen_ada'" in out
+    assert "does not cover: Central" in out
+
+
+@pytest.fixture
+def unified(index_root):
+    partitions = build_unified_index(str(index_root), "unified_all", FOLDERS)
+    store = load_store(str(index_root / "unified_all"), HashingEmbeddings(64))
+    yield UnifiedIndex(store, {k: tuple(v) for k, v in partitions.items()})
+    store.docstore.close()
+
+
+def test_search_applies_per_state_quotas_in_one_faiss_call(unified, monkeypatch):
+    calls = []
+    original = unified_index.search_ids_by_vectors
+    monkeypatch.setattr(unified_index, "search_ids_by_vectors",
+                        lambda *args, **kwargs: calls.append(1) or original(*args, **kwargs))
+
+    query = "overtime wages"
+    vectors = [HashingEmbeddings(64).embed_query(query)]
+    docs = unified.search(vectors, ["Maharashtra", "Gujarat", "Central"], {"Maharashtra": 2, "Gujarat": 1, "Central": 3}, query)
+
+    assert len(calls) == 1
+    jurisdictions = [d.metadata["jurisdiction"] for d in docs]
+    assert jurisdictions.count("maha_ada") == 2
+    assert jurisdictions.count("guj_ada") == 1
+    assert unified.folder_for("Central") is None
+    assert unified.folder_for("MH") == "maha_ada"
+
+
+def test_retrieval_serves_selected_and_compared_states_in_one_search(unified, monkeypatch):
+    searches = []
+    original = unified.search
+
+    def search(vectors, states, k_per_state, query=None):
+        searches.append(list(states))
+        return original(vectors, states, k_per_state, query)
+
+    separate = []
+
+    async def search_state(state, query, query_vectors, k):
+        separate.append(state)
+        return []
+
+    async def get_unified():
+        return unified
+
+    monkeypatch.setattr(unified, "search", search)
+    monkeypatch.setattr(tech_query_test, "USE_UNIFIED_INDEX", True)
+    monkeypatch.setattr(tech_query_test, "RERANK_ENABLED", False)
+    monkeypatch.setattr(tech_query_test, "aget_unified_index", get_unified)
+    monkeypatch.setattr(tech_query_test, "_asearch_state", search_state)
+
+    vectors = [HashingEmbeddings(64).embed_query("overtime wages")]
+    results = asyncio.run(tech_query_test._aretrieve_for_states(
+        {"Maharashtra": 2, "Gujarat": 1, "Central": 1}, "overtime wages", vectors
+    ))
+
+    assert searches == [["Maharashtra", "Gujarat"]]
+    assert separate == ["Central"]
+    assert len(results["Maharashtra"]) == 2
+    assert [d.metadata["jurisdiction"] for d in results["Gujarat"]] == ["guj_ada"]
+    assert results["Central"] == []
+
+
+def test_pq_is_refused_for_the_partitioned_folder_and_sq8_is_served(unified, index_root):
+    folder = str(index_root / "unified_all")
+    with pytest.raises(ValueError, match="pq"):
+        build_variants(folder, ["pq"], k=2)
+
+    build_variants(folder, ["sq8"], k=2)
+    assert index_file_for(folder, "sq8").endswith(VARIANT_FILES["sq8"])
+    store = load_store(folder, HashingEmbeddings(64), variant="sq8")
+    try:
+        docs = UnifiedIndex(store, unified.partitions).search(
+            [HashingEmbeddings(64).embed_query("gratuity")], ["Gujarat"], 2
+        )
+        assert {d.metadata["jurisdiction"] for d in docs} == {"guj_ada"}
+    finally:
+        store.docstore.close()
+
+
+def test_pq_file_in_the_partitioned_folder_is_served_flat(unified, index_root):
+    folder = str(index_root / "unified_all")
+    pq = faiss.IndexPQ(64, 8, 2)
+    pq.train(np.random.default_rng(0).random((64, 64), dtype=np.float32))
+    faiss.write_index(pq, os.path.join(folder, VARIANT_FILES["pq"]))
+
+    assert index_file_for(folder, "pq").endswith(INDEX_FILE)
+    store = load_store(folder, HashingEmbeddings(64), variant="pq")
+    try:
+        docs = UnifiedIndex(store, unified.partitions).search(
+            [HashingEmbeddings(64).embed_query("overtime")], ["Maharashtra"], 1
+        )
+        assert [d.metadata["jurisdiction"] for d in docs] == ["maha_ada"]
+    finally:
+        store.docstore.close()
@@ -0,0 +1,503 @@
+"""Azure Blob Storage backend for the session store (SESSION_STORE_BACKEND=azure_blob).
+
+Layout in the container:
+- sessions/{user}/sessions.json          {"active": [...], "deleted": [...]} session metadata;
+- chat_history/{user}/{session}.jsonl    append blob, one message per line;
+- chat_history/{user}/{session}.ids.jsonl  append blob of {"message_id", "offset",
+                                         "length"} per message, so one message is
+                                         fetched with a ranged read;
+- chat_history/{user}/{session}.patches.jsonl  append blob of field updates to
+                                         earlier messages, applied on read;
+- chat_history/{user}/{session}.meta.json  per-session data such as the running summary;
+- feedback/{user}/events.jsonl           append blob of feedback events.
+
+Metadata changes are a download plus an ETag-conditional upload, retried when
+another writer got there first, so several app instances can share one
+container without a shared disk. A new turn is an append to the chat blob
+and then to its ids blob, running concurrently with the metadata update.
+Deleting a session only moves its metadata entry, leaving the chat blob in
+place until a new turn reuses the session id.
+
+All blob I/O runs on one background event loop that owns a pooled aiohttp
+transport. The sync store methods block on it and the async ones await it.
+
+Connection settings: AZURE_STORAGE_CONNECTION_STRING (e.g. for the Azurite
+emulator), or AZURE_BLOB_ACCOUNT_URL + AZURE_BLOB_SAS_TOKEN, plus
+BLOB_CONTAINER_NAME. Set AZURE_BLOB_FAKE_DIR to use a directory on disk in
+place of a container, for local runs and tests.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+from .session_store import SessionStore, SessionIndex, window_of_session
+
+AZURE_BLOB_POOL_SIZE = int(os.getenv("AZURE_BLOB_POOL_SIZE", "32"))
+AZURE_BLOB_MAX_RETRIES = int(os.getenv("AZURE_BLOB_MAX_RETRIES", "8"))
+
+
+class ConditionFailed(Exception):
+    """A conditional write lost to a concurrent writer (HTTP 409/412)."""
+
+
+# ======================================================
+# CONTAINERS
+# ======================================================
+class AzureBlobContainer:
+    """The few blob operations the store needs, on the async Azure SDK."""
+
+    def __init__(self, container_name: str, connection_string: str = None,
+                 account_url: str = None, sas_token: str = None):
+        self.container_name = container_name
+        self.connection_string = connection_string
+        self.account_url = account_url
+        self.sas_token = sas_token
+        self._container = None
+        self._session = None
+
+    def _client(self):
+        # Created on first use so the aiohttp session binds to the loop that runs the I/O
+        if self._container is None:
+            import aiohttp
+            from azure.core.credentials import AzureSasCredential
+            from azure.core.pipeline.transport import AioHttpTransport
+            from azure.storage.blob.aio import ContainerClient
+
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=AZURE_BLOB_POOL_SIZE)
+            )
+            transport = AioHttpTransport(session=self._session, session_owner=False)
+            if self.connection_string:
+                self._container = ContainerClient.from_connection_string(
+                    self.connection_string, self.container_name, transport=transport
+                )
+            else:
+                self._container = ContainerClient(
+                    self.account_url, self.container_name,
+                    credential=AzureSasCredential(self.sas_token), transport=transport
+                )
+        return self._container
+
+    async def download(self, name: str, offset: int = None, length: int = None):
+        """Returns (data, etag), or (None, None) when the blob does not exist."""
+        from azure.core.exceptions import ResourceNotFoundError
+        try:
+            downloader = await self._client().get_blob_client(name).download_blob(offset=offset, length=length)
+            return await downloader.readall(), downloader.properties.etag
+        except ResourceNotFoundError:
+            return None, None
+
+    async def upload(self, name: str, data: bytes, etag: str = None) -> str:
+        """
+        Writes the blob only if it is unchanged since `etag` was read, or only if
+        it does not exist yet when etag is None. Raises ConditionFailed otherwise.
+        """
+        from azure.core import MatchConditions
+        from azure.core.exceptions import ResourceExistsError, ResourceModifiedError
+        blob = self._client().get_blob_client(name)
+        try:
+            if etag is None:
+                result = await blob.upload_blob(data, overwrite=False)
+            else:
+                result = await blob.upload_blob(
+                    data, overwrite=True, etag=etag, match_condition=MatchConditions.IfNotModified
+                )
+        except (ResourceExistsError, ResourceModifiedError):
+            raise ConditionFailed(name)
+        return result["etag"]
+
+    async def put(self, name: str, data: bytes):
+        """Unconditional overwrite, for last-writer-wins data."""
+        await self._client().get_blob_client(name).upload_blob(data, overwrite=True)
+
+    async def append(self, name: str, data: bytes) -> int:
+        """Appends to an append blob, creating it first if needed; returns the offset written at."""
+        from azure.core import MatchConditions
+        from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+        blob = self._client().get_blob_client(name)
+        try:
+            result = await blob.append_block(data)
+        except ResourceNotFoundError:
+            try:
+                await blob.create_append_blob(match_condition=MatchConditions.IfMissing)
+            except (ResourceExistsError, ResourceModifiedError):
+                pass  # Created concurrently by another writer
+            result = await blob.append_block(data)
+        return int(result["blob_append_offset"])
+
+    async def delete(self, name: str):
+        from azure.core.exceptions import ResourceNotFoundError
+        try:
+            await self._client().get_blob_client(name).delete_blob()
+        except ResourceNotFoundError:
+            pass
+
+    async def close(self):
+        if self._container is not None:
+            await self._container.close()
+            await self._session.close()
+            self._container = None
+
+
+class FilesystemContainer:
+    """
+    A directory standing in for a blob container, with the same conditional
+    write semantics. ETags are content hashes; writes are atomic renames.
+    Conditions are enforced within one process only.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, name.replace("/", os.sep))
+
+    @staticmethod
+    def _etag(data: bytes) -> str:
+        return '"' + hashlib.sha1(data).hexdigest() + '"'
+
+    def _read(self, name: str):
+        path = self._path(name)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def _write(self, name: str, data: bytes):
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    async def download(self, name: str, offset: int = None, length: int = None):
+        with self._lock:
+            data = self._read(name)
+        if data is None:
+            return None, None
+        etag = self._etag(data)
+        if offset is not None:
+            data = data[offset:offset + length if length is not None else None]
+        return data, etag
+
+    async def upload(self, name: str, data: bytes, etag: str = None) -> str:
+        with self._lock:
+            current = self._read(name)
+            current_etag = self._etag(current) if current is not None else None
+            if current_etag != etag:
+                raise ConditionFailed(name)
+            self._write(name, data)
+        return self._etag(data)
+
+    async def put(self, name: str, data: bytes):
+        with self._lock:
+            self._write(name, data)
+
+    async def append(self, name: str, data: bytes) -> int:
+        with self._lock:
+            path = self._path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "ab") as f:
+                offset = f.seek(0, os.SEEK_END)
+                f.write(data)
+        return offset
+
+    async def delete(self, name: str):
+        with self._lock:
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+
+    async def close(self):
+        pass
+
+
+def container_from_env():
+    fake_dir = os.getenv("AZURE_BLOB_FAKE_DIR")
+    if fake_dir:
+        return FilesystemContainer(fake_dir)
+    container_name = os.getenv("BLOB_CONTAINER_NAME")
+    connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
+    account_url = os.getenv("AZURE_BLOB_ACCOUNT_URL")
+    if not container_name or not (connection_string or account_url):
+        raise RuntimeError(
+            "azure_blob session store needs BLOB_CONTAINER_NAME and either "
+            "AZURE_STORAGE_CONNECTION_STRING or AZURE_BLOB_ACCOUNT_URL/AZURE_BLOB_SAS_TOKEN"
+        )
+    return AzureBlobContainer(
+        container_name,
+        connection_string=connection_string,
+        account_url=account_url,
+        sas_token=os.getenv("AZURE_BLOB_SAS_TOKEN")
+    )
+
+
+# ======================================================
+# STORE
+# ======================================================
+class _LoopThread:
+    """An event loop on a daemon thread that owns every blob connection."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        thread.start()
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    async def arun(self, coro):
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+
+def _sessions_blob(user_id):
+    return f"sessions/{user_id}/sessions.json"
+
+
+def _log_blob(user_id, session_id):
+    return f"chat_history/{user_id}/{session_id}.jsonl"
+
+
+def _ids_blob(user_id, session_id):
+    return f"chat_history/{user_id}/{session_id}.ids.jsonl"
+
+
+def _meta_blob(user_id, session_id):
+    return f"chat_history/{user_id}/{session_id}.meta.json"
+
+
+def _patches_blob(user_id, session_id):
+    return f"chat_history/{user_id}/{session_id}.patches.jsonl"
+
+
+def _records(data: bytes) -> list:
+    # Split on b"\n" only: str.splitlines() would also break records at the
+    # U+2028/U+0085-style separators that ensure_ascii=False leaves unescaped
+    return [json.loads(line) for line in (data or b"").split(b"\n") if line.strip()]
+
+
+def _parse_messages(log: bytes, patches: bytes) -> list:
+    updates = {}
+    for record in _records(patches):
+        updates.setdefault(record["message_id"], {}).update(record["fields"])
+    messages = _records(log)
+    for message in messages:
+        fields = updates.get(message.get("message_id"))
+        if fields:
+            message.update(fields)
+    return messages
+
+
+def _find(sessions: list, session_id: str):
+    for session in sessions:
+        if session.get("session_id") == session_id:
+            return session
+    return None
+
+
+class AzureBlobSessionStore(SessionStore):
+    """Sessions in a blob container, written with ETag-conditional updates."""
+
+    def __init__(self, container=None):
+        self.container = container or container_from_env()
+        self._loop = _LoopThread()
+
+    # ---------- metadata ----------
+    async def _read_sessions(self, user_id) -> dict:
+        data, _ = await self.container.download(_sessions_blob(user_id))
+        return json.loads(data) if data else {"active": [], "deleted": []}
+
+    async def _modify_sessions(self, user_id, function):
+        """
+        Applies function(doc) to the user's metadata and writes it back only if
+        nobody else changed it meanwhile, re-reading and retrying otherwise.
+        Returns what function returned; exceptions it raises abort the write.
+        """
+        name = _sessions_blob(user_id)
+        for attempt in range(AZURE_BLOB_MAX_RETRIES):
+            data, etag = await self.container.download(name)
+            doc = json.loads(data) if data else {"active": [], "deleted": []}
+            result = function(doc)
+            try:
+                await self.container.upload(name, json.dumps(doc, indent=2).encode("utf-8"), etag)
+                return result
+            except ConditionFailed:
+                await asyncio.sleep(random.uniform(0, 0.05 * (attempt + 1)))
+        raise RuntimeError(f"Gave up updating {name} after {AZURE_BLOB_MAX_RETRIES} conflicting writes")
+
+    async def _update_session(self, user_id, session_id, fields):
+        def update(doc):
+            session = _find(doc["active"], session_id)
+            if session is None:
+                raise ValueError(f"Session ID '{session_id}' not found for user '{user_id}'")
+            session.update(fields)
+
+        await self._modify_sessions(user_id, update)
+
+    # ---------- reads ----------
+    async def alist_sessions(self, user_id):
+        return await self._loop.arun(self._list_sessions(user_id))
+
+    async def _list_sessions(self, user_id):
+        return (await self._read_sessions(user_id))["active"]
+
+    def list_sessions(self, user_id):
+        return self._loop.run(self._list_sessions(user_id))
+
+    async def _get_chat_session(self, user_id, session_id):
+        # Metadata, messages, patches and summary are fetched concurrently
+        doc, (log, _), (patches, _), (meta, _) = await asyncio.gather(
+            self._read_sessions(user_id),
+            self.container.download(_log_blob(user_id, session_id)),
+            self.container.download(_patches_blob(user_id, session_id)),
+            self.container.download(_meta_blob(user_id, session_id)),
+        )
+        if _find(doc["active"], session_id) is None or log is None:
+            return {}
+        chat_history = {"session_id": session_id, "messages": _parse_messages(log, patches)}
+        summary = json.loads(meta).get("summary") if meta else None
+        if summary:
+            chat_history["summary"] = summary
+        return chat_history
+
+    def get_chat_session(self, user_id, session_id):
+        return self._loop.run(self._get_chat_session(user_id, session_id))
+
+    async def aget_chat_session(self, user_id, session_id):
+        return await self._loop.arun(self._get_chat_session(user_id, session_id))
+
+    async def apage_sessions(self, user_id, limit, cursor=None, starred=False, updated_since=None):
+        return SessionIndex(await self.alist_sessions(user_id)).page(limit, cursor, starred, updated_since)
+
+    async def aget_messages(self, user_id, session_id, limit=None, before=None, after=None, headers_only=False):
+        chat_history = await self.aget_chat_session(user_id, session_id)
+        return window_of_session(chat_history, limit, before, after, headers_only)
+
+    # ---------- writes ----------
+    async def _append_messages(self, user_id, session_id, messages, title):
+        last_timestamp = messages[-1]["timestamp"]
+
+        def touch(doc):
+            session = _find(doc["active"], session_id)
+            if session is None:
+                # A turn on a deleted session id starts a fresh session, as in the other stores
+                doc["deleted"] = [s for s in doc["deleted"] if s.get("session_id") != session_id]
+                session = {
+                    "session_id": session_id,
+                    "title": title,
+                    "starred": False,
+                    "created_on": last_timestamp,
+                }
+                doc["active"].append(session)
+            session["last_updated"] = last_timestamp
+            return dict(session)
+
+        doc = await self._read_sessions(user_id)
+        if _find(doc["active"], session_id) is None and _find(doc["deleted"], session_id) is not None:
+            # Drop the deleted session's history before the new turn lands in its blobs
+            await asyncio.gather(*(
+                self.container.delete(blob(user_id, session_id))
+                for blob in (_log_blob, _ids_blob, _patches_blob, _meta_blob)
+            ))
+
+        lines = [(json.dumps(m, ensure_ascii=False) + "\n").encode("utf-8") for m in messages]
+
+        async def append_log():
+            # The offset the block landed at locates each message for get_message
+            offset = await self.container.append(_log_blob(user_id, session_id), b"".join(lines))
+            entries = []
+            for message, line in zip(messages, lines):
+                entries.append({"message_id": message.get("message_id"), "offset": offset, "length": len(line)})
+                offset += len(line)
+            await self.container.append(
+                _ids_blob(user_id, session_id), "".join(json.dumps(e) + "\n" for e in entries).encode("utf-8")
+            )
+
+        _, session = await asyncio.gather(append_log(), self._modify_sessions(user_id, touch))
+        return session
+
+    def append_messages(self, user_id, session_id, messages, title):
+        return self._loop.run(self._append_messages(user_id, session_id, messages, title))
+
+    async def _save_summary(self, user_id, session_id, summary):
+        doc = await self._read_sessions(user_id)
+        if _find(doc["active"], session_id) is None:
+            raise ValueError("Session not found")
+        await self.container.put(
+            _meta_blob(user_id, session_id), json.dumps({"summary": summary}).encode("utf-8")
+        )
+
+    def save_summary(self, user_id, session_id, summary):
+        self._loop.run(self._save_summary(user_id, session_id, summary))
+
+    def set_starred(self, user_id, session_id, starred):
+        self._loop.run(self._update_session(user_id, session_id, {"starred": starred}))
+
+    def rename_session(self, user_id, session_id, title, updated):
+        self._loop.run(self._update_session(user_id, session_id, {"title": title, "last_updated": updated}))
+
+    def _move_sessions(self, user_id, session_ids, source, target) -> list:
+        """Moves metadata entries between the lists in one conditional write."""
+        wanted = set(session_ids)
+
+        def move(doc):
+            moving = [s for s in doc[source] if s.get("session_id") in wanted]
+            if target == "active":
+                # A session revived by a new turn stays active; a delete replaces any older copy
+                present = {s.get("session_id") for s in doc[target]}
+                moving = [s for s in moving if s.get("session_id") not in present]
+            moved = {s["session_id"] for s in moving}
+            doc[source] = [s for s in doc[source] if s.get("session_id") not in moved]
+            doc[target] = [s for s in doc[target] if s.get("session_id") not in moved] + moving
+            return [s["session_id"] for s in moving]
+
+        return self._loop.run(self._modify_sessions(user_id, move))
+
+    def delete_sessions(self, user_id, session_ids):
+        return self._move_sessions(user_id, session_ids, "active", "deleted")
+
+    def restore_sessions(self, user_id, session_ids):
+        return self._move_sessions(user_id, session_ids, "deleted", "active")
+
+    async def _get_message(self, user_id, session_id, message_id):
+        # The ids blob gives the message's byte range, so only that line of the log is read
+        doc, (ids, _), (patches, _) = await asyncio.gather(
+            self._read_sessions(user_id),
+            self.container.download(_ids_blob(user_id, session_id)),
+            self.container.download(_patches_blob(user_id, session_id)),
+        )
+        if _find(doc["active"], session_id) is None:
+            return None
+        for entry in _records(ids):
+            if entry.get("message_id") == message_id:
+                data, _ = await self.container.download(
+                    _log_blob(user_id, session_id), entry["offset"], entry["length"]
+                )
+                return _parse_messages(data, patches)[0] if data else None
+
+        # Sessions written before the ids blob existed (or an append cut short) are scanned
+        chat_history = await self._get_chat_session(user_id, session_id)
+        for message in chat_history.get("messages", []):
+            if message.get("message_id") == message_id:
+                return message
+        return None
+
+    def get_message(self, user_id, session_id, message_id):
+        return self._loop.run(self._get_message(user_id, session_id, message_id))
+
+    def patch_message(self, user_id, session_id, message_id, fields):
+        record = {"message_id": message_id, "fields": fields}
+        self._loop.run(self.container.append(
+            _patches_blob(user_id, session_id), (json.dumps(record) + "\n").encode("utf-8")
+        ))
+
+    def append_feedback_event(self, user_id, event):
+        self._loop.run(self.container.append(
+            f"feedback/{user_id}/events.jsonl", (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+        ))
+
+    def close(self):
+        self._loop.run(self.container.close())
@@ -1,12 +1,17 @@
 import json
 import os
 import shutil
+import threading
 
 BASE_DIR = os.path.join(os.getcwd(), "local_blob_storage")
 
 def _full_path(blob_path: str) -> str:
     return os.path.join(BASE_DIR, blob_path.replace("/", os.sep))
 
+def local_path(blob_path: str) -> str:
+    """Filesystem path backing a blob path."""
+    return _full_path(blob_path)
+
 def blob_exists(blob_path: str) -> bool:
     return os.path.exists(_full_path(blob_path))
 
@@ -20,8 +25,11 @@ def read_json_from_blob(blob_path: str):
 def write_json_to_blob(blob_path: str, data):
     path = _full_path(blob_path)
     os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
+    # Write to a temp file and rename so readers never see a partial file
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
         json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
 
 def copy_blob(src_blob_path: str, dst_blob_path: str):
     src = _full_path(src_blob_path)
@@ -1,101 +1,157 @@
 from datetime import datetime
-from langsmith import Client
-from .blob_utils import read_json_from_blob, write_json_to_blob
-
-client = Client()
-
+import os
+import queue
+import random
+import threading
+import time
+from .manage_sessions import get_session_message, patch_session_message
+from .session_store import get_session_store
+
+# Feedback is recorded in three places:
+# - the bot message's feedback_status, patched in place through the store's
+#   message_id index instead of rewriting the chat history;
+# - an append-only per-user event log ("submitted" / "removed" events);
+# - LangSmith, through a background queue so requests never wait on it.
+
+LANGSMITH_FEEDBACK_KEY = os.getenv("LANGSMITH_FEEDBACK_KEY", "user_feedback")
+LANGSMITH_FEEDBACK_BATCH = int(os.getenv("LANGSMITH_FEEDBACK_BATCH", "20"))
+LANGSMITH_FEEDBACK_MAX_RETRIES = int(os.getenv("LANGSMITH_FEEDBACK_MAX_RETRIES", "5"))
+
+NOT_GIVEN = "not given"
+
+score_map = {
+    "bad": 0,
+    "good": 1,
+    "awesome": 2
+}
+
+
+# ======================================================
+# LANGSMITH QUEUE
+# ======================================================
+class LangSmithFeedbackQueue:
+    """
+    Sends feedback to LangSmith from one background thread. Items are taken in
+    batches of up to LANGSMITH_FEEDBACK_BATCH; failed ones are retried with
+    exponential backoff and dropped with a warning after the last attempt.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._client = None
+        self._worker = None
+        self._guard = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+
+    def _langsmith(self):
+        # Created lazily so importing this module needs no LangSmith credentials
+        if self._client is None:
+            from langsmith import Client
+            self._client = Client()
+        return self._client
+
+    def submit(self, feedback: dict):
+        with self._guard:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+        self._queue.put((feedback, 0, 0.0))
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < LANGSMITH_FEEDBACK_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            waits = []
+            for item in batch:
+                waits.append(self._send(*item))
+                self._queue.task_done()
+            if all(waits):
+                # Everything taken was a retry that is not due yet
+                time.sleep(min(min(waits), 1.0))
+
+    def _send(self, feedback: dict, attempt: int, not_before: float) -> float:
+        """Sends one item; returns how long it still has to wait if it was not due yet."""
+        delay = not_before - time.monotonic()
+        if delay > 0:
+            # Put it back rather than holding up the rest of the batch
+            self._queue.put((feedback, attempt, not_before))
+            return delay
+        try:
+            self._langsmith().create_feedback(key=LANGSMITH_FEEDBACK_KEY, **feedback)
+            self.sent += 1
+        except Exception as e:
+            if attempt + 1 >= LANGSMITH_FEEDBACK_MAX_RETRIES:
+                self.failed += 1
+                print(f"⚠️ Dropping LangSmith feedback for run {feedback.get('run_id')}: {e}")
+                return 0.0
+            backoff = min(60.0, 2 ** attempt) * random.uniform(0.5, 1.5)
+            self._queue.put((feedback, attempt + 1, time.monotonic() + backoff))
+        return 0.0
+
+    def join(self, timeout: float = 5.0):
+        """Waits up to `timeout` seconds for queued submissions (used at shutdown)."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def stats(self) -> dict:
+        return {"sent": self.sent, "failed": self.failed, "pending": self._queue.unfinished_tasks}
+
+
+langsmith_feedback_queue = LangSmithFeedbackQueue()
+
+
+# ======================================================
+# FEEDBACK LOGIC
+# ======================================================
 def submit_feedback_logic(user_id: str, session_id: str, run_id: str, score: str, value: str, comment: str):
-    # Step 1: Update feedback status in chat history
-    history_path = f"chat_history/{user_id}/active/{session_id}.json"
-    history = read_json_from_blob(history_path)
-
-    found = False
-    for msg in history.get("messages", []):
-        if msg.get("message_id") == run_id and msg["role"] == "bot":
-            msg["feedback_status"] = value
-            found = True
-            break
-
-    if not found:
+    # Step 1: Update feedback status on the bot message
+    message = get_session_message(user_id, session_id, run_id)
+    if message is None or message.get("role") != "bot":
         raise ValueError("Message ID not found in chat history.")
+    patch_session_message(user_id, session_id, run_id, {"feedback_status": value})
 
-
-    write_json_to_blob(history_path, history)
-
-    # Step 2: Log feedback locally in blob
-    feedback_path = f"feedback/{user_id}/active/feedback.json"
-    feedback_entry = {
+    # Step 2: Append to the feedback event log
+    get_session_store().append_feedback_event(user_id, {
+        "event": "submitted",
         "message_id": run_id,
         "feedback": value,
         "comment": comment,
         "session_id": session_id,
         "timestamp": datetime.now().isoformat()
-    }
-    existing = read_json_from_blob(feedback_path) or []
-    existing.append(feedback_entry)
-    write_json_to_blob(feedback_path, existing)
+    })
 
-    score_map = {
-    "bad": 0,
-    "good": 1,
-    "awesome": 2
-    }
-    score = score_map.get(value.lower())
+    # Step 3: Queue the LangSmith submission
+    langsmith_feedback_queue.submit({
+        "run_id": run_id,
+        "score": score_map.get(value.lower(), score),
+        "value": value,
+        "comment": comment
+    })
 
-    # Step 3: Log feedback to LangSmith
-    try:
-        client.create_feedback(
-            run_id=run_id,
-            key="" #langsmith key here for Labour Law,
-            score=score,  # Optional: can map feedback to score if you want
-            value=value,
-            comment=comment
-        )
-    except Exception as e:
-        return {"message": "Feedback saved but failed to log to LangSmith", "error": str(e)}
-
-    return {"status": "success", "message": "Feedback saved and logged to LangSmith"}
+    return {"status": "success", "message": "Feedback saved and queued for LangSmith"}
 
 
 def remove_feedback_logic(user_id: str, session_id: str, run_id: str):
-    # Step 1: Update feedback_status in chat history
-    history_path = f"chat_history/{user_id}/active/{session_id}.json"
-    history = read_json_from_blob(history_path)
-
-    found = False
-    for msg in history.get("messages", []):
-        if msg.get("message_id") == run_id:
-            msg["feedback_status"] = "not given"
-            found = True
-            break
-
-    if not found:
+    # Step 1: Reset feedback_status on the message
+    message = get_session_message(user_id, session_id, run_id)
+    if message is None:
         raise ValueError("Message ID not found in chat history")
-
-    write_json_to_blob(history_path, history)
-
-    # Step 2: Move feedback to removed folder
-    original_feedback_path = f"feedback/{user_id}/active/feedback.json"
-    removed_feedback_path = f"feedback/{user_id}/removed/feedback.json"
-
-    feedback_data = read_json_from_blob(original_feedback_path) or []
-    removed_data = read_json_from_blob(removed_feedback_path) or []
-
-    # Find and remove feedback from original list
-    updated_feedback = []
-    removed_entry = None
-    for fb in feedback_data:
-        if fb.get("message_id") == run_id:
-            removed_entry = fb
-        else:
-            updated_feedback.append(fb)
-
-    if removed_entry:
-        removed_entry["removed_on"] = datetime.now().isoformat()
-        removed_data.append(removed_entry)
-        write_json_to_blob(removed_feedback_path, removed_data)
-        write_json_to_blob(original_feedback_path, updated_feedback)
-    else:
+    if message.get("feedback_status", NOT_GIVEN) == NOT_GIVEN:
         raise ValueError("Feedback entry not found for removal.")
+    patch_session_message(user_id, session_id, run_id, {"feedback_status": NOT_GIVEN})
+
+    # Step 2: Record the removal in the event log
+    get_session_store().append_feedback_event(user_id, {
+        "event": "removed",
+        "message_id": run_id,
+        "session_id": session_id,
+        "removed_on": datetime.now().isoformat()
+    })
 
     return {"status": "removed", "message_id": run_id}
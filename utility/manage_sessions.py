@@ -1,6 +1,8 @@
-from .blob_utils import read_json_from_blob, write_json_to_blob, copy_blob, delete_blob
+from .session_store import get_session_store
+from .session_cache import session_cache
 from datetime import datetime, timezone
 from pprint import pprint
+import copy
 import os
 from dotenv import load_dotenv
 
@@ -24,159 +26,214 @@ def authenticate_user_service(user_id: str):
 
 
 # ---- Session Services ----
+# Storage is pluggable (local JSON or SQLite); see utility/session_store.py.
+# Reads go through an in-process LRU cache (utility/session_cache.py) that the
+# write functions below keep up to date. Cached values must not be mutated.
+def _sessions_key(user_id: str):
+    return ("sessions", user_id)
+
+
+def _chat_key(user_id: str, session_id: str):
+    return ("chat", user_id, session_id)
+
+
 def get_user_sessions(user_id: str):
     """Fetches all session metadata for a user."""
-    blob_path = f"sessions/{user_id}/active/sessions.json"
-    return read_json_from_blob(blob_path) or []
+    return session_cache.get(
+        _sessions_key(user_id), lambda: get_session_store().list_sessions(user_id)
+    )
 
 
 def get_chat_session(user_id: str, session_id: str):
     """Fetches chat history for a specific session."""
-    blob_path = f"chat_history/{user_id}/active/{session_id}.json"
-    return read_json_from_blob(blob_path)
+    return session_cache.get(
+        _chat_key(user_id, session_id),
+        lambda: get_session_store().get_chat_session(user_id, session_id)
+    )
 
 
-def update_or_create_session_service(
+async def aget_user_sessions(user_id: str):
+    """Async variant of get_user_sessions; blocking reads run off the event loop."""
+    return await session_cache.aget(
+        _sessions_key(user_id), lambda: get_session_store().alist_sessions(user_id)
+    )
+
+
+async def aget_chat_session(user_id: str, session_id: str):
+    """Async variant of get_chat_session; blocking reads run off the event loop."""
+    return await session_cache.aget(
+        _chat_key(user_id, session_id),
+        lambda: get_session_store().aget_chat_session(user_id, session_id)
+    )
+
+
+async def aget_user_sessions_page(
+    user_id: str,
+    limit: int,
+    cursor: str = None,
+    starred_only: bool = False,
+    updated_since: str = None
+):
+    """
+    One page of a user's sessions, newest first, as {"sessions", "next_cursor"}.
+    Served from the store's index rather than the cached full list.
+    """
+    return await get_session_store().apage_sessions(user_id, limit, cursor, starred_only, updated_since)
+
+
+async def aget_chat_messages(
     user_id: str,
     session_id: str,
-    messages: list,
-    title: str = "New Session"
+    limit: int = None,
+    before: int = None,
+    after: int = None,
+    headers_only: bool = False
 ):
     """
-    Creates or updates a chat session and appends multiple messages atomically.
+    A window of a session's messages by position, read straight from storage
+    without loading the whole session. See SessionStore.get_messages.
     """
+    return await get_session_store().aget_messages(user_id, session_id, limit, before, after, headers_only)
 
-    sessions_blob_path = f"sessions/{user_id}/active/sessions.json"
-    chat_history_blob_path = f"chat_history/{user_id}/active/{session_id}.json"
 
-    # 1️⃣ Fetch session metadata
-    sessions_data = read_json_from_blob(sessions_blob_path) or []
-    session_found = False
+def session_cache_stats():
+    """Hit/miss counters of the session read cache, for sizing SESSION_CACHE_SIZE."""
+    return session_cache.stats()
 
-    # Use last message timestamp for updates
-    last_timestamp = messages[-1]["timestamp"]
 
-    for session in sessions_data:
-        if session.get("session_id") == session_id:
-            session_found = True
-            session["last_updated"] = last_timestamp
-            break
+def update_or_create_session_service(
+    user_id: str,
+    session_id: str,
+    messages: list,
+    title: str = "New Session"
+):
+    """
+    Creates or updates a chat session and appends multiple messages.
+    """
+    session_metadata = get_session_store().append_messages(user_id, session_id, messages, title)
+    appended = copy.deepcopy(messages)
 
-    if not session_found:
-        new_session = {
+    def extend(chat_history):
+        return {
+            **chat_history,
             "session_id": session_id,
-            "title": title,
-            "starred": False,
-            "created_on": last_timestamp,
-            "last_updated": last_timestamp
+            "messages": chat_history.get("messages", []) + appended
         }
-        sessions_data.append(new_session)
-
-    write_json_to_blob(sessions_blob_path, sessions_data)
-
-    # 2️⃣ Fetch chat history
-    chat_history = read_json_from_blob(chat_history_blob_path) or {
-        "session_id": session_id,
-        "messages": []
-    }
-
-    # Append all messages
-    chat_history["messages"].extend(messages)
-
-    write_json_to_blob(chat_history_blob_path, chat_history)
 
+    session_cache.update(_chat_key(user_id, session_id), extend)
+    session_cache.invalidate(_sessions_key(user_id))
     return {
-        "session_metadata": sessions_data,
-        "chat_history": chat_history
+        "session_metadata": session_metadata,
+        "messages_appended": len(messages)
     }
 
 
-def star_user_session(user_id: str, session_id: str, is_starred: bool):
+def save_session_summary(user_id: str, session_id: str, summary: dict):
     """
-    Update the 'starred' field for a session in sessions metadata.
+    Stores the running summary of older turns alongside the session's messages.
     """
-    sessions_blob_path = f"sessions/{user_id}/active/sessions.json"
-    sessions_data = read_json_from_blob(sessions_blob_path) or []
+    get_session_store().save_summary(user_id, session_id, summary)
+    session_cache.update(
+        _chat_key(user_id, session_id),
+        lambda chat_history: {**chat_history, "summary": summary} if chat_history else chat_history
+    )
+    return summary
 
-    for session in sessions_data:
-        if session.get("session_id") == session_id:
-            session["starred"] = is_starred
-            break
-    else:
-        raise ValueError("Session not found")
 
-    write_json_to_blob(sessions_blob_path, sessions_data)
-    return {"status": "success", "starred": is_starred}
+def get_session_message(user_id: str, session_id: str, message_id: str):
+    """
+    One message of a session by id, via the store's message_id index; None if absent.
+    """
+    return get_session_store().get_message(user_id, session_id, message_id)
 
 
-def delete_user_session(user_id: str, session_id: str):
+def patch_session_message(user_id: str, session_id: str, message_id: str, fields: dict):
     """
-    Move the session's chat history to the 'deleted' folder and update sessions metadata.
+    Updates fields of one stored message (e.g. feedback_status) without rewriting the session.
     """
-    # Paths
-    original_path = f"chat_history/{user_id}/active/{session_id}.json"
-    deleted_path = f"chat_history/{user_id}/deleted/{session_id}.json"
-    sessions_blob_path = f"sessions/{user_id}/active/sessions.json"
-    sessions_deleted_blob_path = f"sessions/{user_id}/deleted/sessions.json"
+    get_session_store().patch_message(user_id, session_id, message_id, fields)
 
-    # Step 1: Move chat history file
-    copy_blob(original_path, deleted_path)
-    delete_blob(original_path)
+    def patch(chat_history):
+        messages = [
+            {**m, **fields} if m.get("message_id") == message_id else m
+            for m in chat_history.get("messages", [])
+        ]
+        return {**chat_history, "messages": messages}
 
-    # Step 2: Move session metadata from active to deleted
-    sessions_data = read_json_from_blob(sessions_blob_path) or []
-    deleted_sessions_data = read_json_from_blob(sessions_deleted_blob_path) or []
+    session_cache.update(_chat_key(user_id, session_id), patch)
 
-    session_to_delete = None
-    updated_sessions = []
-    
-    for session in sessions_data:
-        if session.get("session_id") == session_id:
-            session_to_delete = session
-        else:
-            updated_sessions.append(session)
-
-    # Write updated active session list
-    write_json_to_blob(sessions_blob_path, updated_sessions)
-
-    # Add to deleted sessions
-    if session_to_delete:
-        deleted_sessions_data.append(session_to_delete)
-        write_json_to_blob(sessions_deleted_blob_path, deleted_sessions_data)
-    else:
-        raise ValueError("Session metadata not found")
 
-    return {"status": "deleted", "session_id": session_id}
-
-def rename_user_session(user_id: str, session_id: str, new_title: str):
+def star_user_session(user_id: str, session_id: str, is_starred: bool):
     """
-    Rename a chat session title in sessions.json stored as a list in Azure Blob.
+    Update the 'starred' field for a session in sessions metadata.
     """
-    try:
-        blob_path = f"sessions/{user_id}/active/sessions.json"
+    get_session_store().set_starred(user_id, session_id, is_starred)
+    session_cache.invalidate(_sessions_key(user_id))
+    return {"status": "success", "starred": is_starred}
 
-        # Read the existing session metadata list
-        sessions_data = read_json_from_blob(blob_path) or []
 
-        session_found = False
+def delete_user_session(user_id: str, session_id: str):
+    """
+    Move the session's chat history and metadata to the deleted set.
+    """
+    get_session_store().delete_session(user_id, session_id)
+    session_cache.invalidate(_chat_key(user_id, session_id))
+    session_cache.invalidate(_sessions_key(user_id))
+    return {"status": "deleted", "session_id": session_id}
 
-        for session in sessions_data:
-            if session.get("session_id") == session_id:
-                session["title"] = new_title
-                session["last_updated"] = datetime.now(timezone.utc).isoformat()
-                session_found = True
-                break
+def restore_user_session(user_id: str, session_id: str):
+    """
+    Move a deleted session back to the active set.
+    """
+    get_session_store().restore_session(user_id, session_id)
+    session_cache.invalidate(_chat_key(user_id, session_id))
+    session_cache.invalidate(_sessions_key(user_id))
+    return {"status": "restored", "session_id": session_id}
 
-        if not session_found:
-            raise ValueError(f"Session ID '{session_id}' not found for user '{user_id}'")
 
-        # Save the updated session list
-        write_json_to_blob(blob_path, sessions_data)
+def delete_user_sessions(
+    user_id: str,
+    session_ids: list = None,
+    all_sessions: bool = False,
+    updated_before: str = None
+):
+    """
+    Delete many sessions with one metadata write: the given ids, every active
+    session (all_sessions), or those last updated before a timestamp.
+    """
+    session_ids = list(session_ids or [])
+    if all_sessions or updated_before:
+        session_ids += [
+            s["session_id"] for s in get_user_sessions(user_id)
+            if all_sessions or (s.get("last_updated") or "") < updated_before
+        ]
+    deleted = get_session_store().delete_sessions(user_id, session_ids)
+    for session_id in deleted:
+        session_cache.invalidate(_chat_key(user_id, session_id))
+    session_cache.invalidate(_sessions_key(user_id))
+    return {"status": "deleted", "session_ids": deleted}
+
+
+def restore_user_sessions(user_id: str, session_ids: list):
+    """
+    Restore many deleted sessions with one metadata write.
+    """
+    restored = get_session_store().restore_sessions(user_id, session_ids)
+    for session_id in restored:
+        session_cache.invalidate(_chat_key(user_id, session_id))
+    session_cache.invalidate(_sessions_key(user_id))
+    return {"status": "restored", "session_ids": restored}
 
-        return {"session_id": session_id, "new_title": new_title}
 
-    except Exception as e:
-        raise e
+def rename_user_session(user_id: str, session_id: str, new_title: str):
+    """
+    Rename a chat session title in the session metadata.
+    """
+    get_session_store().rename_session(
+        user_id, session_id, new_title, datetime.now(timezone.utc).isoformat()
+    )
+    session_cache.invalidate(_sessions_key(user_id))
+    return {"session_id": session_id, "new_title": new_title}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,390 @@
+"""Append-only message log for one chat session.
+
+A session {name} is stored as:
+- {name}.jsonl          one message per line, appended and never rewritten in place;
+- {name}.idx            the byte offset of every line as 8-byte little-endian
+                        integers, so message i is found without scanning;
+- {name}.ids            each message's message_id, one JSON string per line; it is
+                        loaded once into an id -> position map kept per log, so a
+                        message is located by id without reading the log;
+- {name}.patches.jsonl  field updates to earlier messages (e.g. feedback status)
+                        as {"message_id", "fields"} lines, applied on read;
+- {name}.meta.json      small per-session data such as the running summary.
+
+Appending a turn writes only that turn, however long the session is. Reads
+fetch a message range with one seek. compact() folds the patches into the log
+and rewrites it atomically; it runs on a background thread once enough patches
+accumulate. Sessions saved in the older single-file {name}.json format are
+read as they are and converted on their next append.
+
+Writes are serialized per log within a process; use one writer process per
+storage directory, or the SQLite backend, when running several workers.
+"""
+from collections import OrderedDict
+import json
+import os
+import queue
+import struct
+import threading
+
+MESSAGE_LOG_COMPACT_PATCHES = int(os.getenv("MESSAGE_LOG_COMPACT_PATCHES", "64"))
+MESSAGE_LOG_POSITION_CACHE = int(os.getenv("MESSAGE_LOG_POSITION_CACHE", "1024"))
+OFFSET = struct.Struct("<Q")
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+# base_path -> (message count, {message_id: first position}), least recently used first.
+# Entries are only used while the count still matches the log on disk.
+_positions = OrderedDict()
+_positions_guard = threading.Lock()
+
+
+def _lock_for(path: str) -> threading.RLock:
+    with _locks_guard:
+        return _locks.setdefault(path, threading.RLock())
+
+
+def _encode(record: dict) -> bytes:
+    return json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+class MessageLog:
+    """Offset-indexed JSONL log of a session's messages."""
+
+    SUFFIXES = (".jsonl", ".idx", ".ids", ".patches.jsonl", ".meta.json")
+
+    def __init__(self, base_path: str):
+        self.base_path = base_path
+        self.log_path = base_path + ".jsonl"
+        self.index_path = base_path + ".idx"
+        self.ids_path = base_path + ".ids"
+        self.patches_path = base_path + ".patches.jsonl"
+        self.meta_path = base_path + ".meta.json"
+        self.legacy_path = base_path + ".json"
+        self.lock = _lock_for(base_path)
+
+    def exists(self) -> bool:
+        return os.path.exists(self.log_path) or os.path.exists(self.legacy_path)
+
+    # ---------- index ----------
+    def count(self) -> int:
+        if not os.path.exists(self.log_path):
+            legacy = self._read_legacy()
+            return len(legacy.get("messages", []))
+        return os.path.getsize(self.index_path) // OFFSET.size if os.path.exists(self.index_path) else 0
+
+    def _offsets(self, start: int, stop: int) -> list:
+        """Offsets of lines start..stop, including stop when it exists."""
+        with open(self.index_path, "rb") as f:
+            f.seek(start * OFFSET.size)
+            data = f.read((stop - start + 1) * OFFSET.size)
+        return [o for (o,) in OFFSET.iter_unpack(data)]
+
+    def _rebuild_index(self):
+        offsets = []
+        position = 0
+        torn_at = None
+        with open(self.log_path, "rb") as f:
+            for line in f:
+                if line.endswith(b"\n"):
+                    offsets.append(position)
+                else:
+                    torn_at = position
+                position += len(line)
+        if torn_at is not None:
+            # Drop a torn final line left by a crash mid-append
+            with open(self.log_path, "r+b") as f:
+                f.truncate(torn_at)
+        with open(self.index_path + ".tmp", "wb") as f:
+            f.write(b"".join(OFFSET.pack(o) for o in offsets))
+        os.replace(self.index_path + ".tmp", self.index_path)
+
+    def _line_length(self, offset: int) -> int:
+        with open(self.log_path, "rb") as f:
+            f.seek(offset)
+            return len(f.readline())
+
+    def _check_index(self):
+        """Repairs the index if a crash left it behind the log. Caller holds the lock."""
+        size = os.path.getsize(self.log_path)
+        if not os.path.exists(self.index_path) or os.path.getsize(self.index_path) % OFFSET.size:
+            self._rebuild_index()
+            return
+        count = self.count()
+        if count == 0:
+            if size:
+                self._rebuild_index()
+            return
+        last = self._offsets(count - 1, count - 1)[0]
+        if last + self._line_length(last) != size:
+            self._rebuild_index()
+
+    # ---------- legacy ----------
+    def _read_legacy(self) -> dict:
+        if not os.path.exists(self.legacy_path):
+            return {}
+        with open(self.legacy_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _convert_legacy(self):
+        """Rewrites an old {name}.json session in this format. Caller holds the lock."""
+        legacy = self._read_legacy()
+        self._write_log(legacy.get("messages", []))
+        if legacy.get("summary"):
+            self.write_meta({"summary": legacy["summary"]})
+        os.remove(self.legacy_path)
+
+    def _write_log(self, messages: list):
+        offsets = []
+        position = 0
+        with open(self.log_path + ".tmp", "wb") as f:
+            for message in messages:
+                line = _encode(message)
+                offsets.append(position)
+                position += len(line)
+                f.write(line)
+        with open(self.index_path + ".tmp", "wb") as f:
+            f.write(b"".join(OFFSET.pack(o) for o in offsets))
+        self._write_ids(messages)
+        os.replace(self.log_path + ".tmp", self.log_path)
+        os.replace(self.index_path + ".tmp", self.index_path)
+        self._forget_positions()
+
+    # ---------- ids ----------
+    def _write_ids(self, messages: list):
+        with open(self.ids_path + ".tmp", "wb") as f:
+            f.write(b"".join(_encode(m.get("message_id")) for m in messages))
+        os.replace(self.ids_path + ".tmp", self.ids_path)
+
+    def _read_ids(self) -> list:
+        if not os.path.exists(self.ids_path):
+            return []
+        with open(self.ids_path, "rb") as f:
+            return [json.loads(line) for line in f if line.endswith(b"\n")]
+
+    def _cached_positions(self, count: int):
+        with _positions_guard:
+            cached = _positions.get(self.base_path)
+            if cached is None or cached[0] != count:
+                return None
+            _positions.move_to_end(self.base_path)
+            return cached[1]
+
+    def _cache_positions(self, count: int, positions: dict):
+        with _positions_guard:
+            _positions[self.base_path] = (count, positions)
+            _positions.move_to_end(self.base_path)
+            while len(_positions) > MESSAGE_LOG_POSITION_CACHE:
+                _positions.popitem(last=False)
+
+    def _forget_positions(self):
+        with _positions_guard:
+            _positions.pop(self.base_path, None)
+
+    def _positions(self) -> dict:
+        """The id -> position map, loaded from the .ids file on first use. Caller holds the lock."""
+        count = self.count()
+        positions = self._cached_positions(count)
+        if positions is not None:
+            return positions
+        if not os.path.exists(self.log_path):
+            ids = [m.get("message_id") for m in self._read_legacy().get("messages", [])]
+        else:
+            ids = self._read_ids()
+            if len(ids) != count:
+                # Left behind by a crash mid-append; rebuild from the log
+                messages = self._read_range(0, None)
+                self._write_ids(messages)
+                ids = [m.get("message_id") for m in messages]
+        positions = {}
+        for position, message_id in enumerate(ids):
+            positions.setdefault(message_id, position)
+        self._cache_positions(count, positions)
+        return positions
+
+    def locate(self, message_id: str):
+        """Position of the first message with this id, or None."""
+        with self.lock:
+            return self._positions().get(message_id)
+
+    def get(self, message_id: str):
+        """The message with this id (patched), read with one seek, or None."""
+        with self.lock:
+            position = self.locate(message_id)
+            if position is None:
+                return None
+            messages = self.read(position, position + 1)
+        return messages[0] if messages else None
+
+    # ---------- writes ----------
+    def append(self, messages: list) -> int:
+        """Appends messages; returns the number of messages in the log afterwards."""
+        lines = [_encode(m) for m in messages]
+        with self.lock:
+            os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+            if not os.path.exists(self.log_path):
+                if os.path.exists(self.legacy_path):
+                    self._convert_legacy()
+                else:
+                    self._write_log([])
+            else:
+                self._check_index()
+
+            with open(self.log_path, "ab") as f:
+                position = f.seek(0, os.SEEK_END)
+                f.write(b"".join(lines))
+            offsets = []
+            for line in lines:
+                offsets.append(position)
+                position += len(line)
+            with open(self.index_path, "ab") as f:
+                f.write(b"".join(OFFSET.pack(o) for o in offsets))
+            with open(self.ids_path, "ab") as f:
+                f.write(b"".join(_encode(m.get("message_id")) for m in messages))
+
+            count = self.count()
+            positions = self._cached_positions(count - len(messages))
+            if positions is not None:
+                for n, message in enumerate(messages):
+                    positions.setdefault(message.get("message_id"), count - len(messages) + n)
+                self._cache_positions(count, positions)
+            return count
+
+    def patch(self, message_id: str, fields: dict):
+        """Records a field update for an earlier message; applied on every read."""
+        with self.lock:
+            if not os.path.exists(self.log_path) and os.path.exists(self.legacy_path):
+                self._convert_legacy()
+            with open(self.patches_path, "ab") as f:
+                f.write(_encode({"message_id": message_id, "fields": fields}))
+            pending = self._patch_count()
+        if pending >= MESSAGE_LOG_COMPACT_PATCHES:
+            schedule_compaction(self)
+
+    def _patch_count(self) -> int:
+        if not os.path.exists(self.patches_path):
+            return 0
+        with open(self.patches_path, "rb") as f:
+            return sum(1 for _ in f)
+
+    def _read_patches(self) -> dict:
+        if not os.path.exists(self.patches_path):
+            return {}
+        patches = {}
+        with open(self.patches_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    patches.setdefault(record["message_id"], {}).update(record["fields"])
+        return patches
+
+    def read_meta(self) -> dict:
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        if not os.path.exists(self.log_path):
+            legacy = self._read_legacy()
+            return {"summary": legacy["summary"]} if legacy.get("summary") else {}
+        return {}
+
+    def write_meta(self, meta: dict):
+        with self.lock:
+            with open(self.meta_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(self.meta_path + ".tmp", self.meta_path)
+
+    # ---------- reads ----------
+    def read(self, start: int = 0, stop: int = None) -> list:
+        """Messages start..stop-1 (Python slice semantics for non-negative bounds), patched."""
+        with self.lock:
+            if not os.path.exists(self.log_path):
+                messages = self._read_legacy().get("messages", [])[start:stop]
+            else:
+                messages = self._read_range(start, stop)
+            patches = self._read_patches()
+
+        for message in messages:
+            fields = patches.get(message.get("message_id"))
+            if fields:
+                message.update(fields)
+        return messages
+
+    def _read_range(self, start: int, stop: int) -> list:
+        count = self.count()
+        stop = count if stop is None else min(stop, count)
+        if start >= stop:
+            return []
+        offsets = self._offsets(start, stop)
+        with open(self.log_path, "rb") as f:
+            f.seek(offsets[0])
+            if len(offsets) > stop - start:
+                data = f.read(offsets[-1] - offsets[0])
+            else:
+                data = f.read()
+        return [json.loads(line) for line in data.splitlines()[:stop - start] if line]
+
+    def tail(self, n: int) -> list:
+        with self.lock:
+            count = self.count()
+            return self.read(max(0, count - n), count)
+
+    # ---------- maintenance ----------
+    def compact(self):
+        """Folds pending patches into the log with an atomic rewrite."""
+        with self.lock:
+            if not os.path.exists(self.log_path) or not os.path.exists(self.patches_path):
+                return
+            messages = self.read()
+            self._write_log(messages)
+            os.remove(self.patches_path)
+
+    def move_to(self, base_path: str) -> "MessageLog":
+        """Renames every file of this session to another location."""
+        target = MessageLog(base_path)
+        with self.lock:
+            self._forget_positions()
+            target._forget_positions()
+            os.makedirs(os.path.dirname(base_path), exist_ok=True)
+            for suffix in self.SUFFIXES + (".json",):
+                source = self.base_path + suffix
+                if os.path.exists(source):
+                    os.replace(source, base_path + suffix)
+                elif os.path.exists(base_path + suffix):
+                    # Left over from an older session with the same id
+                    os.remove(base_path + suffix)
+        return target
+
+
+# ======================================================
+# BACKGROUND COMPACTION
+# ======================================================
+_compaction_queue = queue.Queue()
+_scheduled = set()
+_worker = None
+_worker_guard = threading.Lock()
+
+
+def _compaction_worker():
+    while True:
+        log = _compaction_queue.get()
+        try:
+            log.compact()
+        except Exception as e:
+            print(f"⚠️ Compaction of {log.base_path} failed: {e}")
+        finally:
+            with _worker_guard:
+                _scheduled.discard(log.base_path)
+
+
+def schedule_compaction(log: MessageLog):
+    """Queues a log for compaction on the background worker (once per pending request)."""
+    global _worker
+    with _worker_guard:
+        if log.base_path in _scheduled:
+            return
+        _scheduled.add(log.base_path)
+        if _worker is None:
+            _worker = threading.Thread(target=_compaction_worker, daemon=True)
+            _worker.start()
+    _compaction_queue.put(log)
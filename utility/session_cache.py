@@ -0,0 +1,123 @@
+"""In-process read-through LRU cache for session lists and chat histories.
+
+Keys are ("sessions", user_id) and ("chat", user_id, session_id). The write
+paths in utility/manage_sessions.py update or invalidate the affected entries,
+so a process always reads its own writes. Each key carries a generation
+number: a load that started before an invalidation is not cached, so a slow
+read can never reinstate stale data.
+
+Cached values are shared between callers and must be treated as read-only.
+The cache is per process, so it is off by default for the azure_blob backend,
+whose instances share storage; SESSION_CACHE_SIZE overrides the default.
+"""
+from collections import OrderedDict
+import os
+import threading
+
+DEFAULT_SESSION_CACHE_SIZE = 256
+
+
+def default_cache_size() -> int:
+    """SESSION_CACHE_SIZE if set; otherwise 0 for azure_blob and DEFAULT_SESSION_CACHE_SIZE for the rest."""
+    # Read at call time so .env files loaded by the app apply
+    size = os.getenv("SESSION_CACHE_SIZE")
+    if size is not None:
+        return int(size)
+    if os.getenv("SESSION_STORE_BACKEND") == "azure_blob":
+        return 0
+    return DEFAULT_SESSION_CACHE_SIZE
+
+
+_MISSING = object()
+
+
+class SessionCache:
+    """LRU mapping with hit/miss accounting and generation-checked fills."""
+
+    def __init__(self, max_entries: int = None):
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, key):
+        """Returns (value, generation); value is _MISSING on a miss."""
+        with self._lock:
+            generation = self._generations.get(key, 0)
+            value = self._entries.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return value, generation
+
+    @property
+    def max_entries(self) -> int:
+        if self._max_entries is None:
+            self._max_entries = default_cache_size()
+        return self._max_entries
+
+    def fill(self, key, value, generation: int):
+        """Caches a loaded value unless the key was invalidated since the lookup."""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if self._generations.get(key, 0) != generation:
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, key, loader):
+        value, generation = self.lookup(key)
+        if value is _MISSING:
+            value = loader()
+            self.fill(key, value, generation)
+        return value
+
+    async def aget(self, key, aloader):
+        value, generation = self.lookup(key)
+        if value is _MISSING:
+            value = await aloader()
+            self.fill(key, value, generation)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            self._entries.pop(key, None)
+
+    def update(self, key, function):
+        """Replaces a cached value with function(value); does nothing if it is not cached."""
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            value = self._entries.get(key, _MISSING)
+            if value is not _MISSING:
+                self._entries[key] = function(value)
+
+    def clear(self):
+        with self._lock:
+            for key in self._entries:
+                self._generations[key] = self._generations.get(key, 0) + 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+session_cache = SessionCache()
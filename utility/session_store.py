@@ -0,0 +1,776 @@
+"""Session storage backends behind one interface.
+
+- LocalJsonSessionStore: files under local_blob_storage/, with session
+  metadata in sessions/{user}/{active|deleted}/sessions.json (written through
+  the coalescing writer in utility/sessions_writer.py) and each chat as
+  an append-only message log in chat_history/{user}/{active|deleted}/
+  (see utility/message_log.py; older {session}.json files are still read).
+- SQLiteSessionStore: sessions and messages as rows in one WAL-mode database,
+  so appends, star/rename/delete and listing are indexed operations instead of
+  whole-file rewrites.
+- AzureBlobSessionStore (utility/azure_session_store.py): a blob container
+  that any number of app instances can share.
+
+Listing is paginated newest-first with opaque cursors (page_sessions); the
+local store keeps an in-memory per-user index for it and for lookups by id.
+get_messages reads a window of a session by message position without loading
+the rest of it.
+
+Pick one with SESSION_STORE_BACKEND=local_json|sqlite|azure_blob. Copy existing local data
+into SQLite with:
+    python -m utility.session_store migrate [db_path]
+"""
+import asyncio
+import base64
+import bisect
+import json
+import os
+import sqlite3
+import sys
+import threading
+from .blob_utils import BASE_DIR, local_path
+from .message_log import MessageLog
+from .sessions_writer import sessions_writer
+
+SESSION_STORE_BACKEND = os.getenv("SESSION_STORE_BACKEND", "local_json")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", os.path.join(BASE_DIR, "sessions.sqlite"))
+
+
+class SessionStore:
+    """
+    Storage interface used by utility/manage_sessions.py. Chat sessions are
+    returned as {"session_id", "messages", ["summary"]}, or {} when missing.
+    The async methods run the sync ones off the event loop unless a backend
+    implements them natively.
+    """
+
+    def list_sessions(self, user_id: str) -> list:
+        raise NotImplementedError
+
+    def get_chat_session(self, user_id: str, session_id: str) -> dict:
+        raise NotImplementedError
+
+    def append_messages(self, user_id: str, session_id: str, messages: list, title: str) -> dict:
+        """Appends messages, creating the session if needed; returns its metadata."""
+        raise NotImplementedError
+
+    def save_summary(self, user_id: str, session_id: str, summary: dict):
+        raise NotImplementedError
+
+    def set_starred(self, user_id: str, session_id: str, starred: bool):
+        raise NotImplementedError
+
+    def rename_session(self, user_id: str, session_id: str, title: str, updated: str):
+        raise NotImplementedError
+
+    def delete_sessions(self, user_id: str, session_ids: list) -> list:
+        """
+        Moves active sessions to the deleted set with a single metadata write;
+        returns the ids that were active. Unknown ids are skipped.
+        """
+        raise NotImplementedError
+
+    def restore_sessions(self, user_id: str, session_ids: list) -> list:
+        """Moves deleted sessions back to the active set; returns the ids restored."""
+        raise NotImplementedError
+
+    def delete_session(self, user_id: str, session_id: str):
+        if not self.delete_sessions(user_id, [session_id]):
+            raise ValueError("Session metadata not found")
+
+    def restore_session(self, user_id: str, session_id: str):
+        if not self.restore_sessions(user_id, [session_id]):
+            raise ValueError("Deleted session not found")
+
+    def get_message(self, user_id: str, session_id: str, message_id: str):
+        """One message of an active session, found through a message_id index; None if absent."""
+        raise NotImplementedError
+
+    def patch_message(self, user_id: str, session_id: str, message_id: str, fields: dict):
+        """Updates fields of one stored message without rewriting the session."""
+        raise NotImplementedError
+
+    def append_feedback_event(self, user_id: str, event: dict):
+        """Appends to the user's feedback event log."""
+        raise NotImplementedError
+
+    def page_sessions(self, user_id: str, limit: int, cursor: str = None,
+                      starred: bool = False, updated_since: str = None) -> dict:
+        """
+        One page of sessions, newest first (last_updated, then session_id,
+        descending), as {"sessions", "next_cursor"}. Pass next_cursor back to
+        get the following page; it is None on the last one.
+        """
+        return SessionIndex(self.list_sessions(user_id)).page(limit, cursor, starred, updated_since)
+
+    def get_messages(self, user_id: str, session_id: str, limit: int = None, before: int = None,
+                     after: int = None, headers_only: bool = False) -> dict:
+        """
+        A window of a session's messages, each tagged with its position "seq":
+        the first `limit` after `after`, otherwise the last `limit` before
+        `before` (default: the end). Returns {"session_id", "total", "messages"},
+        or {} when the session is missing. headers_only leaves out the text.
+        """
+        return window_of_session(self.get_chat_session(user_id, session_id), limit, before, after, headers_only)
+
+    def close(self):
+        pass
+
+    async def alist_sessions(self, user_id: str) -> list:
+        return await asyncio.to_thread(self.list_sessions, user_id)
+
+    async def aget_chat_session(self, user_id: str, session_id: str) -> dict:
+        return await asyncio.to_thread(self.get_chat_session, user_id, session_id)
+
+    async def apage_sessions(self, user_id: str, limit: int, cursor: str = None,
+                             starred: bool = False, updated_since: str = None) -> dict:
+        return await asyncio.to_thread(self.page_sessions, user_id, limit, cursor, starred, updated_since)
+
+    async def aget_messages(self, user_id: str, session_id: str, limit: int = None, before: int = None,
+                            after: int = None, headers_only: bool = False) -> dict:
+        return await asyncio.to_thread(
+            self.get_messages, user_id, session_id, limit, before, after, headers_only
+        )
+
+
+# ======================================================
+# PAGINATION
+# ======================================================
+def _recency_key(session: dict) -> tuple:
+    return (session.get("last_updated") or "", session["session_id"])
+
+
+def encode_cursor(key: tuple) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        last_updated, session_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return (str(last_updated), str(session_id))
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def message_window(total: int, limit: int = None, before: int = None, after: int = None) -> tuple:
+    """The [start, stop) message positions selected by the get_messages cursors."""
+    start = 0 if after is None else min(after + 1, total)
+    stop = total if before is None else max(min(before, total), start)
+    if limit is not None:
+        if after is not None:
+            stop = min(stop, start + limit)
+        else:
+            start = max(start, stop - limit)
+    return start, stop
+
+
+def _message_page(session_id: str, total: int, start: int, messages: list, headers_only: bool) -> dict:
+    page = []
+    for seq, message in enumerate(messages, start):
+        if headers_only:
+            message = {k: v for k, v in message.items() if k != "message"}
+        page.append({**message, "seq": seq})
+    return {"session_id": session_id, "total": total, "messages": page}
+
+
+def window_of_session(chat_history: dict, limit: int = None, before: int = None,
+                      after: int = None, headers_only: bool = False) -> dict:
+    """get_messages over an already loaded chat session."""
+    if not chat_history:
+        return {}
+    messages = chat_history["messages"]
+    start, stop = message_window(len(messages), limit, before, after)
+    return _message_page(chat_history["session_id"], len(messages), start, messages[start:stop], headers_only)
+
+
+class SessionIndex:
+    """
+    One user's sessions by session_id, plus sorted (last_updated, session_id)
+    keys for all and for starred sessions, so a page costs O(log n + page size).
+    """
+
+    def __init__(self, sessions: list = ()):
+        self.by_id = {}
+        self.keys = []
+        self.starred_keys = []
+        for session in sessions:
+            if session.get("session_id"):
+                self.put(session)
+
+    def get(self, session_id: str):
+        session = self.by_id.get(session_id)
+        return dict(session) if session is not None else None
+
+    def put(self, session: dict):
+        self.remove(session["session_id"])
+        key = _recency_key(session)
+        self.by_id[session["session_id"]] = session
+        bisect.insort(self.keys, key)
+        if session.get("starred"):
+            bisect.insort(self.starred_keys, key)
+
+    def remove(self, session_id: str):
+        old = self.by_id.pop(session_id, None)
+        if old is None:
+            return
+        key = _recency_key(old)
+        del self.keys[bisect.bisect_left(self.keys, key)]
+        if old.get("starred"):
+            del self.starred_keys[bisect.bisect_left(self.starred_keys, key)]
+
+    def page(self, limit: int, cursor: str = None, starred: bool = False, updated_since: str = None) -> dict:
+        keys = self.starred_keys if starred else self.keys
+        position = bisect.bisect_left(keys, decode_cursor(cursor)) if cursor else len(keys)
+        # Keys before `position` sort strictly before the cursor; walk them newest first
+        sessions = []
+        while position > 0 and len(sessions) < limit:
+            key = keys[position - 1]
+            if updated_since and key[0] < updated_since:
+                position = 0
+                break
+            sessions.append(dict(self.by_id[key[1]]))
+            position -= 1
+        more = position > 0 and not (updated_since and keys[position - 1][0] < updated_since)
+        return {
+            "sessions": sessions,
+            "next_cursor": encode_cursor(_recency_key(sessions[-1])) if more and sessions else None
+        }
+
+
+# ======================================================
+# LOCAL JSON
+# ======================================================
+class LocalJsonSessionStore(SessionStore):
+    """
+    Session metadata as JSON lists; chat history as per-session message logs.
+    Each user's list is mirrored in a SessionIndex built on first use and kept
+    in step with every change this process submits.
+    """
+
+    def __init__(self):
+        self._indexes = {}
+        self._index_lock = threading.RLock()
+        self._feedback_lock = threading.Lock()
+
+    def _sessions_path(self, user_id, folder="active"):
+        return f"sessions/{user_id}/{folder}/sessions.json"
+
+    def _log(self, user_id, session_id, folder="active") -> MessageLog:
+        return MessageLog(local_path(f"chat_history/{user_id}/{folder}/{session_id}"))
+
+    def _index(self, user_id, folder="active") -> SessionIndex:
+        """The user's index. Callers that change the list hold _index_lock."""
+        with self._index_lock:
+            index = self._indexes.get((user_id, folder))
+            if index is None:
+                index = SessionIndex(sessions_writer.read(self._sessions_path(user_id, folder)))
+                self._indexes[(user_id, folder)] = index
+            return index
+
+    def list_sessions(self, user_id):
+        return sessions_writer.read(self._sessions_path(user_id))
+
+    def page_sessions(self, user_id, limit, cursor=None, starred=False, updated_since=None):
+        with self._index_lock:
+            return self._index(user_id).page(limit, cursor, starred, updated_since)
+
+    def get_chat_session(self, user_id, session_id):
+        log = self._log(user_id, session_id)
+        if not log.exists():
+            return {}
+        chat_history = {"session_id": session_id, "messages": log.read()}
+        summary = log.read_meta().get("summary")
+        if summary:
+            chat_history["summary"] = summary
+        return chat_history
+
+    def get_messages(self, user_id, session_id, limit=None, before=None, after=None, headers_only=False):
+        log = self._log(user_id, session_id)
+        if not log.exists():
+            return {}
+        # Only the selected lines are read, via the offset index
+        total = log.count()
+        start, stop = message_window(total, limit, before, after)
+        return _message_page(session_id, total, start, log.read(start, stop), headers_only)
+
+    def append_messages(self, user_id, session_id, messages, title):
+        # Use last message timestamp for updates
+        last_timestamp = messages[-1]["timestamp"]
+        new_session = {
+            "session_id": session_id,
+            "title": title,
+            "starred": False,
+            "created_on": last_timestamp,
+            "last_updated": last_timestamp
+        }
+
+        def touch(sessions_data):
+            for session in sessions_data:
+                if session.get("session_id") == session_id:
+                    session["last_updated"] = last_timestamp
+                    return
+            sessions_data.append(dict(new_session))
+
+        # Only the new turn is written, whatever the length of the session
+        self._log(user_id, session_id).append(messages)
+        with self._index_lock:
+            index = self._index(user_id)
+            session = index.get(session_id)
+            if session is None:
+                session = dict(new_session)
+            else:
+                session["last_updated"] = last_timestamp
+            sessions_writer.submit(self._sessions_path(user_id), touch)
+            index.put(session)
+        return dict(session)
+
+    def _find(self, user_id, session_id, folder="active"):
+        return self._index(user_id, folder).get(session_id)
+
+    def save_summary(self, user_id, session_id, summary):
+        log = self._log(user_id, session_id)
+        if not log.exists():
+            raise ValueError("Session not found")
+        meta = log.read_meta()
+        meta["summary"] = summary
+        log.write_meta(meta)
+
+    def _update_session(self, user_id, session_id, fields):
+        def update(sessions_data):
+            for session in sessions_data:
+                if session.get("session_id") == session_id:
+                    session.update(fields)
+
+        with self._index_lock:
+            session = self._find(user_id, session_id)
+            if session is None:
+                raise ValueError(f"Session ID '{session_id}' not found for user '{user_id}'")
+            sessions_writer.submit(self._sessions_path(user_id), update)
+            self._index(user_id).put({**session, **fields})
+
+    def set_starred(self, user_id, session_id, starred):
+        self._update_session(user_id, session_id, {"starred": starred})
+
+    def rename_session(self, user_id, session_id, title, updated):
+        self._update_session(user_id, session_id, {"title": title, "last_updated": updated})
+
+    def _move_sessions(self, user_id, session_ids, source, target) -> list:
+        """
+        Renames each session's log files from one folder to the other, then
+        queues one metadata operation per list for the whole batch.
+        """
+        with self._index_lock:
+            from_index = self._index(user_id, source)
+            to_index = self._index(user_id, target)
+            sessions = [from_index.get(sid) for sid in dict.fromkeys(session_ids)]
+            sessions = [s for s in sessions if s is not None]
+            if target == "active":
+                # A session revived by a new turn after deletion stays active. Deleting
+                # it again replaces the older deleted copy, files and entry alike.
+                sessions = [s for s in sessions if to_index.get(s["session_id"]) is None]
+            if not sessions:
+                return []
+            moved = {s["session_id"] for s in sessions}
+
+            for session_id in moved:
+                self._log(user_id, session_id, source).move_to(self._log(user_id, session_id, target).base_path)
+
+            def remove(sessions_data):
+                sessions_data[:] = [s for s in sessions_data if s.get("session_id") not in moved]
+
+            def add(sessions_data):
+                sessions_data[:] = [s for s in sessions_data if s.get("session_id") not in moved]
+                sessions_data.extend(dict(s) for s in sessions)
+
+            sessions_writer.submit(self._sessions_path(user_id, source), remove)
+            sessions_writer.submit(self._sessions_path(user_id, target), add)
+            for session in sessions:
+                from_index.remove(session["session_id"])
+                to_index.put(dict(session))
+            return [s["session_id"] for s in sessions]
+
+    def delete_sessions(self, user_id, session_ids):
+        return self._move_sessions(user_id, session_ids, "active", "deleted")
+
+    def restore_sessions(self, user_id, session_ids):
+        return self._move_sessions(user_id, session_ids, "deleted", "active")
+
+    def get_message(self, user_id, session_id, message_id):
+        return self._log(user_id, session_id).get(message_id)
+
+    def patch_message(self, user_id, session_id, message_id, fields):
+        self._log(user_id, session_id).patch(message_id, fields)
+
+    def append_feedback_event(self, user_id, event):
+        path = local_path(f"feedback/{user_id}/events.jsonl")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._feedback_lock, open(path, "ab") as f:
+            f.write(json.dumps(event, ensure_ascii=False).encode("utf-8") + b"\n")
+
+
+# ======================================================
+# SQLITE
+# ======================================================
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    starred INTEGER NOT NULL DEFAULT 0,
+    created_on TEXT NOT NULL,
+    last_updated TEXT NOT NULL,
+    deleted INTEGER NOT NULL DEFAULT 0,
+    summary TEXT,
+    PRIMARY KEY (user_id, session_id)
+);
+CREATE INDEX IF NOT EXISTS sessions_by_user ON sessions (user_id, deleted);
+CREATE INDEX IF NOT EXISTS sessions_by_recency
+    ON sessions (user_id, deleted, last_updated DESC, session_id DESC);
+CREATE INDEX IF NOT EXISTS sessions_by_starred_recency
+    ON sessions (user_id, deleted, starred, last_updated DESC, session_id DESC);
+CREATE TABLE IF NOT EXISTS messages (
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    message_id TEXT,
+    body TEXT NOT NULL,
+    PRIMARY KEY (user_id, session_id, seq)
+);
+CREATE INDEX IF NOT EXISTS messages_by_id ON messages (user_id, message_id);
+CREATE TABLE IF NOT EXISTS feedback_events (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    message_id TEXT,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS feedback_events_by_message ON feedback_events (user_id, message_id);
+"""
+
+SESSION_COLUMNS = "session_id, title, starred, created_on, last_updated"
+
+
+def _session_row(row) -> dict:
+    return {
+        "session_id": row[0],
+        "title": row[1],
+        "starred": bool(row[2]),
+        "created_on": row[3],
+        "last_updated": row[4],
+    }
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions and messages as rows in an embedded WAL-mode database."""
+
+    def __init__(self, path: str = SESSION_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # WAL makes NORMAL durable against application crashes; only an OS crash can lose the last commits
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        """Closes the connections opened by every thread; later calls reopen them."""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+        for conn in connections:
+            conn.close()
+
+    def list_sessions(self, user_id):
+        rows = self._conn().execute(
+            f"SELECT {SESSION_COLUMNS} FROM sessions WHERE user_id = ? AND deleted = 0 ORDER BY rowid",
+            (user_id,)
+        ).fetchall()
+        return [_session_row(r) for r in rows]
+
+    def page_sessions(self, user_id, limit, cursor=None, starred=False, updated_since=None):
+        clauses = ["user_id = ?", "deleted = 0"]
+        values = [user_id]
+        if starred:
+            clauses.append("starred = 1")
+        if updated_since:
+            clauses.append("last_updated >= ?")
+            values.append(updated_since)
+        if cursor:
+            clauses.append("(last_updated, session_id) < (?, ?)")
+            values.extend(decode_cursor(cursor))
+        rows = self._conn().execute(
+            f"SELECT {SESSION_COLUMNS} FROM sessions WHERE {' AND '.join(clauses)} "
+            "ORDER BY last_updated DESC, session_id DESC LIMIT ?",
+            values + [limit + 1]
+        ).fetchall()
+        sessions = [_session_row(r) for r in rows[:limit]]
+        return {
+            "sessions": sessions,
+            "next_cursor": encode_cursor(_recency_key(sessions[-1])) if len(rows) > limit else None
+        }
+
+    def get_chat_session(self, user_id, session_id):
+        conn = self._conn()
+        session = conn.execute(
+            "SELECT summary FROM sessions WHERE user_id = ? AND session_id = ? AND deleted = 0",
+            (user_id, session_id)
+        ).fetchone()
+        if session is None:
+            return {}
+        rows = conn.execute(
+            "SELECT body FROM messages WHERE user_id = ? AND session_id = ? ORDER BY seq",
+            (user_id, session_id)
+        ).fetchall()
+        chat_history = {"session_id": session_id, "messages": [json.loads(r[0]) for r in rows]}
+        if session[0]:
+            chat_history["summary"] = json.loads(session[0])
+        return chat_history
+
+    def get_messages(self, user_id, session_id, limit=None, before=None, after=None, headers_only=False):
+        conn = self._conn()
+        session = conn.execute(
+            "SELECT 1 FROM sessions WHERE user_id = ? AND session_id = ? AND deleted = 0",
+            (user_id, session_id)
+        ).fetchone()
+        if session is None:
+            return {}
+        total = conn.execute(
+            "SELECT COALESCE(MAX(seq) + 1, 0) FROM messages WHERE user_id = ? AND session_id = ?",
+            (user_id, session_id)
+        ).fetchone()[0]
+        start, stop = message_window(total, limit, before, after)
+        # Let SQLite drop the text so long answers are never decoded in Python
+        body = "json_remove(body, '$.message')" if headers_only else "body"
+        rows = conn.execute(
+            f"SELECT {body} FROM messages WHERE user_id = ? AND session_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+            (user_id, session_id, start, stop)
+        ).fetchall()
+        return _message_page(session_id, total, start, [json.loads(r[0]) for r in rows], False)
+
+    def append_messages(self, user_id, session_id, messages, title):
+        last_timestamp = messages[-1]["timestamp"]
+        conn = self._conn()
+        with conn:
+            # A turn on a deleted session id starts a fresh session, as in the JSON store
+            revived = conn.execute(
+                "DELETE FROM sessions WHERE user_id = ? AND session_id = ? AND deleted = 1",
+                (user_id, session_id)
+            ).rowcount
+            if revived:
+                conn.execute(
+                    "DELETE FROM messages WHERE user_id = ? AND session_id = ?", (user_id, session_id)
+                )
+            conn.execute(
+                "INSERT INTO sessions (user_id, session_id, title, created_on, last_updated) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (user_id, session_id) DO UPDATE SET last_updated = excluded.last_updated",
+                (user_id, session_id, title, last_timestamp, last_timestamp)
+            )
+            start = conn.execute(
+                "SELECT COALESCE(MAX(seq) + 1, 0) FROM messages WHERE user_id = ? AND session_id = ?",
+                (user_id, session_id)
+            ).fetchone()[0]
+            conn.executemany(
+                "INSERT INTO messages VALUES (?, ?, ?, ?, ?)",
+                [
+                    (user_id, session_id, start + i, m.get("message_id"), json.dumps(m))
+                    for i, m in enumerate(messages)
+                ]
+            )
+            row = conn.execute(
+                f"SELECT {SESSION_COLUMNS} FROM sessions WHERE user_id = ? AND session_id = ?",
+                (user_id, session_id)
+            ).fetchone()
+        return _session_row(row)
+
+    def _update(self, user_id, session_id, assignments: str, values: tuple):
+        conn = self._conn()
+        with conn:
+            cursor = conn.execute(
+                f"UPDATE sessions SET {assignments} WHERE user_id = ? AND session_id = ? AND deleted = 0",
+                values + (user_id, session_id)
+            )
+        if cursor.rowcount == 0:
+            raise ValueError(f"Session ID '{session_id}' not found for user '{user_id}'")
+
+    def save_summary(self, user_id, session_id, summary):
+        self._update(user_id, session_id, "summary = ?", (json.dumps(summary),))
+
+    def set_starred(self, user_id, session_id, starred):
+        self._update(user_id, session_id, "starred = ?", (int(starred),))
+
+    def rename_session(self, user_id, session_id, title, updated):
+        self._update(user_id, session_id, "title = ?, last_updated = ?", (title, updated))
+
+    def _set_deleted(self, user_id, session_ids, deleted: int) -> list:
+        session_ids = list(dict.fromkeys(session_ids))
+        if not session_ids:
+            return []
+        marks = ", ".join("?" for _ in session_ids)
+        where = f"user_id = ? AND deleted = ? AND session_id IN ({marks})"
+        values = (user_id, 1 - deleted, *session_ids)
+        conn = self._conn()
+        with conn:
+            rows = conn.execute(f"SELECT session_id FROM sessions WHERE {where}", values).fetchall()
+            conn.execute(f"UPDATE sessions SET deleted = ? WHERE {where}", (deleted,) + values)
+        changed = {r[0] for r in rows}
+        return [sid for sid in session_ids if sid in changed]
+
+    def delete_sessions(self, user_id, session_ids):
+        return self._set_deleted(user_id, session_ids, 1)
+
+    def restore_sessions(self, user_id, session_ids):
+        return self._set_deleted(user_id, session_ids, 0)
+
+    def get_message(self, user_id, session_id, message_id):
+        row = self._conn().execute(
+            "SELECT m.body FROM messages m JOIN sessions s "
+            "ON s.user_id = m.user_id AND s.session_id = m.session_id AND s.deleted = 0 "
+            "WHERE m.user_id = ? AND m.message_id = ? AND m.session_id = ? ORDER BY m.seq LIMIT 1",
+            (user_id, message_id, session_id)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def patch_message(self, user_id, session_id, message_id, fields):
+        paths = ", ".join("?, json(?)" for _ in fields)
+        values = []
+        for key, value in fields.items():
+            values += [f'$."{key}"', json.dumps(value)]
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                f"UPDATE messages SET body = json_set(body, {paths}) "
+                "WHERE user_id = ? AND message_id = ? AND session_id = ?",
+                values + [user_id, message_id, session_id]
+            )
+
+    def append_feedback_event(self, user_id, event):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO feedback_events (user_id, message_id, body) VALUES (?, ?, ?)",
+                (user_id, event.get("message_id"), json.dumps(event))
+            )
+
+
+# ======================================================
+# SELECTION AND MIGRATION
+# ======================================================
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """The process-wide store selected by SESSION_STORE_BACKEND."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                # Read here rather than at import so .env files loaded by the app apply
+                backend = os.getenv("SESSION_STORE_BACKEND", SESSION_STORE_BACKEND)
+                if backend == "sqlite":
+                    _store = SQLiteSessionStore(os.getenv("SESSION_DB_PATH", SESSION_DB_PATH))
+                elif backend == "local_json":
+                    _store = LocalJsonSessionStore()
+                elif backend == "azure_blob":
+                    # Imported here so the Azure SDK is only needed when it is used
+                    from .azure_session_store import AzureBlobSessionStore
+                    _store = AzureBlobSessionStore()
+                else:
+                    raise RuntimeError(f"Unknown SESSION_STORE_BACKEND '{backend}'")
+    return _store
+
+
+def close_session_store():
+    """Releases the store's connections, if one was created."""
+    if _store is not None:
+        _store.close()
+
+
+def _read_json(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def migrate_local_to_sqlite(base_dir: str = BASE_DIR, db_path: str = SESSION_DB_PATH) -> dict:
+    """
+    Copies local_blob_storage sessions and chat histories into SQLite. Sessions
+    that already exist in the database are left untouched, so it can be re-run.
+    """
+    store = SQLiteSessionStore(db_path)
+    conn = store._conn()
+    counts = {"sessions": 0, "messages": 0, "skipped": 0}
+
+    users = set()
+    for root in ("sessions", "chat_history"):
+        if os.path.isdir(os.path.join(base_dir, root)):
+            users.update(os.listdir(os.path.join(base_dir, root)))
+
+    for user_id in sorted(users):
+        for folder, deleted in (("active", 0), ("deleted", 1)):
+            sessions = _read_json(os.path.join(base_dir, "sessions", user_id, folder, "sessions.json")) or []
+            metadata = {s["session_id"]: s for s in sessions if s.get("session_id")}
+            history_dir = os.path.join(base_dir, "chat_history", user_id, folder)
+            if os.path.isdir(history_dir):
+                for name in sorted(os.listdir(history_dir)):
+                    if name.endswith((".patches.jsonl", ".meta.json")):
+                        continue
+                    if name.endswith(".jsonl"):
+                        metadata.setdefault(name[:-6], {"session_id": name[:-6]})
+                    elif name.endswith(".json"):
+                        metadata.setdefault(name[:-5], {"session_id": name[:-5]})
+
+            for session_id, session in metadata.items():
+                exists = conn.execute(
+                    "SELECT 1 FROM sessions WHERE user_id = ? AND session_id = ?", (user_id, session_id)
+                ).fetchone()
+                if exists:
+                    counts["skipped"] += 1
+                    continue
+                log = MessageLog(os.path.join(history_dir, session_id))
+                messages = log.read()
+                summary = log.read_meta().get("summary")
+                first = messages[0].get("timestamp", "") if messages else ""
+                last = messages[-1].get("timestamp", "") if messages else ""
+                with conn:
+                    conn.execute(
+                        "INSERT INTO sessions VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            user_id, session_id,
+                            session.get("title", "New Session"),
+                            int(bool(session.get("starred", False))),
+                            session.get("created_on") or first,
+                            session.get("last_updated") or last,
+                            deleted,
+                            json.dumps(summary) if summary else None,
+                        )
+                    )
+                    conn.executemany(
+                        "INSERT INTO messages VALUES (?, ?, ?, ?, ?)",
+                        [
+                            (user_id, session_id, seq, m.get("message_id"), json.dumps(m))
+                            for seq, m in enumerate(messages)
+                        ]
+                    )
+                counts["sessions"] += 1
+                counts["messages"] += len(messages)
+    return counts
+
+
+if __name__ == "__main__":
+    if not sys.argv[1:] or sys.argv[1] != "migrate":
+        sys.exit("usage: python -m utility.session_store migrate [db_path]")
+    print(migrate_local_to_sqlite(db_path=sys.argv[2] if len(sys.argv) > 2 else SESSION_DB_PATH))
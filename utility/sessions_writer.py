@@ -0,0 +1,109 @@
+"""Serialized, coalescing writer for the per-user sessions.json lists.
+
+Every metadata change (new turn, star, rename, delete) is queued as an
+operation on the user's list instead of being applied by its own
+read-modify-write. Operations for the same file are applied in order under one
+lock and written together at most once per SESSIONS_FLUSH_INTERVAL_MS, with an
+atomic temp-file + rename. Reads merge the pending operations over the file,
+so callers always see their own writes.
+
+Set SESSIONS_FLUSH_INTERVAL_MS=0 to write through on every change. Pending
+operations are flushed at interpreter exit and by flush_all() on shutdown.
+"""
+import atexit
+import copy
+import os
+import threading
+from .blob_utils import read_json_from_blob, write_json_to_blob
+
+SESSIONS_FLUSH_INTERVAL_MS = int(os.getenv("SESSIONS_FLUSH_INTERVAL_MS", "200"))
+
+
+class _PendingFile:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.operations = []
+        self.timer = None
+
+
+class SessionsWriter:
+    """Queues list operations per blob path and flushes them in batches."""
+
+    def __init__(self, flush_interval_ms: int = SESSIONS_FLUSH_INTERVAL_MS):
+        self.flush_interval = flush_interval_ms / 1000
+        self._files = {}
+        self._guard = threading.Lock()
+        self.flushes = 0
+        self.operations_applied = 0
+
+    def _file(self, blob_path: str) -> _PendingFile:
+        with self._guard:
+            return self._files.setdefault(blob_path, _PendingFile())
+
+    def read(self, blob_path: str) -> list:
+        """The list as it will be after the pending operations are written."""
+        pending = self._file(blob_path)
+        with pending.lock:
+            data = read_json_from_blob(blob_path) or []
+            if pending.operations:
+                data = copy.deepcopy(data)
+                for operation in pending.operations:
+                    operation(data)
+            return data
+
+    def submit(self, blob_path: str, operation):
+        """
+        Queues operation(list) -> None, which mutates the list in place. It must
+        tolerate a list that no longer matches what the caller validated against.
+        """
+        pending = self._file(blob_path)
+        with pending.lock:
+            pending.operations.append(operation)
+            if self.flush_interval <= 0:
+                self._flush(blob_path, pending)
+            elif pending.timer is None:
+                pending.timer = threading.Timer(self.flush_interval, self.flush, (blob_path,))
+                pending.timer.daemon = True
+                pending.timer.start()
+
+    def flush(self, blob_path: str):
+        pending = self._file(blob_path)
+        with pending.lock:
+            self._flush(blob_path, pending)
+
+    def _flush(self, blob_path: str, pending: _PendingFile):
+        """Applies and writes everything queued for the file. Caller holds its lock."""
+        if pending.timer is not None:
+            pending.timer.cancel()
+            pending.timer = None
+        if not pending.operations:
+            return
+        data = read_json_from_blob(blob_path) or []
+        for operation in pending.operations:
+            operation(data)
+        write_json_to_blob(blob_path, data)
+        self.flushes += 1
+        self.operations_applied += len(pending.operations)
+        pending.operations = []
+
+    def flush_all(self):
+        with self._guard:
+            paths = list(self._files)
+        for blob_path in paths:
+            try:
+                self.flush(blob_path)
+            except Exception as e:
+                print(f"❌ Failed to flush {blob_path}: {e}")
+
+    def stats(self) -> dict:
+        with self._guard:
+            pending = sum(len(f.operations) for f in self._files.values())
+        return {
+            "flushes": self.flushes,
+            "operations_applied": self.operations_applied,
+            "pending_operations": pending,
+        }
+
+
+sessions_writer = SessionsWriter()
+atexit.register(sessions_writer.flush_all)